@@ -0,0 +1,101 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Time the C{use_incremental=True} setup keyword on a synthetic distribution
+with thousands of modules.
+
+The hook used to enumerate every module of the distribution with
+C{build_py.find_all_modules()} to find C{_version.py}; it now looks in the
+declared packages' directories first. Both are timed here.
+
+Run with C{python benchmarks/bench_distutils_hook.py}.
+"""
+
+import os
+import tempfile
+import timeit
+import warnings
+from typing import List
+
+from setuptools.command.build_py import build_py  # type: ignore
+from setuptools.dist import Distribution  # type: ignore
+
+from incremental._hooks import _get_distutils_version
+
+SUBPACKAGES = 100
+MODULES = 50
+
+
+def make_tree(root: str) -> List[str]:
+    """
+    Write a package with C{SUBPACKAGES} subpackages of C{MODULES} modules
+    each under C{root}/src, with C{_version.py} in the top-level package.
+
+    @return: The names of the packages.
+    """
+    top = os.path.join(root, "src", "big")
+    packages = ["big"]
+    os.makedirs(top)
+    with open(os.path.join(top, "__init__.py"), "w"):
+        pass
+    with open(os.path.join(top, "_version.py"), "w") as f:
+        f.write(
+            'from incremental import Version\n__version__ = Version("big", 1, 0, 0)\n'
+        )
+    for i in range(SUBPACKAGES):
+        sub = os.path.join(top, f"sub{i}")
+        os.mkdir(sub)
+        packages.append(f"big.sub{i}")
+        for j in range(MODULES):
+            with open(os.path.join(sub, f"mod{j}.py"), "w"):
+                pass
+        with open(os.path.join(sub, "__init__.py"), "w"):
+            pass
+    return packages
+
+
+def scan(dist: Distribution) -> None:
+    """
+    The old implementation of the hook: search every module.
+    """
+    command = build_py(dist)
+    command.finalize_options()
+    for item in command.find_all_modules():
+        if item[1] == "_version":
+            return
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        packages = make_tree(tmp)
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            dist = Distribution(
+                {"name": "big", "packages": packages, "package_dir": {"": "src"}}
+            )
+            dist.script_name = "setup.py"
+            number = 20
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                old = min(timeit.repeat(lambda: scan(dist), number=number, repeat=3))
+            new = min(
+                timeit.repeat(
+                    lambda: _get_distutils_version(dist, "use_incremental", True),
+                    number=number,
+                    repeat=3,
+                )
+            )
+        finally:
+            os.chdir(cwd)
+
+    print(
+        f"{len(packages)} packages, {SUBPACKAGES * MODULES} modules: "
+        f"scan {old / number * 1e3:.2f} ms, "
+        f"direct lookup {new / number * 1e3:.3f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Time C{incremental update} with and without a marker index on a tree of
+source files, most of which mention the package but have no markers.
+
+Run with C{python benchmarks/bench_marker_index.py}.
+"""
+
+import os
+import tempfile
+import timeit
+from typing import List, Optional
+
+from incremental import _markers
+from incremental._markers import _MarkerIndex
+from incremental.update import _Replacer, _rewriteFile, _UpdateStats
+
+# Only release candidates are replaced, so nothing is rewritten and every
+# run does the same work.
+REPLACER = _Replacer(b"bigpackage", [(b"bigpackage 24.7.0rc1", b"bigpackage 24.7.0")])
+
+
+def make_tree(root: str) -> List[str]:
+    """
+    Write 5000 source files that import the package under C{root}, one in
+    a hundred of which contains a marker.
+    """
+    paths = []
+    for i in range(5000):
+        path = os.path.join(root, f"module{i}.py")
+        with open(path, "wb") as f:
+            f.write(b"from bigpackage import util\n\n")
+            f.write(b"def f(x):\n    return util.compute(x)\n" * 100)
+            if i % 100 == 0:
+                f.write(b"# Changed in bigpackage NEXT.\n")
+        paths.append(path)
+    return paths
+
+
+def update(paths: List[str], index: Optional[_MarkerIndex]) -> _UpdateStats:
+    stats = _UpdateStats()
+    for path in paths:
+        stats.record(_rewriteFile(path, REPLACER, index))
+    return stats
+
+
+def main() -> None:
+    # The files were all just written, so don't distrust recent entries.
+    _markers._RACY_NS = -1
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = make_tree(tmp)
+        indexPath = os.path.join(tmp, "index.json")
+        index = _MarkerIndex("bigpackage")
+        update(paths, index)
+        index.save(indexPath)
+
+        def indexed() -> _UpdateStats:
+            return update(paths, _MarkerIndex.load(indexPath, "bigpackage"))
+
+        old = min(timeit.repeat(lambda: update(paths, None), number=3, repeat=3)) / 3
+        new = min(timeit.repeat(indexed, number=3, repeat=3)) / 3
+        stats = indexed()
+    print(f"{stats}")
+    print(f"no index {old * 1e3:.1f} ms, with index {new * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Time the setuptools C{finalize_distribution_options} hook for a project
+that hasn't opted in to Incremental.
+
+The hook runs in every setuptools build in an environment where Incremental
+is installed, so this is the cost that unrelated projects pay. It is
+compared against a full parse of C{pyproject.toml}, which is what the hook
+did before it gained a fast path.
+
+Run with C{python benchmarks/bench_setuptools_hook.py}.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import timeit
+from typing import Dict, List
+
+from incremental._config import _load_pyproject_toml
+from incremental._hooks import _get_setuptools_version
+
+PYPROJECT = """\
+[build-system]
+requires = ["setuptools>=61", "wheel"]
+build-backend = "setuptools.build_meta"
+
+[project]
+name = "unrelated"
+version = "1.0.0"
+description = "A project that doesn't use Incremental"
+dependencies = ["attrs", "click", "requests"]
+
+[tool.black]
+line-length = 88
+target-version = ["py38", "py39", "py310", "py311"]
+
+[tool.isort]
+profile = "black"
+
+[tool.mypy]
+strict = true
+warn_unused_configs = true
+""" + "".join(
+    f'\n[tool.example.section{i}]\nkey = "value"\nitems = [1, 2, 3]\n'
+    for i in range(30)
+)
+
+
+class _Metadata:
+    version = None
+
+
+class _Distribution:
+    metadata = _Metadata()
+
+
+def full_parse() -> None:
+    try:
+        _load_pyproject_toml("./pyproject.toml")
+    except Exception:
+        pass
+
+
+def in_subprocess(codes: Dict[str, str], number: int) -> Dict[str, float]:
+    """
+    Run each snippet of code in C{number} fresh interpreters, as setuptools
+    would in a build, and return the fastest time for each. Runs are
+    interleaved so that they see the same system noise.
+    """
+    times: Dict[str, List[float]] = {name: [] for name in codes}
+    for _ in range(number):
+        for name, code in codes.items():
+            start = timeit.default_timer()
+            subprocess.run([sys.executable, "-c", code], check=True)
+            times[name].append(timeit.default_timer() - start)
+    return {name: min(t) for name, t in times.items()}
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        os.mkdir(os.path.join(tmp, "unrelated"))
+        with open(os.path.join(tmp, "pyproject.toml"), "w") as f:
+            f.write(PYPROJECT)
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            dist = _Distribution()
+            number = 2000
+            hook = min(
+                timeit.repeat(
+                    lambda: _get_setuptools_version(dist),  # type: ignore[arg-type]
+                    number=number,
+                    repeat=5,
+                )
+            )
+            parse = min(timeit.repeat(full_parse, number=number, repeat=5))
+            print(
+                f"in process: full parse {parse / number * 1e6:.1f} us, "
+                f"hook {hook / number * 1e6:.1f} us"
+            )
+
+            fresh = in_subprocess(
+                {
+                    "import": "import incremental._hooks",
+                    "hook": "import incremental._hooks\n"
+                    "class M: version = None\n"
+                    "class D: metadata = M()\n"
+                    "incremental._hooks._get_setuptools_version(D())\n",
+                    "parse": "import incremental._hooks, incremental._config\n"
+                    "try: incremental._config._load_pyproject_toml('./pyproject.toml')\n"
+                    "except Exception: pass\n",
+                },
+                number=50,
+            )
+            print(
+                f"fresh process, beyond import: "
+                f"full parse {(fresh['parse'] - fresh['import']) * 1e3:.2f} ms, "
+                f"hook {(fresh['hook'] - fresh['import']) * 1e3:.2f} ms"
+            )
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
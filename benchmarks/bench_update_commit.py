@@ -0,0 +1,70 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Time how C{incremental update} writes the files it rewrites: in place, as
+it used to, and atomically through L{_Committer} with and without fsync.
+
+The cost of fsync depends on the filesystem; run this on the one you build
+on. Run with C{python benchmarks/bench_update_commit.py [directory]}.
+"""
+
+import os
+import sys
+import tempfile
+import time
+from typing import Callable, List
+
+from incremental.update import _Committer
+
+CONTENT = b"# bigpackage 24.7.0\n" * 200
+
+
+def make_tree(root: str) -> List[str]:
+    """
+    Write 500 files under C{root}, in 50 directories.
+    """
+    paths = []
+    for i in range(50):
+        directory = os.path.join(root, f"sub{i}")
+        os.makedirs(directory)
+        for j in range(10):
+            path = os.path.join(directory, f"module{j}.py")
+            with open(path, "wb") as f:
+                f.write(CONTENT)
+            paths.append(path)
+    return paths
+
+
+def in_place(paths: List[str]) -> None:
+    for path in paths:
+        with open(path, "wb") as f:
+            f.write(CONTENT)
+
+
+def committed(fsync: bool) -> Callable[[List[str]], None]:
+    def write(paths: List[str]) -> None:
+        committer = _Committer(fsync)
+        for path in paths:
+            committer.write(path, CONTENT)
+        committer.syncDirectories()
+
+    return write
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory(dir=sys.argv[1] if sys.argv[1:] else None) as tmp:
+        paths = make_tree(tmp)
+        for name, write in [
+            ("in place", in_place),
+            ("atomic, no fsync", committed(False)),
+            ("atomic, fsync", committed(True)),
+        ]:
+            start = time.perf_counter()
+            write(paths)
+            elapsed = time.perf_counter() - start
+            print(f"{name}: {elapsed * 1e3:.1f} ms for {len(paths)} files")
+
+
+if __name__ == "__main__":
+    main()
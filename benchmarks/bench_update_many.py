@@ -0,0 +1,78 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Time updating 40 packages in one repository: one C{incremental update}
+process per package, against one C{incremental update --discover}.
+
+Run with C{python benchmarks/bench_update_many.py}.
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+PACKAGES = 40
+FILES = 200
+
+
+def make_repo(root: str) -> None:
+    """
+    Write C{PACKAGES} projects under C{root}, each with C{FILES} modules,
+    one in ten of which contains a marker.
+    """
+    for i in range(PACKAGES):
+        package = f"pkg{i}"
+        project = os.path.join(root, "packages", package)
+        packagedir = os.path.join(project, "src", package)
+        os.makedirs(packagedir)
+        with open(os.path.join(project, "pyproject.toml"), "w") as f:
+            f.write(f'[project]\nname = "{package}"\n[tool.incremental]\n')
+        with open(os.path.join(packagedir, "_version.py"), "w") as f:
+            f.write(
+                "from incremental import Version\n"
+                f'__version__ = Version("{package}", 24, 7, 0, release_candidate=1)\n'
+            )
+        for j in range(FILES):
+            with open(os.path.join(packagedir, f"module{j}.py"), "w") as f:
+                f.write(f"from {package} import util\n" * 50)
+                if j % 10 == 0:
+                    f.write(f"# Changed in {package} NEXT.\n")
+
+
+def incremental(*args: str, cwd: str) -> None:
+    subprocess.run(
+        [sys.executable, "-m", "incremental.update", *args, "--no-fsync"],
+        cwd=cwd,
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        template = os.path.join(tmp, "template")
+        make_repo(template)
+
+        separate = os.path.join(tmp, "separate")
+        shutil.copytree(template, separate)
+        start = time.perf_counter()
+        for i in range(PACKAGES):
+            incremental(f"pkg{i}", cwd=os.path.join(separate, "packages", f"pkg{i}"))
+        old = time.perf_counter() - start
+
+        together = os.path.join(tmp, "together")
+        shutil.copytree(template, together)
+        start = time.perf_counter()
+        incremental("--discover", cwd=together)
+        new = time.perf_counter() - start
+
+    print(f"{PACKAGES} packages of {FILES} files each:")
+    print(f"one process per package {old:.2f} s, --discover {new:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
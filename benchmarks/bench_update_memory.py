@@ -0,0 +1,71 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Measure the peak memory allocated by C{incremental update} to rewrite a
+large data file, and how long it takes.
+
+Reading the whole file and rewriting it in memory, which is what
+C{incremental update} did for every file, is compared against
+L{_rewriteFile} with its default memory limit, which streams the file.
+
+Run with C{python benchmarks/bench_update_memory.py}.
+"""
+
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Tuple
+
+from incremental.update import _Replacer, _rewriteFile
+
+REPLACER = _Replacer(b"bigpackage", [(b"bigpackage NEXT", b"bigpackage 24.7.0")])
+
+SIZE = 512 * 1024 * 1024
+
+
+def make_file(path: str) -> None:
+    """
+    Write a file of C{SIZE} bytes of text lines, with a marker every
+    megabyte.
+    """
+    line = b"0123456789" * 10 + b"\n"
+    block = line * (1024 * 1024 // len(line)) + b"# bigpackage NEXT\n"
+    with open(path, "wb") as f:
+        for _ in range(SIZE // len(block)):
+            f.write(block)
+
+
+def whole(path: str) -> None:
+    with open(path, "rb") as f:
+        content = REPLACER.replace(f.read())
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def streamed(path: str) -> None:
+    _rewriteFile(path, REPLACER)
+
+
+def measure(path: str, rewrite: Callable[[str], None]) -> Tuple[float, float]:
+    make_file(path)
+    tracemalloc.start()
+    start = time.perf_counter()
+    rewrite(path)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 2**20, elapsed
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "data.txt")
+        for name, rewrite in [("whole file", whole), ("streamed", streamed)]:
+            peak, elapsed = measure(path, rewrite)
+            print(f"{name}: peak {peak:.0f} MiB, {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
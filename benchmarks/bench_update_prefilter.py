@@ -0,0 +1,70 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Time the pre-filter that C{incremental update} applies before rewriting a
+file, on a tree of small source files and large binary assets.
+
+L{_rewriteFile} is compared against reading every file in full and running
+the rewrite on it, which is what C{incremental update} did before the
+pre-filter.
+
+Run with C{python benchmarks/bench_update_prefilter.py}.
+"""
+
+import os
+import random
+import tempfile
+import timeit
+from typing import List
+
+from incremental.update import _Replacer, _rewriteFile, _UpdateStats
+
+REPLACER = _Replacer(b"bigpackage", [(b"bigpackage NEXT", b"bigpackage 24.7.0")])
+
+
+def make_tree(root: str) -> List[str]:
+    """
+    Write 2000 source files, none of which mention the package, and 20
+    binary files of 4 MiB each under C{root}.
+    """
+    rng = random.Random(0)
+    paths = []
+    for i in range(2000):
+        path = os.path.join(root, f"module{i}.py")
+        with open(path, "wb") as f:
+            f.write(b"import os\n\ndef f(x):\n    return x * 2\n" * 100)
+        paths.append(path)
+    for i in range(20):
+        path = os.path.join(root, f"asset{i}.bin")
+        with open(path, "wb") as f:
+            f.write(bytes(rng.getrandbits(8) for _ in range(1024)) * 4096)
+        paths.append(path)
+    return paths
+
+
+def read_all(paths: List[str]) -> None:
+    for path in paths:
+        with open(path, "rb") as f:
+            REPLACER.replace(f.read())
+
+
+def prefiltered(paths: List[str]) -> _UpdateStats:
+    stats = _UpdateStats()
+    for path in paths:
+        stats.record(_rewriteFile(path, REPLACER))
+    return stats
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = make_tree(tmp)
+        old = min(timeit.repeat(lambda: read_all(paths), number=3, repeat=3)) / 3
+        new = min(timeit.repeat(lambda: prefiltered(paths), number=3, repeat=3)) / 3
+        stats = prefiltered(paths)
+    print(f"{stats}")
+    print(f"read everything {old * 1e3:.1f} ms, pre-filter {new * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
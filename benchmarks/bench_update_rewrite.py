@@ -0,0 +1,122 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Measure the throughput of the rewrite done by C{incremental update} on a
+large synthetic tree of source files.
+
+The files are held in memory so that only the rewrite is timed. The
+single-pass L{_Replacer} is compared against the sequential
+L{bytes.replace} calls that C{incremental update} used to make.
+
+Run with C{python benchmarks/bench_update_rewrite.py}.
+"""
+
+import random
+import timeit
+from typing import List, Tuple
+
+from incremental.update import _Replacer
+
+PACKAGE = b"bigpackage"
+
+REPLACEMENTS = [
+    (
+        b'Version("bigpackage", 24, 7, 0, release_candidate=1)',
+        b'Version("bigpackage", 24, 7, 0)',
+    ),
+    (b"bigpackage 24.7.0rc1", b"bigpackage 24.7.0"),
+    (b'Version("bigpackage", "NEXT", 0, 0)', b'Version("bigpackage", 24, 7, 0)'),
+    (b"bigpackage NEXT", b"bigpackage 24.7.0"),
+]
+
+IMPORTS = [
+    b"import os\n",
+    b"import sys\n",
+    b"from typing import Any, Dict, List\n",
+    b"from bigpackage import util\n",
+    b"from bigpackage._version import __version__\n",
+]
+
+LINES = [
+    b"def function(argument):\n",
+    b"    return argument * 2\n",
+    b"    # A comment explaining something at length.\n",
+    b'    """\n    A docstring for the function.\n    """\n',
+    b"class Example(object):\n",
+    b"    value = util.compute(1, 2, 3)\n",
+    b"    value = bigpackage.util.compute(1, 2, 3)\n",
+    b"\n",
+]
+
+MARKERS = [
+    b'@deprecated(Version("bigpackage", "NEXT", 0, 0))\n',
+    b"# Changed in bigpackage NEXT.\n",
+]
+
+
+def make_files(count: int, lines: int, dense: bool) -> List[bytes]:
+    """
+    Generate C{count} files of C{lines} lines, one in ten of which contains
+    a marker to be replaced.
+
+    @param dense: If true, one line in eight mentions the package.
+        Otherwise, only the imports of some files do.
+    """
+    rng = random.Random(0)
+    body_lines = LINES if dense else LINES[:-2] + LINES[-1:]
+    files = []
+    for i in range(count):
+        body = rng.sample(IMPORTS, 3)
+        body += [rng.choice(body_lines) for _ in range(lines)]
+        if i % 10 == 0:
+            body.insert(rng.randrange(lines), rng.choice(MARKERS))
+        files.append(b"".join(body))
+    return files
+
+
+def sequential(files: List[bytes]) -> int:
+    changed = 0
+    for content in files:
+        original = content
+        for pattern, replacement in REPLACEMENTS:
+            content = content.replace(pattern, replacement)
+        changed += content != original
+    return changed
+
+
+def single_pass(files: List[bytes]) -> int:
+    replacer = _Replacer(PACKAGE, REPLACEMENTS)
+    changed = 0
+    for content in files:
+        changed += replacer.replace(content) is not content
+    return changed
+
+
+def measure(files: List[bytes]) -> Tuple[float, float]:
+    replacer = _Replacer(PACKAGE, REPLACEMENTS)
+    for content in files:
+        expected = content
+        for pattern, replacement in REPLACEMENTS:
+            expected = expected.replace(pattern, replacement)
+        assert replacer.replace(content) == expected
+    size = sum(map(len, files)) / 1e6
+    old = min(timeit.repeat(lambda: sequential(files), number=5, repeat=3)) / 5
+    new = min(timeit.repeat(lambda: single_pass(files), number=5, repeat=3)) / 5
+    return size / old, size / new
+
+
+def main() -> None:
+    for dense in [False, True]:
+        files = make_files(5000, 200, dense)
+        size = sum(map(len, files)) / 1e6
+        old, new = measure(files)
+        print(
+            f"{'dense' if dense else 'typical'} tree, "
+            f"{len(files)} files, {size:.1f} MB: "
+            f"sequential {old:.0f} MB/s, single pass {new:.0f} MB/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
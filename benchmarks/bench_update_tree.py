@@ -0,0 +1,172 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Time C{incremental update} over synthetic projects of 1000, 10000 and
+100000 files, made by L{synthetic_tree}, for each kind of bump.
+
+Each update runs in a fresh child process on a freshly generated tree, so
+that the peak RSS reported is that of the update alone (plus the
+interpreter) and no file is in a state left by an earlier update. Files
+per second counts every file the update looked at, whether or not it was
+read.
+
+Run with C{python benchmarks/bench_update_tree.py}. Pass C{--sizes 1000}
+for a quick run, C{--kinds} to choose the bumps, the options of
+C{synthetic_tree.py} to change the shape of the trees, and C{--output
+FILE} to save the results as JSON.
+"""
+
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from dataclasses import asdict, replace
+from typing import Any, Dict, List
+
+from synthetic_tree import TreeSpec, generate
+
+# The options of `incremental update` for each kind of bump, as keyword
+# arguments of _run. The trees start at a release candidate, so that a
+# final release can be made from them.
+KINDS: Dict[str, Dict[str, Any]] = {
+    "rc": {"rc": True},
+    "dev": {"dev": True},
+    "patch": {"patch": True},
+    "post": {"post": True},
+    "newversion": {"newversion": "25.1.0"},
+    "release": {},
+}
+
+SIZES = [1000, 10_000, 100_000]
+
+
+def peak_rss() -> int:
+    """
+    The peak resident set size of this process, in bytes.
+    """
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def child(root: str, package: str, kind: str, fsync: bool) -> None:
+    """
+    Run one update, in the child process, and print its results as JSON.
+    """
+    from incremental.update import _run
+
+    options: Dict[str, Any] = {
+        "newversion": None,
+        "patch": False,
+        "rc": False,
+        "post": False,
+        "dev": False,
+        "create": False,
+    }
+    options.update(KINDS[kind])
+    start = time.perf_counter()
+    stats = _run(
+        package=package,
+        path=None,
+        fsync=fsync,
+        _getcwd=lambda: root,
+        _print=lambda line: None,
+        **options,
+    )
+    seconds = time.perf_counter() - start
+    print(
+        json.dumps(
+            {
+                "seconds": seconds,
+                "files": stats.files,
+                "rewritten": stats.rewritten,
+                "peak_rss": peak_rss(),
+            }
+        )
+    )
+
+
+def run(spec: TreeSpec, kind: str, fsync: bool) -> Dict[str, Any]:
+    """
+    Generate a tree for C{spec} and time one update of it in a child
+    process.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, "project")
+        generate(root, spec)
+        command = [sys.executable, __file__, "--child", root, spec.package, kind]
+        if fsync:
+            command.append("--fsync")
+        output = subprocess.run(
+            command, check=True, stdout=subprocess.PIPE, text=True
+        ).stdout
+    result: Dict[str, Any] = json.loads(output)
+    return result
+
+
+def main() -> None:
+    parser = ArgumentParser()
+    parser.add_argument("--child", nargs=3, metavar=("ROOT", "PACKAGE", "KIND"))
+    parser.add_argument(
+        "--sizes",
+        type=lambda text: [int(size) for size in text.split(",")],
+        default=SIZES,
+        help="the numbers of files, comma separated",
+    )
+    parser.add_argument(
+        "--kinds",
+        type=lambda text: text.split(","),
+        default=list(KINDS),
+        help=f"the bumps, comma separated, of {', '.join(KINDS)}",
+    )
+    parser.add_argument(
+        "--fsync",
+        default=False,
+        action="store_true",
+        help="flush rewritten files to disk, as `incremental update` does by default",
+    )
+    parser.add_argument("--output", metavar="FILE", help="save the results to FILE")
+    defaults = asdict(TreeSpec(files=0))
+    del defaults["files"]
+    for name, value in defaults.items():
+        parser.add_argument(
+            "--" + name.replace("_", "-"), type=type(value), default=value
+        )
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child, fsync=args.fsync)
+        return
+
+    base = TreeSpec(files=0, **{name: getattr(args, name) for name in defaults})
+    results: List[Dict[str, Any]] = []
+    print(
+        f"{'files':>7} {'bump':<11} {'seconds':>8} {'files/s':>9} "
+        f"{'rewritten':>9} {'peak RSS':>10}"
+    )
+    for size in args.sizes:
+        for kind in args.kinds:
+            result = run(replace(base, files=size), kind, args.fsync)
+            result.update(size=size, kind=kind)
+            results.append(result)
+            print(
+                f"{size:>7} {kind:<11} {result['seconds']:>8.3f} "
+                f"{result['files'] / result['seconds']:>9.0f} "
+                f"{result['rewritten']:>9} "
+                f"{result['peak_rss'] / 1024 / 1024:>6.1f} MiB",
+                flush=True,
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"spec": asdict(base), "results": results}, f, indent=1)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Microbenchmarks for the hot paths of L{incremental.Version}: construction,
+L{Version.public}, C{repr()}, C{str()}, L{getVersionString}, every rich
+comparison and sorting, over final releases, release candidates,
+postreleases, dev releases, mixes of them and C{NEXT}.
+
+Each benchmark is timed on fresh instances, so cached sort keys don't
+carry over between repeats, and reported in nanoseconds per operation,
+the fastest of several repeats. A calibration workload in pure Python is
+timed with them, and comparisons are made relative to it.
+
+Run with C{python benchmarks/bench_version.py}. Pass C{--output FILE} to
+save the results as JSON, and C{--compare BASELINE} to compare them with
+results saved earlier; the script exits with status 1 if any benchmark is
+slower than the baseline by more than C{--threshold} (default 25%).
+C{tox -e bench} compares against C{benchmarks/bench_version_baseline.json},
+which is only meaningful on the machine and Python it was recorded with:
+refresh it there with C{--output benchmarks/bench_version_baseline.json}.
+"""
+
+import json
+import operator
+import platform
+import random
+import sys
+import time
+from argparse import ArgumentParser
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from incremental import Version, getVersionString, sort_versions
+
+# Bump when the meaning of the results changes; results in other formats
+# aren't compared.
+FORMAT = 1
+
+COUNT = 10_000
+SORT_COUNT = 100_000
+REPEAT = 10
+
+# The keyword arguments of the versions of each kind.
+_Args = Tuple[str, Any, int, int, Optional[int], Optional[int], Optional[int]]
+
+
+def make_args(kind: str, count: int, seed: int = 0) -> List[_Args]:
+    """
+    Make the arguments of C{count} versions of one package.
+
+    @param kind: C{"final"}, C{"rc"}, C{"post"}, C{"dev"}, C{"next"}, or
+        C{"mixed"} for a mix of all of them in which one in 20 is C{NEXT}.
+    """
+    rng = random.Random(seed)
+    args = []
+    for _ in range(count):
+        if kind == "next" or (kind == "mixed" and rng.randrange(20) == 0):
+            args.append(("Registry", "NEXT", 0, 0, None, None, None))
+            continue
+        rc = post = dev = None
+        if kind == "rc":
+            rc = rng.randrange(1, 4)
+        elif kind == "post":
+            post = rng.randrange(0, 3)
+        elif kind == "dev":
+            dev = rng.randrange(0, 10)
+        elif kind == "mixed":
+            rc = rng.choice([None, None, 1, 2])
+            post = rng.choice([None, None, None, 0, 1])
+            dev = rng.choice([None, None, None, 0, 3])
+        args.append(
+            (
+                "Registry",
+                rng.randrange(16, 30),
+                rng.randrange(1, 13),
+                rng.randrange(0, 5),
+                rc,
+                post,
+                dev,
+            )
+        )
+    return args
+
+
+def construct(args: List[_Args]) -> List[Version]:
+    return [
+        Version(package, major, minor, micro, release_candidate=rc, post=post, dev=dev)
+        for package, major, minor, micro, rc, post, dev in args
+    ]
+
+
+def versions(kind: str, count: int = COUNT) -> Callable[[], List[Version]]:
+    args = make_args(kind, count)
+    return lambda: construct(args)
+
+
+def pairs(kind: str) -> Callable[[], List[Tuple[Version, Version]]]:
+    args = make_args(kind, COUNT + 1)
+    # Some pairs of equal versions, so that == and != don't always stop at
+    # the first difference.
+    args[1::7] = args[0::7][: len(args[1::7])]
+
+    def prepare() -> List[Tuple[Version, Version]]:
+        made = construct(args)
+        return list(zip(made, made[1:]))
+
+    return prepare
+
+
+# name: (make the data, operate on it, the number of operations)
+Benchmark = Tuple[Callable[[], Any], Callable[[Any], object], int]
+
+
+def benchmarks() -> Dict[str, Benchmark]:
+    found: Dict[str, Benchmark] = {}
+    for kind in ["final", "rc", "post", "dev", "mixed", "next"]:
+        args = make_args(kind, COUNT)
+        found[f"construct/{kind}"] = (lambda args=args: args, construct, COUNT)
+        found[f"public/{kind}"] = (
+            versions(kind),
+            lambda vs: [v.public() for v in vs],
+            COUNT,
+        )
+        found[f"repr/{kind}"] = (versions(kind), lambda vs: list(map(repr, vs)), COUNT)
+    found["str/mixed"] = (versions("mixed"), lambda vs: list(map(str, vs)), COUNT)
+    found["getVersionString/mixed"] = (
+        versions("mixed"),
+        lambda vs: list(map(getVersionString, vs)),
+        COUNT,
+    )
+    for symbol, op in [
+        ("==", operator.eq),
+        ("!=", operator.ne),
+        ("<", operator.lt),
+        ("<=", operator.le),
+        (">", operator.gt),
+        (">=", operator.ge),
+    ]:
+        for kind in ["final", "mixed"]:
+            found[f"compare/{symbol}/{kind}"] = (
+                pairs(kind),
+                lambda ps, op=op: [op(a, b) for a, b in ps],
+                COUNT,
+            )
+    found["sort/sorted/mixed"] = (versions("mixed", SORT_COUNT), sorted, SORT_COUNT)
+    found["sort/sort_versions/mixed"] = (
+        versions("mixed", SORT_COUNT),
+        sort_versions,
+        SORT_COUNT,
+    )
+    return found
+
+
+def calibration() -> Benchmark:
+    """
+    A pure Python workload like that of the benchmarks, which doesn't use
+    L{Version}: building tuples, formatting and comparing them.
+    """
+    args = make_args("final", COUNT)
+
+    def run(data: List[_Args]) -> object:
+        made = [tuple(a) for a in data]
+        [f"{a[1]!r}.{a[2]:d}.{a[3]:d}" for a in made]
+        return [a < b for a, b in zip(made, made[1:])]
+
+    return (lambda: args, run, COUNT)
+
+
+def measure(selected: Dict[str, Benchmark], repeat: int) -> Dict[str, float]:
+    """
+    Time each of the C{selected} benchmarks on fresh data C{repeat} times.
+
+    The benchmarks are run in rounds, each of which runs every benchmark
+    once, so that a burst of activity on the machine only slows down one
+    repeat of each benchmark.
+
+    @return: The fastest time of each benchmark, in nanoseconds per
+        operation.
+    """
+    best = dict.fromkeys(selected, float("inf"))
+    for _ in range(repeat):
+        for name, (prepare, run, ops) in selected.items():
+            data = prepare()
+            start = time.perf_counter_ns()
+            run(data)
+            best[name] = min(best[name], (time.perf_counter_ns() - start) / ops)
+    return best
+
+
+def compare(
+    baseline: Dict[str, Any], results: Dict[str, Any], threshold: float
+) -> List[str]:
+    """
+    Print how C{results} compare to C{baseline}.
+
+    @return: The names of the benchmarks that are slower than the baseline
+        by more than C{threshold}.
+    """
+    if baseline.get("format") != FORMAT:
+        raise SystemExit("The baseline is in another format; record it again.")
+    for key in ["implementation", "python"]:
+        if baseline[key] != results[key]:
+            print(
+                f"warning: the baseline was recorded with {key} {baseline[key]}, "
+                f"not {results[key]}"
+            )
+    # Changes are measured relative to the calibration workload, so that a
+    # machine that is busier or slower overall doesn't look like a
+    # regression.
+    scale = baseline["calibration"] / results["calibration"]
+    print(
+        f"calibration: {baseline['calibration']} ns then, {results['calibration']} now"
+    )
+    regressions = []
+    print(f"{'benchmark':<30} {'baseline':>10} {'now':>10} {'change':>8}")
+    for name, now in results["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"{name:<30} {'-':>10} {now:>10.1f} {'new':>8}")
+            continue
+        change = now * scale / before - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<30} {before:>10.1f} {now:>10.1f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main() -> None:
+    parser = ArgumentParser()
+    parser.add_argument("--output", metavar="FILE", help="save the results to FILE")
+    parser.add_argument(
+        "--compare", metavar="BASELINE", help="compare the results to BASELINE"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="the slowdown that counts as a regression (default: 0.25)",
+    )
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument(
+        "names", nargs="*", help="only run the benchmarks starting with these"
+    )
+    args = parser.parse_args()
+
+    selected = {
+        name: benchmark
+        for name, benchmark in benchmarks().items()
+        if not args.names or name.startswith(tuple(args.names))
+    }
+    selected["calibration"] = calibration()
+    results = {
+        name: round(ns, 1) for name, ns in measure(selected, args.repeat).items()
+    }
+    report = {
+        "format": FORMAT,
+        "implementation": platform.python_implementation(),
+        "python": platform.python_version(),
+        "unit": "ns per operation",
+        "calibration": results.pop("calibration"),
+        "results": results,
+    }
+    if not args.compare:
+        for name, ns in results.items():
+            print(f"{name:<30} {ns:>10.1f} ns")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1)
+            f.write("\n")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmarks regressed: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
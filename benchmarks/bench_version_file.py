@@ -0,0 +1,66 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Time reading the version from generated C{_version.py} files, statically
+and with C{exec()}.
+
+Run with C{python benchmarks/bench_version_file.py}.
+"""
+
+import os
+import tempfile
+import timeit
+from typing import Dict
+
+from incremental import Version, _existing_version
+from incremental.update import _VERSIONPY_TEMPLATE
+
+
+def exec_version(version_path: str) -> Version:
+    """
+    Read a version the way Incremental did before the static reader.
+    """
+    version_info: Dict[str, Version] = {}
+    with open(version_path) as f:
+        exec(f.read(), version_info)
+    return version_info["__version__"]
+
+
+def main() -> None:
+    versions = [
+        Version("example", 24, 7, 2),
+        Version("example", 24, 8, 0, release_candidate=3),
+        Version("example", 24, 8, 0, release_candidate=1, post=2, dev=3),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        for version in versions:
+            version_path = os.path.join(tmp, "_version.py")
+            with open(version_path, "w") as f:
+                f.write(
+                    _VERSIONPY_TEMPLATE.format(
+                        package=version.package,
+                        version_repr=repr(version).replace("'", '"'),
+                    )
+                )
+            assert repr(_existing_version(version_path)) == repr(version)
+
+            number = 2000
+            exec_time = min(
+                timeit.repeat(
+                    lambda: exec_version(version_path), number=number, repeat=5
+                )
+            )
+            static_time = min(
+                timeit.repeat(
+                    lambda: _existing_version(version_path), number=number, repeat=5
+                )
+            )
+            print(
+                f"{version.public():>20}: exec {exec_time / number * 1e6:.1f} us, "
+                f"static {static_time / number * 1e6:.1f} us"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Measure the memory footprint of L{incremental.Version} instances.
+
+L{Version} is compared against L{DictVersion}, which stores the same
+attributes in an instance C{__dict__} as L{Version} did before it used
+C{__slots__}. The cost of L{Version} is also measured after hashing and
+sorting, which may keep state on the instances.
+
+Run with C{python benchmarks/bench_version_memory.py [COUNT]}.
+"""
+
+import sys
+import tracemalloc
+from typing import Any, Callable, List, Optional
+
+from incremental import Version, sort_versions
+
+
+class DictVersion:
+    """
+    The layout of L{Version} before it used C{__slots__}: the same
+    attributes, assigned in C{__init__}.
+    """
+
+    def __init__(
+        self,
+        package: str,
+        major: int,
+        minor: int,
+        micro: int,
+        release_candidate: Optional[int] = None,
+        prerelease: Optional[int] = None,
+        post: Optional[int] = None,
+        dev: Optional[int] = None,
+    ):
+        self.package = package
+        self.major = major
+        self.minor = minor
+        self.micro = micro
+        self.release_candidate = release_candidate
+        self.post = post
+        self.dev = dev
+
+
+def bytes_per_instance(
+    cls: Callable[..., Any], count: int, use: Callable[[List[Any]], object]
+) -> float:
+    """
+    Allocate C{count} distinct instances of C{cls}, pass them to C{use},
+    and return the average number of bytes each one costs afterwards,
+    excluding the list that holds them.
+    """
+    tracemalloc.start()
+    try:
+        start, _ = tracemalloc.get_traced_memory()
+        versions = [
+            cls("registry", 20 + i % 10, i % 12, i % 5, release_candidate=i % 3)
+            for i in range(count)
+        ]
+        use(versions)
+        end, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return (end - start - sys.getsizeof(versions)) / count
+
+
+def hash_all(versions: List[Any]) -> None:
+    for version in versions:
+        hash(version)
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print(f"{count} instances, bytes per instance:")
+    print(
+        f"  __dict__, as before __slots__: "
+        f"{bytes_per_instance(DictVersion, count, lambda vs: None):.1f}"
+    )
+    for label, use in [
+        ("Version", lambda vs: None),
+        ("Version, after hash()", hash_all),
+        ("Version, after sorted()", sorted),
+        ("Version, after sort_versions()", sort_versions),
+    ]:
+        print(f"  {label}: {bytes_per_instance(Version, count, use):.1f}")
+
+
+if __name__ == "__main__":
+    main()
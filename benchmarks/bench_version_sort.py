@@ -0,0 +1,64 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Time sorting and pairwise comparison of L{incremental.Version} instances.
+
+Run with C{python benchmarks/bench_version_sort.py [COUNT]}.
+"""
+
+import random
+import sys
+import timeit
+from typing import List
+
+from incremental import Version, max_version, sort_versions
+
+
+def make_versions(count: int, seed: int = 0) -> List[Version]:
+    """
+    Build C{count} versions of one package with a mix of release
+    candidates, postreleases and dev releases.
+    """
+    rng = random.Random(seed)
+    versions = []
+    for _ in range(count):
+        versions.append(
+            Version(
+                "Registry",
+                rng.randrange(16, 30),
+                rng.randrange(1, 13),
+                rng.randrange(0, 5),
+                release_candidate=rng.choice([None, None, 1, 2]),
+                post=rng.choice([None, None, None, 0, 1]),
+                dev=rng.choice([None, None, None, 0, 3]),
+            )
+        )
+    return versions
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    versions = make_versions(count)
+    pairs = list(zip(versions, versions[1:]))
+
+    sort_time = min(timeit.repeat(lambda: sorted(versions), number=1, repeat=5))
+    sort_versions_time = min(
+        timeit.repeat(lambda: sort_versions(versions), number=1, repeat=5)
+    )
+    max_time = min(timeit.repeat(lambda: max(versions), number=1, repeat=5))
+    max_version_time = min(
+        timeit.repeat(lambda: max_version(versions), number=1, repeat=5)
+    )
+    lt_time = min(timeit.repeat(lambda: [a < b for a, b in pairs], number=1, repeat=5))
+    eq_time = min(timeit.repeat(lambda: [a == b for a, b in pairs], number=1, repeat=5))
+    print(f"sorted() of {count} versions: {sort_time * 1000:.1f} ms")
+    print(f"sort_versions() of {count} versions: {sort_versions_time * 1000:.1f} ms")
+    print(f"max() of {count} versions: {max_time * 1000:.1f} ms")
+    print(f"max_version() of {count} versions: {max_version_time * 1000:.1f} ms")
+    print(f"{len(pairs)} x '<': {lt_time * 1000:.1f} ms")
+    print(f"{len(pairs)} x '==': {eq_time * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
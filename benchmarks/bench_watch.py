@@ -0,0 +1,90 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Time a release candidate update of a package of 20000 files, 20 of which
+contain markers: C{incremental update}, which walks and reads the package,
+against a request to an C{incremental watch} daemon that already knows
+where the markers are.
+
+Run with C{python benchmarks/bench_watch.py}.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+
+from incremental._config import _ScanScope
+from incremental._watch import _Watcher
+from incremental.update import _run
+
+FILES = 20000
+MARKED = 20
+
+
+def make_package(root: str) -> str:
+    """
+    Write a package of C{FILES} modules under C{root}, in directories of
+    100, C{MARKED} of which contain a marker.
+
+    @return: The package directory.
+    """
+    packagedir = os.path.join(root, "bigpackage")
+    for i in range(FILES):
+        dirpath = os.path.join(packagedir, f"sub{i // 100}")
+        os.makedirs(dirpath, exist_ok=True)
+        with open(os.path.join(dirpath, f"module{i}.py"), "w") as f:
+            f.write("from bigpackage import util\n" * 50)
+            if i % (FILES // MARKED) == 0:
+                f.write("# Changed in bigpackage NEXT.\n")
+    with open(os.path.join(packagedir, "_version.py"), "w") as f:
+        f.write(
+            "from incremental import Version\n"
+            '__version__ = Version("bigpackage", 24, 7, 0)\n'
+        )
+    return packagedir
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        template = make_package(os.path.join(tmp, "template"))
+
+        walked = shutil.copytree(template, os.path.join(tmp, "walked", "bigpackage"))
+        start = time.perf_counter()
+        _run(
+            package="bigpackage",
+            path=walked,
+            newversion=None,
+            patch=False,
+            rc=True,
+            post=False,
+            dev=False,
+            create=False,
+            fsync=False,
+            _print=lambda line: None,
+        )
+        old = time.perf_counter() - start
+
+        watched = shutil.copytree(template, os.path.join(tmp, "watched", "bigpackage"))
+        start = time.perf_counter()
+        watcher = _Watcher("bigpackage", watched, _ScanScope())
+        initial = time.perf_counter() - start
+        try:
+            start = time.perf_counter()
+            stats = watcher.bump(rc=True, fsync=False, _print=lambda line: None)
+            new = time.perf_counter() - start
+            mode = "polling" if watcher.inotify is None else "inotify"
+        finally:
+            watcher.close()
+
+    print(f"{FILES} files, {MARKED} with markers, {mode}:")
+    print(
+        f"incremental update {old * 1e3:.0f} ms, "
+        f"daemon update {new * 1e3:.1f} ms ({stats.files} files read), "
+        f"after an initial scan of {initial * 1e3:.0f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
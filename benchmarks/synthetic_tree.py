@@ -0,0 +1,183 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Generate deterministic synthetic projects for benchmarking
+C{incremental update}.
+
+A project has a C{pyproject.toml} and a package under C{src/} of source
+files and binary assets, spread over nested directories. The same options
+and seed always give the same tree.
+
+Run with C{python benchmarks/synthetic_tree.py DEST --files 10000}; see
+C{--help} for the other options.
+"""
+
+import math
+import os
+import random
+from argparse import ArgumentParser
+from dataclasses import asdict, dataclass
+from typing import List
+
+
+@dataclass(frozen=True)
+class TreeSpec:
+    """
+    The shape of a synthetic project.
+    """
+
+    files: int
+    """
+    The number of files in the package, including C{_version.py}.
+    """
+
+    package: str = "synthpkg"
+    """
+    The name of the package.
+    """
+
+    version: str = "24, 7, 0, release_candidate=1"
+    """
+    The arguments of L{Version} after the package name for the version in
+    C{_version.py}, as Python source.
+    """
+
+    marker_density: float = 0.01
+    """
+    The fraction of source files that contain markers.
+    """
+
+    binary_ratio: float = 0.05
+    """
+    The fraction of files that are binary assets.
+    """
+
+    depth: int = 3
+    """
+    How many levels of directories the files are spread over.
+    """
+
+    fanout: int = 8
+    """
+    The number of subdirectories of each directory, above the deepest
+    level.
+    """
+
+    size_median: int = 4096
+    """
+    The median size of a file, in bytes.
+    """
+
+    size_sigma: float = 1.0
+    """
+    The spread of file sizes: sizes are log-normally distributed with this
+    standard deviation of their natural logarithm.
+    """
+
+    size_max: int = 4 * 1024 * 1024
+    """
+    The largest size of a file, in bytes.
+    """
+
+    seed: int = 0
+
+
+def directories(spec: TreeSpec) -> List[str]:
+    """
+    List the directories of the package that files are put in, relative
+    to the package directory: every directory at the deepest level.
+    """
+    dirs = [""]
+    for _ in range(spec.depth):
+        dirs = [
+            os.path.join(parent, f"sub{i}")
+            for parent in dirs
+            for i in range(spec.fanout)
+        ]
+    return dirs
+
+
+def source(rng: random.Random, spec: TreeSpec, size: int, marked: bool) -> bytes:
+    """
+    Make a Python source file of about C{size} bytes which mentions the
+    package, and, if C{marked}, contains markers of each kind.
+    """
+    lines = [
+        f"from {spec.package} import util\n",
+        "from incremental import Version\n",
+        "\n",
+    ]
+    if marked:
+        lines.append(f'added = Version("{spec.package}", "NEXT", 0, 0)\n')
+        lines.append(f"# Changed in {spec.package} NEXT.\n")
+        if "release_candidate" in spec.version:
+            lines.append(f'# Deprecated in Version("{spec.package}", {spec.version})\n')
+    body = []
+    length = sum(map(len, lines))
+    while length < size:
+        line = (
+            f"def f{rng.randrange(1 << 20)}(x):\n    return x * {rng.randrange(100)}\n"
+        )
+        body.append(line)
+        length += len(line)
+    if marked:
+        # Put the markers at a random point in the file, not only the top.
+        body.insert(rng.randrange(len(body) + 1), lines.pop())
+    return "".join(lines + body).encode("utf-8")
+
+
+def generate(root: str, spec: TreeSpec) -> str:
+    """
+    Write the project described by C{spec} in C{root}, which must not
+    exist.
+
+    @return: The package directory.
+    """
+    rng = random.Random(spec.seed)
+    packagedir = os.path.join(root, "src", spec.package)
+    os.makedirs(packagedir)
+    with open(os.path.join(root, "pyproject.toml"), "w") as f:
+        f.write(f'[project]\nname = "{spec.package}"\n\n[tool.incremental]\n')
+    with open(os.path.join(packagedir, "_version.py"), "w") as f:
+        f.write(
+            "from incremental import Version\n\n"
+            f'__version__ = Version("{spec.package}", {spec.version})\n'
+        )
+
+    dirs = directories(spec)
+    for reldir in dirs:
+        os.makedirs(os.path.join(packagedir, reldir), exist_ok=True)
+    mu = math.log(spec.size_median)
+    # A few bytes of binary data, repeated, are enough to look binary and
+    # cheap to make.
+    blob = b"\0" + bytes(rng.getrandbits(8) for _ in range(4095))
+    for i in range(spec.files - 1):
+        size = min(int(rng.lognormvariate(mu, spec.size_sigma)), spec.size_max)
+        dirpath = os.path.join(packagedir, dirs[i % len(dirs)])
+        if rng.random() < spec.binary_ratio:
+            path = os.path.join(dirpath, f"asset{i}.bin")
+            content = (blob * (size // len(blob) + 1))[: max(size, 1)]
+        else:
+            path = os.path.join(dirpath, f"module{i}.py")
+            content = source(rng, spec, size, rng.random() < spec.marker_density)
+        with open(path, "wb") as f:
+            f.write(content)
+    return packagedir
+
+
+def main() -> None:
+    parser = ArgumentParser()
+    parser.add_argument("root", metavar="DEST")
+    for name, value in asdict(TreeSpec(files=1000)).items():
+        parser.add_argument(
+            "--" + name.replace("_", "-"), type=type(value), default=value
+        )
+    args = vars(parser.parse_args())
+    root = args.pop("root")
+    spec = TreeSpec(**args)
+    print(generate(root, spec))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,14 +7,18 @@ Versions for Python packages.
 See L{Version}.
 """
 
+from __future__ import annotations
+
 import os
-import sys
-import warnings
-from dataclasses import dataclass
-from typing import TYPE_CHECKING, Any, BinaryIO, Dict, Literal, Optional, Union
 
+# Importing typing costs as much as the rest of this module, and every
+# setuptools build imports it, so type-only imports are guarded.
+TYPE_CHECKING = False
 if TYPE_CHECKING:
-    from distutils.dist import Distribution as _Distribution
+    from typing import Any, Iterable, Literal, Tuple
+
+    _ReleaseKey = Tuple[float, int, int, float, int, float]
+    _SortKey = Tuple[str, float, int, int, float, int, float]
 
 
 #
@@ -73,6 +77,10 @@ class _Inf:
 
 _inf = _Inf()
 
+# Stands in for missing version components in Version.sort_key. A float
+# compares against ints much faster than _inf does.
+_INF_KEY = float("inf")
+
 
 class IncomparableVersions(TypeError):
     """
@@ -87,18 +95,41 @@ class Version:
 
     This class supports the standard major.minor.micro[rcN] scheme of
     versioning.
+
+    Instances are immutable and use C{__slots__}, so they are cheap to hold
+    in large numbers.
     """
 
+    __slots__ = (
+        "package",
+        "major",
+        "minor",
+        "micro",
+        "release_candidate",
+        "post",
+        "dev",
+        "_hash",
+    )
+
+    package: str
+    major: Literal["NEXT"] | int
+    minor: int
+    micro: int
+    release_candidate: int | None
+    post: int | None
+    dev: int | None
+    _hash: int
+
     def __init__(
         self,
         package: str,
-        major: Union[Literal["NEXT"], int],
+        major: Literal["NEXT"] | int,
         minor: int,
         micro: int,
-        release_candidate: Optional[int] = None,
-        prerelease: Optional[int] = None,
-        post: Optional[int] = None,
-        dev: Optional[int] = None,
+        release_candidate: int | None = None,
+        prerelease: int | None = None,
+        post: int | None = None,
+        dev: int | None = None,
     ):
         """
         @param package: Name of the package that this is a version of.
@@ -122,6 +153,8 @@ class Version:
             raise ValueError("Please only return one of these.")
         elif prerelease and not release_candidate:
             release_candidate = prerelease
+            import warnings
+
             warnings.warn(
                 "Passing prerelease to incremental.Version was "
                 "deprecated in Incremental 16.9.0. Please pass "
@@ -136,16 +169,96 @@ class Version:
                     "When using NEXT, all other values except Package must be 0."
                 )
 
-        self.package = package
-        self.major = major
-        self.minor = minor
-        self.micro = micro
-        self.release_candidate = release_candidate
-        self.post = post
-        self.dev = dev
+        _set = object.__setattr__
+        _set(self, "package", package)
+        _set(self, "major", major)
+        _set(self, "minor", minor)
+        _set(self, "micro", micro)
+        _set(self, "release_candidate", release_candidate)
+        _set(self, "post", post)
+        _set(self, "dev", dev)
+
+    def __setattr__(self, name: str, value: object) -> None:
+        raise AttributeError(f"{self.__class__.__name__} instances are immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"{self.__class__.__name__} instances are immutable")
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        """
+        Pickle by constructor arguments, as the slots can't be assigned
+        after construction.
+        """
+        return (
+            self.__class__,
+            (
+                self.package,
+                self.major,
+                self.minor,
+                self.micro,
+                self.release_candidate,
+                None,
+                self.post,
+                self.dev,
+            ),
+        )
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        """
+        Unpickle the instance dictionary that L{Version} was pickled as
+        before it used C{__slots__}.
+        """
+        _set = object.__setattr__
+        _set(self, "package", state["package"])
+        _set(self, "major", state["major"])
+        _set(self, "minor", state["minor"])
+        _set(self, "micro", state["micro"])
+        _set(
+            self,
+            "release_candidate",
+            state.get("release_candidate", state.get("prerelease")),
+        )
+        _set(self, "post", state.get("post"))
+        _set(self, "dev", state.get("dev"))
+
+    @classmethod
+    def parse(cls, package: str, text: str) -> Version:
+        """
+        Parse a PEP 440 version string, such as C{"24.7.0rc1"}, into a
+        L{Version}.
+
+        Strings in the canonical form produced by L{Version.public} are
+        parsed without importing C{packaging}, and results are kept in a
+        bounded LRU cache, so parsing the same string repeatedly is cheap.
+        Any other PEP 440 string is handed to C{packaging}.
+
+        @param package: Name of the package that this is a version of.
+        @param text: The version string. C{"NEXT"} produces a NEXT version.
+
+        @raise ValueError: when C{text} isn't a valid version, or has parts
+            that a L{Version} can't represent: more than three release
+            components, an epoch, a local version label, or an alpha or beta
+            prerelease.
+        """
+        from ._parse import _parseVersion
+
+        version = _parseVersion(package, text)
+        if cls is Version:
+            return version
+        return cls(
+            version.package,
+            version.major,
+            version.minor,
+            version.micro,
+            release_candidate=version.release_candidate,
+            post=version.post,
+            dev=version.dev,
+        )
 
     @property
-    def prerelease(self) -> Optional[int]:
+    def prerelease(self) -> int | None:
+        import warnings
+
         warnings.warn(
             "Accessing incremental.Version.prerelease was "
             "deprecated in Incremental 16.9.0. Use "
@@ -215,6 +328,51 @@ class Version:
     def __str__(self) -> str:
         return f"[{self.package}, version {self.short()}]"
 
+    @property
+    def sort_key(self) -> _SortKey:
+        """
+        A tuple which orders the same way as this version.
+
+        The first element is the lowercased package name, so versions of
+        different packages sort by name rather than raising
+        L{IncomparableVersions}. The rest are the major, minor and micro
+        versions, the release candidate, the postrelease and the dev
+        release, with missing components replaced by values that order as
+        described in L{Version.__cmp__}.
+
+        The key is built on each access rather than kept on the instance,
+        so that holding many versions stays cheap. It is also a way to use
+        versions of several packages as dictionary keys or set members:
+        see L{Version.__hash__}.
+        """
+        return (
+            self.package.lower(),
+            _INF_KEY if self.major == "NEXT" else self.major,
+            self.minor,
+            self.micro,
+            _INF_KEY if self.release_candidate is None else self.release_candidate,
+            -1 if self.post is None else self.post,
+            _INF_KEY if self.dev is None else self.dev,
+        )
+
+    def __hash__(self) -> int:
+        """
+        Hash the version consistently with equality. The hash is cached on
+        the instance.
+
+        Versions of different packages hash differently, but as C{==} raises
+        L{IncomparableVersions} for them, a set or dictionary mixing
+        packages raises it in the rare case that two of their hashes
+        collide. Key such collections on L{Version.sort_key} instead.
+        """
+        try:
+            return self._hash
+        except AttributeError:
+            pass
+        result = hash(self.sort_key)
+        object.__setattr__(self, "_hash", result)
+        return result
+
     def __cmp__(self, other: object) -> int:
         """
         Compare two versions, considering major versions, minor versions, micro
@@ -244,90 +402,83 @@ class Version:
             # doesn't seem to be possible to correctly type-annotate this method.
             # See https://github.com/python/mypy/issues/4791 for more weirdness.
             return NotImplemented  # type: ignore[no-any-return]
-        if self.package.lower() != other.package.lower():
+        if self.package != other.package and (
+            self.package.lower() != other.package.lower()
+        ):
             raise IncomparableVersions(f"{self.package!r} != {other.package!r}")
+        key = _releaseKey(self)
+        otherkey = _releaseKey(other)
+        return _cmp(key, otherkey)
 
-        if self.major == "NEXT":
-            major: Union[int, _Inf] = _inf
-        else:
-            major = self.major
-
-        if self.release_candidate is None:
-            release_candidate: Union[int, _Inf] = _inf
-        else:
-            release_candidate = self.release_candidate
-
-        if self.post is None:
-            post = -1
-        else:
-            post = self.post
-
-        if self.dev is None:
-            dev: Union[int, _Inf] = _inf
-        else:
-            dev = self.dev
-
-        if other.major == "NEXT":
-            othermajor: Union[int, _Inf] = _inf
-        else:
-            othermajor = other.major
-
-        if other.release_candidate is None:
-            otherrc: Union[int, _Inf] = _inf
-        else:
-            otherrc = other.release_candidate
-
-        if other.post is None:
-            otherpost = -1
-        else:
-            otherpost = other.post
-
-        if other.dev is None:
-            otherdev: Union[int, _Inf] = _inf
-        else:
-            otherdev = other.dev
-
-        x = _cmp(
-            (major, self.minor, self.micro, release_candidate, post, dev),
-            (othermajor, other.minor, other.micro, otherrc, otherpost, otherdev),
-        )
-        return x
+    # The rich comparisons below duplicate the body of __cmp__ rather than
+    # calling it, as they are on the hot path of sorting. The package names
+    # are only lowercased when they differ.
 
     def __eq__(self, other: object) -> bool:
-        c = self.__cmp__(other)
-        if c is NotImplemented:
-            return c  # type: ignore[return-value]
-        return c == 0
+        if not isinstance(other, self.__class__):
+            return NotImplemented
+        if self.package != other.package and (
+            self.package.lower() != other.package.lower()
+        ):
+            raise IncomparableVersions(f"{self.package!r} != {other.package!r}")
+        key = _releaseKey(self)
+        otherkey = _releaseKey(other)
+        return key == otherkey
 
     def __ne__(self, other: object) -> bool:
-        c = self.__cmp__(other)
-        if c is NotImplemented:
-            return c  # type: ignore[return-value]
-        return c != 0
+        if not isinstance(other, self.__class__):
+            return NotImplemented
+        if self.package != other.package and (
+            self.package.lower() != other.package.lower()
+        ):
+            raise IncomparableVersions(f"{self.package!r} != {other.package!r}")
+        key = _releaseKey(self)
+        otherkey = _releaseKey(other)
+        return key != otherkey
 
     def __lt__(self, other: object) -> bool:
-        c = self.__cmp__(other)
-        if c is NotImplemented:
-            return c  # type: ignore[return-value]
-        return c < 0
+        if not isinstance(other, self.__class__):
+            return NotImplemented
+        if self.package != other.package and (
+            self.package.lower() != other.package.lower()
+        ):
+            raise IncomparableVersions(f"{self.package!r} != {other.package!r}")
+        key = _releaseKey(self)
+        otherkey = _releaseKey(other)
+        return key < otherkey
 
     def __le__(self, other: object) -> bool:
-        c = self.__cmp__(other)
-        if c is NotImplemented:
-            return c  # type: ignore[return-value]
-        return c <= 0
+        if not isinstance(other, self.__class__):
+            return NotImplemented
+        if self.package != other.package and (
+            self.package.lower() != other.package.lower()
+        ):
+            raise IncomparableVersions(f"{self.package!r} != {other.package!r}")
+        key = _releaseKey(self)
+        otherkey = _releaseKey(other)
+        return key <= otherkey
 
     def __gt__(self, other: object) -> bool:
-        c = self.__cmp__(other)
-        if c is NotImplemented:
-            return c  # type: ignore[return-value]
-        return c > 0
+        if not isinstance(other, self.__class__):
+            return NotImplemented
+        if self.package != other.package and (
+            self.package.lower() != other.package.lower()
+        ):
+            raise IncomparableVersions(f"{self.package!r} != {other.package!r}")
+        key = _releaseKey(self)
+        otherkey = _releaseKey(other)
+        return key > otherkey
 
     def __ge__(self, other: object) -> bool:
-        c = self.__cmp__(other)
-        if c is NotImplemented:
-            return c  # type: ignore[return-value]
-        return c >= 0
+        if not isinstance(other, self.__class__):
+            return NotImplemented
+        if self.package != other.package and (
+            self.package.lower() != other.package.lower()
+        ):
+            raise IncomparableVersions(f"{self.package!r} != {other.package!r}")
+        key = _releaseKey(self)
+        otherkey = _releaseKey(other)
+        return key >= otherkey
 
 
 def getVersionString(version: Version) -> str:
@@ -341,211 +492,190 @@ def getVersionString(version: Version) -> str:
     return result
 
 
-def _findPath(path: str, package: str) -> str:
+def _releaseKey(version: Version) -> _ReleaseKey:
     """
-    Determine the package root directory.
-
-    The result is one of:
-
-        - src/{package}
-        - {package}
-
-    Where {package} is downcased.
-    """
-    src_dir = os.path.join(path, "src", package.lower())
-    current_dir = os.path.join(path, package.lower())
-
-    if os.path.isdir(src_dir):
-        return src_dir
-    elif os.path.isdir(current_dir):
-        return current_dir
-    else:
-        raise ValueError(
-            f"Can't find the directory of project {package}: I looked in {src_dir} and {current_dir}"
-        )
-
-
-def _existing_version(version_path: str) -> Version:
+    L{Version.sort_key} without the package name.
     """
-    Load the current version from a ``_version.py`` file.
-    """
-    version_info: Dict[str, Version] = {}
+    return (
+        _INF_KEY if version.major == "NEXT" else version.major,
+        version.minor,
+        version.micro,
+        _INF_KEY if version.release_candidate is None else version.release_candidate,
+        -1 if version.post is None else version.post,
+        _INF_KEY if version.dev is None else version.dev,
+    )
 
-    with open(version_path) as f:
-        exec(f.read(), version_info)
 
-    return version_info["__version__"]
+def _versionSortKey(version: Version) -> _SortKey:
+    return version.sort_key
 
 
-def _get_setuptools_version(dist: "_Distribution") -> None:
+def sort_versions(versions: Iterable[Version], reverse: bool = False) -> list[Version]:
     """
-    Setuptools integration: load the version from the working directory
-
-    This function is registered as a setuptools.finalize_distribution_options
-    entry point [1]. Consequently, it is called in all sorts of weird
-    contexts. In setuptools, silent failure is the law.
+    Sort versions, grouping them by case-insensitive package name.
 
-    [1]: https://setuptools.pypa.io/en/latest/userguide/extension.html#customizing-distribution-options
+    This is equivalent to, but faster than, C{sorted(versions)} for versions
+    of a single package. Versions of different packages don't raise
+    L{IncomparableVersions}; they are ordered by lowercased package name
+    first.
 
-    @param dist:
-        A (possibly) empty C{setuptools.Distribution} instance to mutate.
-        There may be some metadata here if a `setup.py` called `setup()`,
-        but this hook is always called before setuptools loads anything
-        from ``pyproject.toml``.
+    @param versions: The versions to sort.
+    @param reverse: Sort in descending order.
+    @return: A new list of the versions.
     """
-    try:
-        # When operating in a packaging context (i.e. building an sdist or
-        # wheel) pyproject.toml will always be found in the current working
-        # directory.
-        config = _load_pyproject_toml("./pyproject.toml")
-    except Exception:
-        return
-
-    if not config.opt_in:
-        return
-
-    try:
-        version = _existing_version(config.version_path)
-    except FileNotFoundError:
-        return
+    return sorted(versions, key=_versionSortKey, reverse=reverse)
 
-    dist.metadata.version = version.public()
 
-
-def _get_distutils_version(
-    dist: "_Distribution", keyword: object, value: object
-) -> None:
+def _extremeVersions(
+    versions: Iterable[Version], greatest: bool, kind: str | None = None
+) -> dict[str, Version]:
     """
-    Distutils integration: get the version from the package listed in the Distribution.
-
-    This function is invoked when a C{setup.py} calls C{setup(use_incremental=True)}.
+    Find the greatest or least version of each package in a single pass.
 
-    @see: https://setuptools.pypa.io/en/latest/userguide/extension.html#adding-arguments
+    @param kind: If given, only consider versions for which
+        L{_isReleaseKind} is true.
     """
-    if not value:  # use_incremental=False
-        return  # pragma: no cover
-
-    from setuptools.command import build_py  # type: ignore
-
-    sp_command = build_py.build_py(dist)
-    sp_command.finalize_options()
-
-    for item in sp_command.find_all_modules():
-        if item[1] == "_version":
-            version_path = os.path.join(os.path.dirname(item[2]), "_version.py")
-            dist.metadata.version = _existing_version(version_path).public()
-            return
+    best: dict[str, tuple[_SortKey, Version]] = {}
+    for version in versions:
+        if kind is not None and not _isReleaseKind(version, kind):
+            continue
+        key = version.sort_key
+        current = best.get(key[0])
+        if (
+            current is None
+            or (greatest and key > current[0])
+            or (not greatest and key < current[0])
+        ):
+            best[key[0]] = (key, version)
+    return {package: version for package, (key, version) in best.items()}
+
+
+def max_version(versions: Iterable[Version]) -> dict[str, Version]:
+    """
+    Find the greatest version of each package.
 
-    raise Exception("No _version.py found.")  # pragma: no cover
+    @param versions: The versions to consider.
+    @return: A mapping of lowercased package name to the greatest version
+        of that package.
+    """
+    return _extremeVersions(versions, True)
 
 
-def _load_toml(f: BinaryIO) -> Any:
+def min_version(versions: Iterable[Version]) -> dict[str, Version]:
     """
-    Read the content of a TOML file.
-    """
-    # This import is deferred to avoid a hard dependency on tomli
-    # when no pyproject.toml is present.
-    if sys.version_info > (3, 11):
-        import tomllib
-    else:
-        import tomli as tomllib
+    Find the least version of each package.
 
-    return tomllib.load(f)
+    @param versions: The versions to consider.
+    @return: A mapping of lowercased package name to the least version of
+        that package.
+    """
+    return _extremeVersions(versions, False)
 
 
-@dataclass(frozen=True)
-class _IncrementalConfig:
-    """
-    Configuration loaded from a ``pyproject.toml`` file.
+def _isReleaseKind(version: Version, kind: str) -> bool:
     """
-
-    opt_in: bool
+    Does C{version} belong to the given kind of release?
     """
-    Does the pyproject.toml file contain a [tool.incremental]
-    section? This indicates that the package has explicitly
-    opted-in to Incremental versioning.
+    if version.major == "NEXT":
+        return False
+    if kind == "final":
+        return version.release_candidate is None and version.dev is None
+    if kind == "rc":
+        return version.release_candidate is not None and version.dev is None
+    return version.dev is not None
+
+
+def latest_release(
+    versions: Iterable[Version], kind: Literal["final", "rc", "dev"] = "final"
+) -> dict[str, Version]:
     """
+    Find the latest release of a given kind for each package.
 
-    package: str
-    """The project name, capitalized as in the project metadata."""
-
-    path: str
-    """Path to the package root"""
+    NEXT versions are never releases, so they are ignored.
 
-    @property
-    def version_path(self) -> str:
-        """Path of the ``_version.py`` file. May not exist."""
-        return os.path.join(self.path, "_version.py")
-
-
-def _load_pyproject_toml(toml_path: str) -> _IncrementalConfig:
+    @param versions: The versions to consider.
+    @param kind: C{"final"} for full releases and their postreleases,
+        C{"rc"} for release candidates, or C{"dev"} for development
+        releases.
+    @return: A mapping of lowercased package name to the greatest version
+        of that kind. Packages with no such version are omitted.
     """
-    Load Incremental configuration from a ``pyproject.toml``
+    if kind not in ("final", "rc", "dev"):
+        raise ValueError(f"Unknown kind of release: {kind!r}")
+    return _extremeVersions(versions, True, kind)
 
-    If the [tool.incremental] section is empty we take the project name
-    from the [project] section. Otherwise we require only a C{name} key
-    specifying the project name. Other keys are forbidden to allow future
-    extension and catch typos.
 
-    @param toml_path:
-        Path to the ``pyproject.toml`` to load.
+def _findPath(path: str, package: str) -> str:
     """
-    with open(toml_path, "rb") as f:
-        data = _load_toml(f)
-
-    tool_incremental = _extract_tool_incremental(data)
+    Determine the package root directory.
 
-    # Extract the project name
-    package = None
-    if tool_incremental is not None and "name" in tool_incremental:
-        package = tool_incremental["name"]
-    if package is None:
-        # Try to fall back to [project]
-        try:
-            package = data["project"]["name"]
-        except KeyError:
-            pass
-    if package is None:
-        # We can't proceed without a project name.
-        raise ValueError("""\
-Incremental failed to extract the project name from pyproject.toml. Specify it like:
+    The result is one of:
 
-    [project]
-    name = "Foo"
+        - src/{package}
+        - {package}
 
-Or:
+    Where {package} is downcased.
+    """
+    src_dir = os.path.join(path, "src", package.lower())
+    current_dir = os.path.join(path, package.lower())
 
-    [tool.incremental]
-    name = "Foo"
+    if os.path.isdir(src_dir):
+        return src_dir
+    elif os.path.isdir(current_dir):
+        return current_dir
+    else:
+        raise ValueError(
+            f"Can't find the directory of project {package}: I looked in {src_dir} and {current_dir}"
+        )
 
-""")
-    if not isinstance(package, str):
-        raise TypeError(f"The project name must be a string, but found {type(package)}")
 
-    return _IncrementalConfig(
-        opt_in=tool_incremental is not None,
-        package=package,
-        path=_findPath(os.path.dirname(toml_path), package),
-    )
+def _existing_version(version_path: str) -> Version:
+    """
+    Load the current version from a ``_version.py`` file.
 
+    Files in the format that Incremental generates are parsed directly.
+    Others are executed.
+    """
+    from ._parse import _readVersionStatically
 
-def _extract_tool_incremental(data: Dict[str, object]) -> Optional[Dict[str, object]]:
-    if "tool" not in data:
-        return None
-    if not isinstance(data["tool"], dict):
-        raise ValueError("[tool] must be a table")
-    if "incremental" not in data["tool"]:
-        return None
+    with open(version_path) as f:
+        source = f.read()
 
-    tool_incremental = data["tool"]["incremental"]
-    if not isinstance(tool_incremental, dict):
-        raise ValueError("[tool.incremental] must be a table")
+    version = _readVersionStatically(source)
+    if version is not None:
+        return version
 
-    if not {"name"}.issuperset(tool_incremental.keys()):
-        raise ValueError("Unexpected key(s) in [tool.incremental]")
-    return tool_incremental
+    version_info: dict[str, Version] = {}
+    exec(source, version_info)
+    return version_info["__version__"]
 
 
-from ._version import __version__  # noqa: E402
+if TYPE_CHECKING:
+    from ._version import __version__
+else:
 
-__all__ = ["__version__", "Version", "getVersionString"]
+    def __getattr__(name: str) -> object:
+        """
+        Import rarely-needed attributes on first access.
+        """
+        if name == "__version__":
+            from ._version import __version__
+
+            return __version__
+        if name in ("_get_setuptools_version", "_get_distutils_version"):
+            # Entry points registered by earlier versions of Incremental.
+            from . import _hooks
+
+            return getattr(_hooks, name)
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = [
+    "__version__",
+    "Version",
+    "getVersionString",
+    "sort_versions",
+    "max_version",
+    "min_version",
+    "latest_release",
+]
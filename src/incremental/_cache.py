@@ -0,0 +1,171 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+An opt-in on-disk cache for the build hooks.
+
+A single PEP 517 build may call Incremental's hooks many times, each in a
+fresh process. When the C{INCREMENTAL_CACHE_DIR} environment variable names
+a directory, the results of parsing ``pyproject.toml`` and reading
+``_version.py`` are stored there, keyed by the absolute path of the source
+file. An entry is valid while the file's content hash matches, so a fresh
+checkout of the same tree can reuse the entries of a previous build. The
+modification time and size aren't trusted on their own: an rc1 to rc2 bump
+doesn't change the size of ``_version.py``, and restoring a tree can restore
+its old modification times. Both files are small enough to hash every time.
+"""
+
+import os
+from typing import Any, Callable, Optional, TypeVar
+
+from incremental import Version, _existing_version
+from incremental._config import _IncrementalConfig, _load_pyproject_toml
+
+_CACHE_DIR_ENV = "INCREMENTAL_CACHE_DIR"
+
+_T = TypeVar("_T")
+
+
+def _cached(
+    kind: str,
+    path: str,
+    compute: Callable[[], _T],
+    dump: Callable[[_T], object],
+    load: Callable[[Any], Optional[_T]],
+) -> _T:
+    """
+    Return the cached result of C{compute()} for the file at C{path}.
+
+    Errors reading or writing the cache are ignored: the cache must never
+    break a build. Exceptions raised by C{compute} aren't cached.
+
+    @param kind: Distinguishes the results of different computations on
+        the same file.
+    @param dump: Convert a result into a JSON-serializable value.
+    @param load: Convert a value produced by C{dump} back into a result, or
+        return L{None} if the result is no longer valid.
+    """
+    cache_dir = os.environ.get(_CACHE_DIR_ENV)
+    if not cache_dir:
+        return compute()
+
+    import hashlib
+    import json
+
+    path = os.path.abspath(path)
+    entry_name = hashlib.sha256(f"{kind}\0{path}".encode()).hexdigest()
+    entry_path = os.path.join(cache_dir, entry_name + ".json")
+
+    try:
+        with open(path, "rb") as source:
+            digest = hashlib.sha256(source.read()).hexdigest()
+    except OSError:
+        # Let compute() raise whatever error is appropriate.
+        return compute()
+
+    entry: Any
+    try:
+        with open(entry_path, encoding="utf-8") as entry_file:
+            entry = json.load(entry_file)
+        if entry["path"] != path:
+            entry = None
+    except (OSError, ValueError, KeyError, TypeError):
+        entry = None
+
+    if entry is not None and entry.get("sha256") == digest:
+        try:
+            result = load(entry["value"])
+        except (ValueError, KeyError, TypeError):
+            result = None
+        if result is not None:
+            return result
+
+    result = compute()
+    entry = {"path": path, "sha256": digest, "value": dump(result)}
+    temp_path = f"{entry_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(temp_path, "w", encoding="utf-8") as entry_file:
+            json.dump(entry, entry_file)
+        os.replace(temp_path, entry_path)
+    except OSError:
+        pass
+
+    return result
+
+
+def _dumpConfig(config: _IncrementalConfig, toml_dir: str) -> object:
+    return {
+        "opt_in": config.opt_in,
+        "package": config.package,
+        "path": os.path.relpath(config.path, toml_dir),
+    }
+
+
+def _loadConfig(value: Any, toml_dir: str) -> Optional[_IncrementalConfig]:
+    config = _IncrementalConfig(
+        opt_in=value["opt_in"],
+        package=value["package"],
+        path=os.path.join(toml_dir, value["path"]),
+    )
+    # The package directory isn't part of the key, so check it still exists.
+    if not os.path.isdir(config.path):
+        return None
+    return config
+
+
+def _cached_pyproject_toml(toml_path: str) -> _IncrementalConfig:
+    """
+    L{_load_pyproject_toml}, cached when C{INCREMENTAL_CACHE_DIR} is set.
+
+    The package directory is stored relative to the directory of
+    C{pyproject.toml}, and joined to the directory of C{toml_path} when it
+    is loaded, so that entries give the same result as
+    L{_load_pyproject_toml} whatever the current directory.
+    """
+    toml_dir = os.path.dirname(toml_path)
+    return _cached(
+        "pyproject",
+        toml_path,
+        lambda: _load_pyproject_toml(toml_path),
+        lambda config: _dumpConfig(config, os.path.abspath(toml_dir)),
+        lambda value: _loadConfig(value, toml_dir),
+    )
+
+
+def _dumpVersion(version: Version) -> object:
+    return [
+        version.package,
+        version.major,
+        version.minor,
+        version.micro,
+        version.release_candidate,
+        version.post,
+        version.dev,
+    ]
+
+
+def _loadVersion(value: Any) -> Version:
+    package, major, minor, micro, release_candidate, post, dev = value
+    return Version(
+        package,
+        major,
+        minor,
+        micro,
+        release_candidate=release_candidate,
+        post=post,
+        dev=dev,
+    )
+
+
+def _cached_existing_version(version_path: str) -> Version:
+    """
+    L{_existing_version}, cached when C{INCREMENTAL_CACHE_DIR} is set.
+    """
+    return _cached(
+        "version",
+        version_path,
+        lambda: _existing_version(version_path),
+        _dumpVersion,
+        _loadVersion,
+    )
@@ -0,0 +1,194 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Loading of Incremental configuration from ``pyproject.toml``.
+"""
+
+import os
+import sys
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple, cast
+
+from incremental import _findPath
+
+
+def _load_toml(f: BinaryIO) -> Any:
+    """
+    Read the content of a TOML file.
+    """
+    # This import is deferred to avoid a hard dependency on tomli
+    # when no pyproject.toml is present.
+    if sys.version_info > (3, 11):
+        import tomllib
+    else:
+        import tomli as tomllib
+
+    return tomllib.load(f)
+
+
+@dataclass(frozen=True)
+class _IncrementalConfig:
+    """
+    Configuration loaded from a ``pyproject.toml`` file.
+    """
+
+    opt_in: bool
+    """
+    Does the pyproject.toml file contain a [tool.incremental]
+    section? This indicates that the package has explicitly
+    opted-in to Incremental versioning.
+    """
+
+    package: str
+    """The project name, capitalized as in the project metadata."""
+
+    path: str
+    """Path to the package root"""
+
+    @property
+    def version_path(self) -> str:
+        """Path of the ``_version.py`` file. May not exist."""
+        return os.path.join(self.path, "_version.py")
+
+
+def _load_pyproject_toml(toml_path: str) -> _IncrementalConfig:
+    """
+    Load Incremental configuration from a ``pyproject.toml``
+
+    If the [tool.incremental] section is empty we take the project name
+    from the [project] section. Otherwise a C{name} key may specify the
+    project name, and C{include} and C{exclude} keys may limit the files
+    that C{incremental update} scans (see L{_load_scan_scope}). Other keys
+    are forbidden to allow future extension and catch typos.
+
+    @param toml_path:
+        Path to the ``pyproject.toml`` to load.
+    """
+    with open(toml_path, "rb") as f:
+        data = _load_toml(f)
+
+    tool_incremental = _extract_tool_incremental(data)
+
+    # Extract the project name
+    package = None
+    if tool_incremental is not None and "name" in tool_incremental:
+        package = tool_incremental["name"]
+    if package is None:
+        # Try to fall back to [project]
+        try:
+            package = data["project"]["name"]
+        except KeyError:
+            pass
+    if package is None:
+        # We can't proceed without a project name.
+        raise ValueError("""\
+Incremental failed to extract the project name from pyproject.toml. Specify it like:
+
+    [project]
+    name = "Foo"
+
+Or:
+
+    [tool.incremental]
+    name = "Foo"
+
+""")
+    if not isinstance(package, str):
+        raise TypeError(f"The project name must be a string, but found {type(package)}")
+
+    return _IncrementalConfig(
+        opt_in=tool_incremental is not None,
+        package=package,
+        path=_findPath(os.path.dirname(toml_path), package),
+    )
+
+
+def _extract_tool_incremental(data: Dict[str, object]) -> Optional[Dict[str, object]]:
+    if "tool" not in data:
+        return None
+    if not isinstance(data["tool"], dict):
+        raise ValueError("[tool] must be a table")
+    if "incremental" not in data["tool"]:
+        return None
+
+    tool_incremental = data["tool"]["incremental"]
+    if not isinstance(tool_incremental, dict):
+        raise ValueError("[tool.incremental] must be a table")
+
+    if not {"name", "include", "exclude"}.issuperset(tool_incremental.keys()):
+        raise ValueError("Unexpected key(s) in [tool.incremental]")
+    for key in ("include", "exclude"):
+        globs = tool_incremental.get(key, [])
+        if not isinstance(globs, list) or not all(isinstance(g, str) for g in globs):
+            raise ValueError(f"[tool.incremental] {key} must be a list of strings")
+    return tool_incremental
+
+
+@dataclass(frozen=True)
+class _ScanScope:
+    """
+    The files under the package root that C{incremental update} scans for
+    version markers.
+
+    Patterns are matched with L{fnmatch.fnmatchcase} against paths relative
+    to the package root, using forward slashes. C{*} matches across
+    slashes.
+    """
+
+    include: Tuple[str, ...] = ()
+    """
+    If not empty, only files matching one of these patterns are scanned.
+    """
+
+    exclude: Tuple[str, ...] = ()
+    """
+    Files matching one of these patterns aren't scanned, and directories
+    matching one of them aren't entered.
+    """
+
+
+def _load_scan_scope(toml_path: str) -> _ScanScope:
+    """
+    Load the C{include} and C{exclude} keys of the [tool.incremental]
+    section of a ``pyproject.toml``.
+
+    @param toml_path:
+        Path to the ``pyproject.toml`` to load. If it doesn't exist, the
+        whole package is scanned.
+    """
+    try:
+        with open(toml_path, "rb") as f:
+            data = _load_toml(f)
+    except FileNotFoundError:
+        return _ScanScope()
+
+    tool_incremental = _extract_tool_incremental(data) or {}
+    return _ScanScope(
+        include=tuple(cast(List[str], tool_incremental.get("include", []))),
+        exclude=tuple(cast(List[str], tool_incremental.get("exclude", []))),
+    )
+
+
+def _package_scan_scope(path: str) -> _ScanScope:
+    """
+    Load the scan scope of the package at C{path} from the
+    ``pyproject.toml`` of its project: the one next to the package
+    directory or, for a package under C{src/}, next to C{src/}.
+
+    @return: The scope, or the whole package when the project has no
+        ``pyproject.toml``, or one that can't be parsed or has an invalid
+        [tool.incremental] section.
+    """
+    parent = os.path.dirname(os.path.abspath(path))
+    candidates = [parent]
+    if os.path.basename(parent) == "src":
+        candidates.append(os.path.dirname(parent))
+    for directory in candidates:
+        toml_path = os.path.join(directory, "pyproject.toml")
+        if os.path.isfile(toml_path):
+            try:
+                return _load_scan_scope(toml_path)
+            except (OSError, ValueError):
+                break
+    return _ScanScope()
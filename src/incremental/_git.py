@@ -0,0 +1,179 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+List the files that git tracks by reading the index directly.
+
+See U{https://git-scm.com/docs/index-format} for the format.
+"""
+
+import os
+import re
+import struct
+from typing import List, Optional, Tuple
+
+# ctime, mtime, dev, ino, mode, uid, gid and size.
+_STAT_SIZE = 40
+_MODE_OFFSET = 24
+
+_S_IFMT = 0o170000
+_S_IFREG = 0o100000
+
+_FLAG_EXTENDED = 0x4000
+_NAME_MASK = 0xFFF
+
+
+def _findGitDir(path: str) -> Optional[Tuple[str, str]]:
+    """
+    Find the git repository containing C{path}.
+
+    @return: The root of the working tree and the git directory, or L{None}
+        if C{path} isn't in a git working tree.
+    """
+    path = os.path.abspath(path)
+    while True:
+        dotgit = os.path.join(path, ".git")
+        if os.path.isdir(dotgit):
+            return path, dotgit
+        if os.path.isfile(dotgit):
+            # A worktree or submodule, whose git directory is elsewhere.
+            with open(dotgit) as f:
+                content = f.read().strip()
+            if content.startswith("gitdir:"):
+                gitdir = content[len("gitdir:") :].strip()
+                return path, os.path.join(path, gitdir)
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+def _hashSize(gitdir: str) -> int:
+    """
+    The size of object names in the repository: 20 bytes for SHA-1, or 32
+    for SHA-256.
+    """
+    commondir = gitdir
+    try:
+        with open(os.path.join(gitdir, "commondir")) as f:
+            commondir = os.path.join(gitdir, f.read().strip())
+    except FileNotFoundError:
+        pass
+    try:
+        with open(os.path.join(commondir, "config")) as f:
+            config = f.read()
+    except FileNotFoundError:
+        return 20
+    if re.search(r"^\s*objectformat\s*=\s*sha256\s*$", config, re.I | re.M):
+        return 32
+    return 20
+
+
+def _readIndex(index: bytes, hashSize: int = 20) -> List[bytes]:
+    """
+    Parse the content of a git index.
+
+    @param hashSize: The size of object names in the repository.
+
+    @return: The paths, relative to the root of the working tree, of the
+        regular files in the index, in index order.
+
+    @raise ValueError: If C{index} isn't a git index that can be read.
+    """
+    if index[:4] != b"DIRC" or len(index) < 12:
+        raise ValueError("Not a git index")
+    version, count = struct.unpack_from(">II", index, 4)
+    if version not in (2, 3, 4):
+        raise ValueError(f"Unsupported git index version {version}")
+
+    paths: List[bytes] = []
+    offset = 12
+    previous = b""
+    try:
+        for _ in range(count):
+            start = offset
+            (mode,) = struct.unpack_from(">I", index, offset + _MODE_OFFSET)
+            offset += _STAT_SIZE + hashSize
+            (flags,) = struct.unpack_from(">H", index, offset)
+            offset += 2
+            if version >= 3 and flags & _FLAG_EXTENDED:
+                offset += 2
+
+            if version == 4:
+                # The path is compressed against the previous one: a
+                # varint giving how many bytes to drop from its end, then
+                # the rest of the path.
+                byte = index[offset]
+                offset += 1
+                strip = byte & 0x7F
+                while byte & 0x80:
+                    byte = index[offset]
+                    offset += 1
+                    strip = ((strip + 1) << 7) | (byte & 0x7F)
+                end = index.index(b"\0", offset)
+                path = previous[: len(previous) - strip] + index[offset:end]
+                offset = end + 1
+            else:
+                length = flags & _NAME_MASK
+                if length == _NAME_MASK:
+                    end = index.index(b"\0", offset)
+                else:
+                    end = offset + length
+                path = index[offset:end]
+                # Entries are padded with 1 to 8 NULs to a multiple of 8.
+                offset = start + ((end - start + 8) & ~7)
+
+            previous = path
+            # Skip symlinks, submodules and the directories of a sparse
+            # index. Conflicted files have an entry for each stage.
+            if mode & _S_IFMT == _S_IFREG and (not paths or paths[-1] != path):
+                paths.append(path)
+
+        while len(index) - offset > hashSize:
+            signature = index[offset : offset + 4]
+            (size,) = struct.unpack_from(">I", index, offset + 4)
+            if signature == b"link":
+                raise ValueError("Split git indexes aren't supported")
+            offset += 8 + size
+    except (struct.error, IndexError) as e:
+        raise ValueError("Truncated git index") from e
+
+    return paths
+
+
+def _trackedFiles(path: str) -> List[str]:
+    """
+    List the files under C{path} that git tracks, without running git.
+
+    @return: Paths, under C{path}, of regular files that exist on disk, in
+        index order.
+
+    @raise ValueError: If C{path} isn't in a git working tree, or its index
+        can't be read.
+    """
+    found = _findGitDir(path)
+    if found is None:
+        raise ValueError(f"{path} isn't in a git working tree")
+    root, gitdir = found
+
+    try:
+        with open(os.path.join(gitdir, "index"), "rb") as f:
+            index = f.read()
+    except FileNotFoundError:
+        # Nothing has ever been added.
+        return []
+
+    prefix = os.path.relpath(os.path.abspath(path), root)
+    if prefix == ".":
+        prefixBytes = b""
+    else:
+        prefixBytes = os.fsencode(prefix.replace(os.sep, "/")) + b"/"
+
+    filepaths = []
+    for relpath in _readIndex(index, _hashSize(gitdir)):
+        if relpath.startswith(prefixBytes):
+            segments = os.fsdecode(relpath[len(prefixBytes) :]).split("/")
+            filepath = os.path.join(path, *segments)
+            if os.path.isfile(filepath):
+                filepaths.append(filepath)
+    return filepaths
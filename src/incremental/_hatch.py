@@ -8,8 +8,6 @@ from typing import Any, Dict, List, Type, TypedDict
 from hatchling.plugin import hookimpl
 from hatchling.version.source.plugin.interface import VersionSourceInterface
 
-from incremental import _existing_version, _load_pyproject_toml
-
 
 class _VersionData(TypedDict):
     version: str
@@ -19,11 +17,15 @@ class IncrementalVersionSource(VersionSourceInterface):
     PLUGIN_NAME = "incremental"
 
     def get_version_data(self) -> _VersionData:  # type: ignore[override]
+        from incremental._cache import _cached_existing_version, _cached_pyproject_toml
+
         path = os.path.join(self.root, "./pyproject.toml")
-        config = _load_pyproject_toml(path)
-        return {"version": _existing_version(config.version_path).public()}
+        config = _cached_pyproject_toml(path)
+        return {"version": _cached_existing_version(config.version_path).public()}
 
     def set_version(self, version: str, version_data: Dict[Any, Any]) -> None:
+        from incremental._config import _load_pyproject_toml
+
         path = os.path.join(self.root, "./pyproject.toml")  # TODO: #111 Delete this.
         config = _load_pyproject_toml(path)
         raise NotImplementedError(
@@ -0,0 +1,169 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Setuptools and distutils integration.
+
+These hooks run in every setuptools build in an environment where
+Incremental is installed, so this module imports as little as possible and
+defers everything else until a project turns out to use Incremental.
+"""
+
+import os
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from distutils.dist import Distribution as _Distribution
+    from typing import Dict, List, Optional
+
+
+# Matches the ways that a TOML document can spell the [tool.incremental]
+# table: a table header, a dotted key, or a key in the [tool] table or an
+# inline table. False positives are fine; they just mean a full parse.
+_OPT_IN_MARKER = rb"""(?m)tool["']?\s*\.\s*["']?incremental|(?:^|[{,])[ \t]*["']?incremental["']?[ \t]*[=.]"""
+
+
+def _mayOptIn(toml: bytes) -> bool:
+    """
+    Could the given C{pyproject.toml} content contain a C{[tool.incremental]}
+    table?
+
+    This is a conservative check which doesn't parse the TOML: if it
+    returns C{False} the project certainly hasn't opted in to Incremental.
+    """
+    if b"incremental" not in toml:
+        return False
+
+    import re
+
+    return re.search(_OPT_IN_MARKER, toml) is not None
+
+
+def _get_setuptools_version(dist: "_Distribution") -> None:
+    """
+    Setuptools integration: load the version from the working directory
+
+    This function is registered as a setuptools.finalize_distribution_options
+    entry point [1]. Consequently, it is called in all sorts of weird
+    contexts. In setuptools, silent failure is the law.
+
+    [1]: https://setuptools.pypa.io/en/latest/userguide/extension.html#customizing-distribution-options
+
+    @param dist:
+        A (possibly) empty C{setuptools.Distribution} instance to mutate.
+        There may be some metadata here if a `setup.py` called `setup()`,
+        but this hook is always called before setuptools loads anything
+        from ``pyproject.toml``.
+    """
+    # When operating in a packaging context (i.e. building an sdist or
+    # wheel) pyproject.toml will always be found in the current working
+    # directory.
+    toml_path = "./pyproject.toml"
+
+    # This hook runs for every setuptools build, so first reject projects
+    # that can't have opted in without parsing the TOML.
+    try:
+        with open(toml_path, "rb") as f:
+            if not _mayOptIn(f.read()):
+                return
+    except OSError:
+        return
+
+    from ._cache import _cached_existing_version, _cached_pyproject_toml
+
+    try:
+        config = _cached_pyproject_toml(toml_path)
+    except Exception:
+        return
+
+    if not config.opt_in:
+        return
+
+    try:
+        version = _cached_existing_version(config.version_path)
+    except FileNotFoundError:
+        return
+
+    dist.metadata.version = version.public()
+
+
+def _packageDir(package: str, package_dir: "Dict[str, str]") -> str:
+    """
+    Find the directory of a package according to a C{package_dir} mapping,
+    as C{build_py.get_package_dir} does.
+    """
+    path = package.split(".")
+    tail: List[str] = []
+    while path:
+        pdir = package_dir.get(".".join(path))
+        if pdir is not None:
+            tail.insert(0, pdir)
+            return os.path.join(*tail)
+        tail.insert(0, path.pop())
+    pdir = package_dir.get("")
+    if pdir is not None:
+        tail.insert(0, pdir)
+    return os.path.join(*tail) if tail else ""
+
+
+def _find_version_path(dist: "_Distribution") -> "Optional[str]":
+    """
+    Find the C{_version.py} of the first of the distribution's packages
+    that has one, without enumerating every module in the distribution.
+
+    @return: The path, or L{None} if it can't be found this way and all of
+        the distribution's modules must be searched.
+    """
+    if not dist.packages:
+        return None
+    for module in dist.py_modules or ():
+        # build_py lists these ahead of the packages' modules.
+        if module.rpartition(".")[2] == "_version":
+            return None
+
+    package_dir = {
+        name: path.replace("/", os.sep)
+        for name, path in (dist.package_dir or {}).items()
+    }
+    src_root = getattr(dist, "src_root", None)
+    for package in dist.packages:
+        path = os.path.join(_packageDir(package, package_dir), "_version.py")
+        if src_root is not None:
+            path = os.path.join(src_root, path)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def _get_distutils_version(
+    dist: "_Distribution", keyword: object, value: object
+) -> None:
+    """
+    Distutils integration: get the version from the package listed in the Distribution.
+
+    This function is invoked when a C{setup.py} calls C{setup(use_incremental=True)}.
+
+    @see: https://setuptools.pypa.io/en/latest/userguide/extension.html#adding-arguments
+    """
+    if not value:  # use_incremental=False
+        return  # pragma: no cover
+
+    from ._cache import _cached_existing_version
+
+    version_path = _find_version_path(dist)
+    if version_path is not None:
+        dist.metadata.version = _cached_existing_version(version_path).public()
+        return
+
+    from setuptools.command import build_py  # type: ignore
+
+    sp_command = build_py.build_py(dist)
+    sp_command.finalize_options()
+
+    for item in sp_command.find_all_modules():
+        if item[1] == "_version":
+            version_path = os.path.join(os.path.dirname(item[2]), "_version.py")
+            dist.metadata.version = _cached_existing_version(version_path).public()
+            return
+
+    raise Exception("No _version.py found.")  # pragma: no cover
@@ -0,0 +1,219 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+An on-disk index of the version markers in a package.
+
+C{incremental update} only replaces indeterminate versions (C{NEXT}) and
+release candidate versions, so a file that contains neither can't change
+in any later run until it is edited. The index records, for each file, its
+size, modification time and inode, and the markers found in it, so that a
+later run can skip unchanged files without markers without reading them.
+"""
+
+import json
+import mmap
+import os
+import re
+import time
+from typing import Dict, Iterator, List, Optional, Pattern, Tuple
+
+# Bump when the format of the index changes; older indexes are discarded.
+_INDEX_FORMAT = 1
+
+# A file modified this close to when the index was written may be modified
+# again without its size or modification time changing, so its entry isn't
+# trusted.
+_RACY_NS = 2_000_000_000
+
+# (kind, line number, text)
+_Marker = Tuple[str, int, str]
+
+
+def _markerPattern(package: str) -> "Pattern[bytes]":
+    """
+    Compile a regular expression that finds the markers that
+    C{incremental update} may replace, whatever the current version.
+
+    The C{next} group matches C{Version("<package>", "NEXT", 0, 0)} and
+    C{<package> NEXT}; the C{rc} group matches the repr and the public form
+    of release candidate versions.
+    """
+    name = re.escape(package.encode("utf-8"))
+    return re.compile(
+        rb"(?P<next>Version\(\"" + name + rb"\", \"NEXT\", 0, 0\)"
+        rb"|" + name + rb" NEXT)"
+        rb"|(?P<rc>Version\(\"" + name + rb"\", [^)\n]*release_candidate=\d+[^)\n]*\)"
+        rb"|" + name + rb" \d+\.\d+\.\d+rc\d+(?:\.(?:post|dev)\d+)*)"
+    )
+
+
+def _findMarkers(
+    pattern: "Pattern[bytes]", content: bytes, line: int = 1
+) -> List[_Marker]:
+    """
+    Find the markers in C{content}.
+
+    @param pattern: The result of L{_markerPattern}.
+    @param line: The line number that C{content} starts on.
+    """
+    markers = []
+    counted = 0
+    for match in pattern.finditer(content):
+        line += content.count(b"\n", counted, match.start())
+        counted = match.start()
+        kind = "next" if match.group("next") else "rc"
+        text = match.group().decode("utf-8", "replace")
+        markers.append((kind, line, text))
+    return markers
+
+
+def _scanMarkers(
+    pattern: "Pattern[bytes]", filepath: str, chunkSize: int
+) -> List[_Marker]:
+    """
+    Find the markers in a file too large to hold in memory.
+
+    The file is searched through mmap, and its lines are counted
+    C{chunkSize} bytes at a time, so only the markers themselves are copied
+    out of it.
+
+    @param pattern: The result of L{_markerPattern}.
+    """
+    markers: List[_Marker] = []
+    line = 1
+    counted = 0
+    with open(filepath, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return markers
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            for match in pattern.finditer(m):
+                start = match.start()
+                while counted < start:
+                    end = min(start, counted + chunkSize)
+                    line += m[counted:end].count(b"\n")
+                    counted = end
+                kind = "next" if match.group("next") else "rc"
+                text = match.group().decode("utf-8", "replace")
+                markers.append((kind, line, text))
+    return markers
+
+
+class _MarkerIndex:
+    """
+    The markers in each file of a package, as recorded on disk.
+
+    Entries are keyed by absolute path. L{record} may be called from
+    several threads at once.
+    """
+
+    def __init__(
+        self,
+        package: str,
+        entries: Optional[Dict[str, Tuple[int, int, int, List[_Marker]]]] = None,
+        writtenNs: int = 0,
+    ):
+        self.package = package
+        self.pattern = _markerPattern(package)
+        self._previous = entries or {}
+        self._writtenNs = writtenNs
+        self._entries: Dict[str, Tuple[int, int, int, List[_Marker]]] = {}
+
+    @classmethod
+    def load(cls, path: str, package: str) -> "_MarkerIndex":
+        """
+        Load the index at C{path}.
+
+        An index that is missing, unreadable, in another format or for
+        another package is replaced by an empty one.
+        """
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data["format"] != _INDEX_FORMAT or data["package"] != package:
+                return cls(package)
+            entries = {
+                filepath: (size, mtime, ino, [tuple(m) for m in markers])
+                for filepath, (size, mtime, ino, markers) in data["files"].items()
+            }
+            return cls(package, entries, data["written_ns"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return cls(package)
+
+    def lookup(self, filepath: str) -> Optional[List[_Marker]]:
+        """
+        Get the markers recorded for a file.
+
+        @return: The markers, or L{None} if the file was never recorded or
+            has changed since.
+        """
+        filepath = os.path.abspath(filepath)
+        entry = self._previous.get(filepath)
+        if entry is None:
+            return None
+        size, mtime, ino, markers = entry
+        if mtime + _RACY_NS >= self._writtenNs:
+            return None
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            return None
+        if (st.st_size, st.st_mtime_ns, st.st_ino) != (size, mtime, ino):
+            return None
+        self._entries[filepath] = entry
+        return markers
+
+    def isClean(self, filepath: str) -> bool:
+        """
+        Is the file known to have no markers?
+
+        A file that has changed since it was recorded isn't known to be
+        clean, and neither is one that was never recorded.
+        """
+        return self.lookup(filepath) == []
+
+    def record(self, filepath: str, content: Optional[bytes]) -> List[_Marker]:
+        """
+        Record the markers in a file, as it currently is on disk.
+
+        @param content: The current content of the file, or L{None} if it
+            is known to have no markers.
+
+        @return: The markers.
+        """
+        markers = [] if content is None else _findMarkers(self.pattern, content)
+        self.recordMarkers(filepath, markers)
+        return markers
+
+    def recordMarkers(self, filepath: str, markers: List[_Marker]) -> None:
+        """
+        Record the markers in a file found by the caller, for files too
+        large to pass to L{record}.
+        """
+        filepath = os.path.abspath(filepath)
+        st = os.stat(filepath)
+        self._entries[filepath] = (st.st_size, st.st_mtime_ns, st.st_ino, markers)
+
+    def __iter__(self) -> Iterator[Tuple[str, _Marker]]:
+        """
+        Iterate over the markers recorded during this run, by path.
+        """
+        for filepath in sorted(self._entries):
+            for marker in self._entries[filepath][3]:
+                yield filepath, marker
+
+    def save(self, path: str) -> None:
+        """
+        Write the entries looked up or recorded during this run to C{path}.
+        Entries for files that weren't seen are dropped.
+        """
+        data = {
+            "format": _INDEX_FORMAT,
+            "package": self.package,
+            "written_ns": time.time_ns(),
+            "files": self._entries,
+        }
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
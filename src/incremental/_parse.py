@@ -0,0 +1,132 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Parsing of version strings and ``_version.py`` files.
+
+This is kept apart from L{incremental} so that the cost of compiling its
+regular expressions is only paid by code that parses versions.
+"""
+
+import re
+from functools import lru_cache
+from typing import Optional
+
+from incremental import Version
+
+_CANONICAL_VERSION = re.compile(
+    r"(\d+)(?:\.(\d+))?(?:\.(\d+))?(?:rc(\d+))?(?:\.post(\d+))?(?:\.dev(\d+))?"
+)
+
+
+@lru_cache(maxsize=1024)
+def _parseVersion(package: str, text: str) -> Version:
+    """
+    Implementation of L{Version.parse}, cached on its arguments.
+    """
+    text = text.strip()
+    if text == "NEXT":
+        return Version(package, "NEXT", 0, 0)
+
+    match = _CANONICAL_VERSION.fullmatch(text)
+    if match is not None:
+        major, minor, micro, rc, post, dev = match.groups()
+        return Version(
+            package,
+            int(major),
+            int(minor or 0),
+            int(micro or 0),
+            release_candidate=None if rc is None else int(rc),
+            post=None if post is None else int(post),
+            dev=None if dev is None else int(dev),
+        )
+
+    from packaging.version import InvalidVersion
+    from packaging.version import Version as PackagingVersion
+
+    try:
+        parsed = PackagingVersion(text)
+    except InvalidVersion as e:
+        raise ValueError(str(e)) from None
+
+    release = parsed.release
+    if len(release) > 3:
+        raise ValueError(f"{text!r} has more than three release components")
+    if parsed.epoch:
+        raise ValueError(f"{text!r} has an epoch, which Version can't represent")
+    if parsed.local is not None:
+        raise ValueError(
+            f"{text!r} has a local version label, which Version can't represent"
+        )
+    if parsed.pre is not None and parsed.pre[0] != "rc":
+        raise ValueError(
+            f"{text!r} is an alpha or beta release, which Version can't represent"
+        )
+    release += (0,) * (3 - len(release))
+
+    return Version(
+        package,
+        release[0],
+        release[1],
+        release[2],
+        release_candidate=parsed.pre[1] if parsed.pre else None,
+        post=parsed.post,
+        dev=parsed.dev,
+    )
+
+
+# Matches a ``_version.py`` file of the shape that ``incremental update``
+# generates: an optional docstring, comments, the import of Version, a single
+# __version__ assignment with literal arguments and an optional __all__.
+# Anything else is left to exec().
+_BLANK_LINES = r"(?:[ \t]*(?:\#[^\n]*)?\r?\n)*"
+_VERSION_FILE = re.compile(
+    rf"""
+    {_BLANK_LINES}
+    (?:(?:\"\"\"[^\\]*?\"\"\"|'''[^\\]*?''')[ \t]*\r?\n)?
+    {_BLANK_LINES}
+    from[ \t]+incremental[ \t]+import[ \t]+Version[ \t]*\r?\n
+    {_BLANK_LINES}
+    __version__[ \t]*=[ \t]*Version\([ \t]*
+        (?P<quote>["'])(?P<package>[^"'\\\n]*)(?P=quote)[ \t]*,[ \t]*
+        (?:(?P<major>0|[1-9][0-9]*)|(?P<nextquote>["'])NEXT(?P=nextquote))[ \t]*,[ \t]*
+        (?P<minor>0|[1-9][0-9]*)[ \t]*,[ \t]*
+        (?P<micro>0|[1-9][0-9]*)
+        (?:[ \t]*,[ \t]*release_candidate[ \t]*=[ \t]*(?P<rc>0|[1-9][0-9]*))?
+        (?:[ \t]*,[ \t]*post[ \t]*=[ \t]*(?P<post>0|[1-9][0-9]*))?
+        (?:[ \t]*,[ \t]*dev[ \t]*=[ \t]*(?P<dev>0|[1-9][0-9]*))?
+        (?:[ \t]*,)?
+    [ \t]*\)[ \t]*(?:\#[^\n]*)?(?:\r?\n|\Z)
+    {_BLANK_LINES}
+    (?:__all__[ \t]*=[ \t]*\[[ \t]*(?P<allquote>["'])__version__(?P=allquote)[ \t]*,?[ \t]*\][ \t]*(?:\#[^\n]*)?(?:\r?\n|\Z))?
+    {_BLANK_LINES}
+    [ \t]*(?:\#[^\n]*)?
+    """,
+    re.VERBOSE,
+)
+
+
+def _readVersionStatically(source: str) -> Optional[Version]:
+    """
+    Extract the version from the source of a ``_version.py`` file without
+    executing it.
+
+    @return: The version, or L{None} when the file doesn't have the shape
+        that Incremental generates.
+    """
+    match = _VERSION_FILE.fullmatch(source)
+    if match is None:
+        return None
+
+    major, minor, micro, rc, post, dev = match.group(
+        "major", "minor", "micro", "rc", "post", "dev"
+    )
+    return Version(
+        match.group("package"),
+        "NEXT" if major is None else int(major),
+        int(minor),
+        int(micro),
+        release_candidate=None if rc is None else int(rc),
+        post=None if post is None else int(post),
+        dev=None if dev is None else int(dev),
+    )
@@ -0,0 +1,159 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Update plans, written by C{incremental update --plan} and applied by
+C{incremental apply}.
+
+A plan records the new version, every replacement to make in each file
+with its byte offset, and a hash of each file as it was when the plan was
+made, so that it can be applied without scanning the package again and
+refused if the files have changed since. Paths are stored relative to the
+directory the plan was made in, with forward slashes, and resolved
+against the directory it is applied in.
+
+Byte strings are stored as text decoded with C{surrogateescape}, so that
+bytes which aren't UTF-8 survive the round trip through JSON.
+"""
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, List, Optional, Tuple
+
+# Bump when the format of plans changes; plans in other formats are refused.
+_PLAN_FORMAT = 1
+
+# (start, original bytes, replacement bytes)
+_Match = Tuple[int, bytes, bytes]
+
+
+@dataclass
+class _PlannedFile:
+    """
+    The replacements to make in one file.
+
+    @ivar path: The path of the file.
+    @ivar sha256: The hex SHA-256 digest of the file as it was planned.
+    @ivar matches: The replacements, in order of offset.
+    """
+
+    path: str
+    sha256: str
+    matches: List[_Match] = field(default_factory=list)
+
+
+@dataclass
+class _Plan:
+    """
+    An update of a package to a new version.
+
+    @ivar package: The name of the package.
+    @ivar version: The new version, as given by L{Version.public}.
+    @ivar files: The files to rewrite, in the order they were scanned.
+    @ivar versionPath: The path of the C{_version.py} file.
+    @ivar versionSha256: The hex SHA-256 digest of the C{_version.py} file as
+        it was planned, or L{None} if it didn't exist.
+    @ivar versionContent: The new content of the C{_version.py} file.
+    """
+
+    package: str
+    version: str
+    files: List[_PlannedFile]
+    versionPath: str
+    versionSha256: Optional[str]
+    versionContent: bytes
+
+
+def _hashFile(f: BinaryIO, chunkSize: int = 1024 * 1024) -> str:
+    """
+    Compute the hex SHA-256 digest of an open file from its start, reading
+    C{chunkSize} bytes at a time.
+    """
+    f.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: f.read(chunkSize), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _text(data: bytes) -> str:
+    return data.decode("utf-8", "surrogateescape")
+
+
+def _bytes(text: str) -> bytes:
+    return text.encode("utf-8", "surrogateescape")
+
+
+def _relative(path: str, cwd: str) -> str:
+    return os.path.relpath(path, cwd).replace(os.sep, "/")
+
+
+def _absolute(path: str, cwd: str) -> str:
+    return os.path.join(cwd, *path.split("/"))
+
+
+def _dumpPlan(plan: _Plan, cwd: str) -> bytes:
+    """
+    Serialize C{plan} to JSON.
+
+    @param cwd: The directory that paths are stored relative to.
+    """
+    data = {
+        "format": _PLAN_FORMAT,
+        "package": plan.package,
+        "version": plan.version,
+        "files": [
+            {
+                "path": _relative(planned.path, cwd),
+                "sha256": planned.sha256,
+                "matches": [
+                    [start, _text(old), _text(new)]
+                    for start, old, new in planned.matches
+                ],
+            }
+            for planned in plan.files
+        ],
+        "version_file": {
+            "path": _relative(plan.versionPath, cwd),
+            "sha256": plan.versionSha256,
+            "content": _text(plan.versionContent),
+        },
+    }
+    return json.dumps(data, indent=1).encode("ascii") + b"\n"
+
+
+def _loadPlan(content: bytes, cwd: str) -> _Plan:
+    """
+    Parse a plan written by L{_dumpPlan}.
+
+    @param cwd: The directory that paths are resolved against.
+
+    @raise ValueError: If C{content} isn't a plan in this format.
+    """
+    try:
+        data: Any = json.loads(content)
+        if data["format"] != _PLAN_FORMAT:
+            raise ValueError(f"Unsupported plan format {data['format']!r}")
+        versionFile = data["version_file"]
+        return _Plan(
+            package=data["package"],
+            version=data["version"],
+            files=[
+                _PlannedFile(
+                    _absolute(planned["path"], cwd),
+                    planned["sha256"],
+                    [
+                        (int(start), _bytes(old), _bytes(new))
+                        for start, old, new in planned["matches"]
+                    ],
+                )
+                for planned in data["files"]
+            ],
+            versionPath=_absolute(versionFile["path"], cwd),
+            versionSha256=versionFile["sha256"],
+            versionContent=_bytes(versionFile["content"]),
+        )
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError("Not an update plan") from e
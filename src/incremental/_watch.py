@@ -0,0 +1,515 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+The C{incremental watch} daemon, which keeps track of the markers in a
+package as its files change and answers requests from
+C{incremental update --daemon} on a Unix socket.
+
+Changes are found with Linux inotify, through ctypes (see
+U{https://man7.org/linux/man-pages/man7/inotify.7.html}). Where inotify
+isn't available, the daemon polls instead.
+"""
+
+import ctypes
+import datetime
+import json
+import os
+import select
+import socket
+import stat
+import struct
+import sys
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from incremental import _findPath
+from incremental._config import _package_scan_scope, _ScanScope
+from incremental._markers import _findMarkers, _Marker, _markerPattern, _scanMarkers
+from incremental.update import (
+    _CHUNK_FRACTION,
+    _DEFAULT_MAX_MEMORY,
+    _READ_WHOLE_FRACTION,
+    _bumpPackage,
+    _checkOptions,
+    _isPrunedDir,
+    _isSkippedFile,
+    _readCandidate,
+    _statsReport,
+    _update,
+    _UpdateStats,
+    _walkPackage,
+)
+
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+
+# The events that may change which files under a directory contain markers.
+# Files rewritten in place are closed, and files replaced atomically are
+# moved over the original.
+_WATCH_MASK = (
+    _IN_CLOSE_WRITE
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+    | _IN_ONLYDIR
+)
+
+# wd, mask, cookie and the length of the name that follows.
+_EVENT = struct.Struct("iIII")
+
+_READ_SIZE = 64 * 1024
+
+# (watch descriptor, mask, name)
+_Event = Tuple[int, int, str]
+
+
+class _Inotify:
+    """
+    An inotify instance, read without blocking.
+    """
+
+    def __init__(self, fd: int, addWatch: Any) -> None:
+        self._fd = fd
+        self._addWatch = addWatch
+
+    @classmethod
+    def open(cls) -> Optional["_Inotify"]:
+        """
+        Create an inotify instance.
+
+        @return: The instance, or L{None} if inotify isn't available.
+        """
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            init = libc.inotify_init1
+            addWatch = libc.inotify_add_watch
+        except (OSError, AttributeError):
+            return None
+        init.argtypes = [ctypes.c_int]
+        addWatch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        fd = init(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return None
+        return cls(fd, addWatch)
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def add(self, dirpath: str) -> int:
+        """
+        Watch the directory at C{dirpath}, not including its
+        subdirectories.
+
+        @return: The watch descriptor, which is the same for every path of
+            the same directory.
+
+        @raise OSError: If the directory can't be watched, for example
+            because the limit on watches has been reached.
+        """
+        wd = self._addWatch(self._fd, os.fsencode(dirpath), _WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), dirpath)
+        return int(wd)
+
+    def read(self) -> List[_Event]:
+        """
+        Read the pending events, without waiting for more.
+        """
+        events: List[_Event] = []
+        while True:
+            try:
+                data = os.read(self._fd, _READ_SIZE)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = data[offset : offset + length].rstrip(b"\0")
+                offset += length
+                events.append((wd, mask, os.fsdecode(name)))
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+# How long the daemon waits for a client to send its request, in seconds.
+_WATCH_REQUEST_TIMEOUT = 10.0
+
+
+class _Watcher:
+    """
+    The markers in each file of a package, kept up to date as the files
+    change, for C{incremental watch}.
+
+    Changes are found with inotify where it's available, and otherwise by
+    polling: walking the package and re-reading the files whose size,
+    modification time or inode have changed.
+
+    @ivar package: The name of the package.
+    @ivar path: The package directory.
+    @ivar inotify: The inotify instance, or L{None} when polling.
+    @ivar maxMemory: Roughly the most memory, in MiB, to use for the
+        content of a file. Larger files are searched by L{_scanMarkers}.
+    """
+
+    def __init__(
+        self,
+        package: str,
+        path: str,
+        scope: _ScanScope,
+        poll: bool = False,
+        maxMemory: int = _DEFAULT_MAX_MEMORY,
+    ) -> None:
+        self.package = package
+        self.path = path
+        self.scope = scope
+        self.maxMemory = maxMemory
+        self.inotify = None if poll else _Inotify.open()
+        self._pattern = _markerPattern(package)
+        self._anchor = package.encode("utf-8")
+        self._stats: Dict[str, Tuple[int, int, int]] = {}
+        self._markers: Dict[str, List[_Marker]] = {}
+        self._watches: Dict[int, str] = {}
+        self.rescan()
+
+    def close(self) -> None:
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+
+    def rescan(self) -> None:
+        """
+        Walk the package, watching every directory, and re-read the files
+        that have changed since they were last read.
+        """
+        dirpaths: List[str] = []
+        filepaths = _walkPackage(self.path, self.scope, _UpdateStats(), dirpaths)
+        if self.inotify is not None:
+            try:
+                for dirpath in dirpaths:
+                    self._watches[self.inotify.add(dirpath)] = dirpath
+            except OSError:
+                # Most likely out of watches; poll instead.
+                self.close()
+                self._watches.clear()
+        seen = set(filepaths)
+        for filepath in list(self._stats):
+            if filepath not in seen:
+                self._forget(filepath)
+        for filepath in filepaths:
+            self.refresh(filepath)
+
+    def refresh(self, filepath: str, force: bool = False) -> None:
+        """
+        Re-read the file at C{filepath} if it has changed, or if C{force}
+        is true.
+        """
+        try:
+            st = os.stat(filepath)
+            key = (st.st_size, st.st_mtime_ns, st.st_ino)
+            if not force and self._stats.get(filepath) == key:
+                return
+            self._stats[filepath] = key
+            memoryLimit = self.maxMemory * 1024 * 1024
+            outcome, content = _readCandidate(
+                filepath, self._anchor, memoryLimit // _READ_WHOLE_FRACTION
+            )
+            if outcome == "stream":
+                markers = _scanMarkers(
+                    self._pattern, filepath, memoryLimit // _CHUNK_FRACTION
+                )
+            elif content is None:
+                markers = []
+            else:
+                markers = _findMarkers(self._pattern, content)
+        except OSError:
+            self._forget(filepath)
+            return
+        if markers:
+            self._markers[filepath] = markers
+        else:
+            self._markers.pop(filepath, None)
+
+    def _forget(self, filepath: str) -> None:
+        self._stats.pop(filepath, None)
+        self._markers.pop(filepath, None)
+
+    def _forgetTree(self, dirpath: str) -> None:
+        prefix = os.path.join(dirpath, "")
+        for filepath in list(self._stats):
+            if filepath.startswith(prefix):
+                self._forget(filepath)
+        for wd, watched in list(self._watches.items()):
+            if watched == dirpath or watched.startswith(prefix):
+                del self._watches[wd]
+
+    def process(self) -> None:
+        """
+        Bring the markers up to date with the changes made since the last
+        call: the pending inotify events, or a rescan when polling.
+        """
+        if self.inotify is None:
+            self.rescan()
+            return
+        rescan = False
+        for wd, mask, name in self.inotify.read():
+            if mask & _IN_Q_OVERFLOW:
+                rescan = True
+                continue
+            if mask & _IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            dirpath = self._watches.get(wd)
+            if dirpath is None or not name:
+                continue
+            filepath = os.path.join(dirpath, name)
+            relpath = os.path.relpath(filepath, self.path).replace(os.sep, "/")
+            if mask & _IN_ISDIR:
+                if mask & (_IN_DELETE | _IN_MOVED_FROM):
+                    self._forgetTree(filepath)
+                elif not _isPrunedDir(relpath, name, self.scope):
+                    # A directory created or moved in may already contain
+                    # files, and needs watching.
+                    rescan = True
+            elif not _isSkippedFile(relpath, name, self.scope):
+                self.refresh(filepath, force=True)
+        if rescan:
+            self.rescan()
+
+    def markers(self) -> Iterator[Tuple[str, _Marker]]:
+        """
+        Iterate over the markers in the package, by path.
+        """
+        for filepath in sorted(self._markers):
+            for marker in self._markers[filepath]:
+                yield filepath, marker
+
+    def bump(
+        self,
+        newversion: Optional[str] = None,
+        patch: bool = False,
+        rc: bool = False,
+        post: bool = False,
+        dev: bool = False,
+        create: bool = False,
+        fsync: bool = True,
+        quiet: bool = False,
+        _date: Optional[datetime.date] = None,
+        _print: Callable[[object], object] = print,
+    ) -> _UpdateStats:
+        """
+        Update the package like C{incremental update}, rewriting only the
+        files known to contain markers.
+        """
+        started = time.perf_counter()
+        _checkOptions(newversion, patch, rc, post, dev, create, 1, self.maxMemory)
+        self.process()
+        target = _bumpPackage(
+            self.package,
+            self.path,
+            newversion,
+            patch,
+            rc,
+            post,
+            dev,
+            create,
+            self.scope,
+            _date or datetime.date.today(),
+        )
+        versionTime = time.perf_counter() - started
+        stats = _update(
+            [target],
+            fsync=fsync,
+            max_memory=self.maxMemory,
+            filepaths=sorted(self._markers),
+            quiet=quiet,
+            _print=_print,
+        )
+        for filepath in stats.changed:
+            self.refresh(filepath, force=True)
+        stats.timings["version"] = versionTime
+        stats.timings["total"] = time.perf_counter() - started
+        return stats
+
+
+def _handleWatchRequest(watcher: _Watcher, request: Any) -> Dict[str, Any]:
+    """
+    Answer a request sent to C{incremental watch}.
+
+    A C{"bump"} request takes the options of C{incremental update}, and
+    is answered with what was printed, the files changed and the
+    L{_statsReport} of the update; a C{"stop"} request stops the daemon.
+
+    @return: The response, which has an C{"error"} key if the request
+        failed.
+    """
+    try:
+        command = request["command"]
+        if command == "stop":
+            return {"stopped": True}
+        if command != "bump":
+            raise ValueError(f"Unknown command {command!r}")
+        if request["package"] != watcher.package:
+            raise ValueError(
+                f"This daemon watches {watcher.package}, not {request['package']}"
+            )
+        output: List[object] = []
+        stats = watcher.bump(
+            newversion=request.get("newversion"),
+            patch=bool(request.get("patch")),
+            rc=bool(request.get("rc")),
+            post=bool(request.get("post")),
+            dev=bool(request.get("dev")),
+            create=bool(request.get("create")),
+            fsync=bool(request.get("fsync", True)),
+            quiet=bool(request.get("quiet")),
+            _print=output.append,
+        )
+    except (ValueError, KeyError, TypeError, OSError) as e:
+        return {"error": str(e) or repr(e)}
+    return {
+        "output": [str(line) for line in output],
+        "changed": stats.changed,
+        "stats": _statsReport(stats),
+    }
+
+
+def _listen(socketpath: str) -> socket.socket:
+    """
+    Listen on a Unix socket at C{socketpath}, replacing a socket left
+    behind by a daemon that is no longer running.
+    """
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            server.bind(socketpath)
+        except OSError:
+            if not stat.S_ISSOCK(os.stat(socketpath).st_mode):
+                raise
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                try:
+                    probe.connect(socketpath)
+                except ConnectionRefusedError:
+                    pass
+                else:
+                    raise ValueError(f"A daemon is already listening on {socketpath}")
+            os.unlink(socketpath)
+            server.bind(socketpath)
+        os.chmod(socketpath, 0o600)
+        server.listen()
+    except BaseException:
+        server.close()
+        raise
+    return server
+
+
+def _serveWatch(
+    watcher: _Watcher,
+    socketpath: str,
+    pollInterval: float = 1.0,
+    _print: Callable[[object], object] = print,
+) -> None:
+    """
+    Keep C{watcher} up to date, and answer requests on the Unix socket at
+    C{socketpath}, until a C{"stop"} request is received.
+    """
+    server = _listen(socketpath)
+    mode = "polling" if watcher.inotify is None else "inotify"
+    _print(f"Watching {watcher.path} with {mode}, listening on {socketpath}")
+    try:
+        while True:
+            inotify = watcher.inotify
+            waitFor: List[Any] = [server]
+            if inotify is not None:
+                waitFor.append(inotify)
+            readable = select.select(
+                waitFor, [], [], None if inotify is not None else pollInterval
+            )[0]
+            if server not in readable:
+                watcher.process()
+                continue
+            connection = server.accept()[0]
+            with connection:
+                try:
+                    connection.settimeout(_WATCH_REQUEST_TIMEOUT)
+                    with connection.makefile("rwb") as f:
+                        try:
+                            request = json.loads(f.readline())
+                        except ValueError:
+                            request = None
+                        response = _handleWatchRequest(watcher, request)
+                        f.write(json.dumps(response).encode("utf-8") + b"\n")
+                except OSError:
+                    # The client went away.
+                    continue
+            for line in response.get("output", []):
+                _print(line)
+            if response.get("stopped"):
+                return
+    finally:
+        server.close()
+        os.unlink(socketpath)
+
+
+def _requestWatch(socketpath: str, request: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Send a request to the C{incremental watch} daemon listening on the Unix
+    socket at C{socketpath}.
+
+    @return: The response.
+
+    @raise ValueError: If the request failed.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socketpath)
+        with client.makefile("rwb") as f:
+            f.write(json.dumps(request).encode("utf-8") + b"\n")
+            f.flush()
+            response: Dict[str, Any] = json.loads(f.readline())
+    if "error" in response:
+        raise ValueError(response["error"])
+    return response
+
+
+def _watch(
+    package: str,
+    path: Optional[str],
+    socketpath: str,
+    poll: bool = False,
+    pollInterval: float = 1.0,
+    maxMemory: int = _DEFAULT_MAX_MEMORY,
+    _getcwd: Optional[Callable[[], str]] = None,
+    _print: Callable[[object], object] = print,
+) -> None:
+    """
+    Run C{incremental watch}.
+    """
+    if not _getcwd:
+        _getcwd = os.getcwd
+
+    if not path:
+        path = _findPath(_getcwd(), package)
+
+    if pollInterval <= 0:
+        raise ValueError("--poll-interval must be positive")
+    if maxMemory < 1:
+        raise ValueError("--max-memory must be at least 1")
+    scope = _package_scan_scope(path)
+    watcher = _Watcher(package, path, scope, poll, maxMemory)
+    try:
+        _serveWatch(watcher, socketpath, pollInterval, _print)
+    finally:
+        watcher.close()
@@ -0,0 +1,244 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Tests for L{incremental._cache}.
+"""
+
+import os
+
+from twisted.python.filepath import FilePath
+from twisted.trial.unittest import TestCase
+
+from incremental import Version, _cache
+from incremental._cache import (
+    _CACHE_DIR_ENV,
+    _cached,
+    _cached_existing_version,
+    _cached_pyproject_toml,
+)
+from incremental._config import _IncrementalConfig
+
+
+class CachedTests(TestCase):
+    """
+    Tests for L{_cached}.
+    """
+
+    def setUp(self):
+        self.cache_dir = FilePath(self.mktemp())
+        self.patch(
+            os, "environ", dict(os.environ, **{_CACHE_DIR_ENV: self.cache_dir.path})
+        )
+        self.source = FilePath(self.mktemp())
+        self.source.setContent(b"content")
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def cached(self, load=lambda value: value):
+        return _cached("test", self.source.path, self.compute, lambda v: v, load)
+
+    def test_disabled(self):
+        """
+        Without C{INCREMENTAL_CACHE_DIR} every call computes the result.
+        """
+        del os.environ[_CACHE_DIR_ENV]
+        self.assertEqual(self.cached(), 1)
+        self.assertEqual(self.cached(), 2)
+
+    def test_hit(self):
+        """
+        An unchanged file reuses the cached result.
+        """
+        self.assertEqual(self.cached(), 1)
+        self.assertEqual(self.cached(), 1)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(len(self.cache_dir.children()), 1)
+
+    def test_contentChanged(self):
+        """
+        Changing the content of the file invalidates the result.
+        """
+        self.assertEqual(self.cached(), 1)
+        self.source.setContent(b"different content")
+        self.assertEqual(self.cached(), 2)
+        self.assertEqual(self.cached(), 2)
+
+    def test_mtimeChanged(self):
+        """
+        A file with a new modification time but the same content, such as a
+        fresh checkout, reuses the cached result.
+        """
+        self.assertEqual(self.cached(), 1)
+        os.utime(self.source.path, ns=(0, 0))
+        self.assertEqual(self.cached(), 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_sameSizeAndMtime(self):
+        """
+        Changing the content of the file invalidates the result even when
+        its size and modification time are unchanged, as when a release
+        candidate is bumped within the resolution of the file system's
+        timestamps, or a tree is restored with its old timestamps.
+        """
+        st = os.stat(self.source.path)
+        self.assertEqual(self.cached(), 1)
+        self.source.setContent(b"CONTENT")
+        os.utime(self.source.path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        self.assertEqual(self.cached(), 2)
+
+    def test_invalidated(self):
+        """
+        When C{load} rejects the cached value the result is recomputed.
+        """
+        self.assertEqual(self.cached(), 1)
+        self.assertEqual(self.cached(load=lambda value: None), 2)
+
+    def test_corruptEntry(self):
+        """
+        A corrupt cache entry is ignored and replaced.
+        """
+        self.assertEqual(self.cached(), 1)
+        [entry] = self.cache_dir.children()
+        entry.setContent(b"{not json")
+        self.assertEqual(self.cached(), 2)
+        self.assertEqual(self.cached(), 2)
+
+    def test_badValue(self):
+        """
+        A cache entry whose value C{load} can't handle is ignored.
+        """
+        self.assertEqual(self.cached(), 1)
+        self.assertEqual(self.cached(load=lambda value: value["nope"]), 2)
+
+    def test_unwritable(self):
+        """
+        Failing to write the cache doesn't prevent returning the result.
+        """
+        self.cache_dir.setContent(b"not a directory")
+        self.assertEqual(self.cached(), 1)
+        self.assertEqual(self.cached(), 2)
+
+    def test_missingFile(self):
+        """
+        When the file doesn't exist C{compute} is responsible for raising
+        the error.
+        """
+        self.source.remove()
+        self.assertEqual(self.cached(), 1)
+        self.assertFalse(self.cache_dir.exists())
+
+
+class CachedLoadersTests(TestCase):
+    """
+    Tests for L{_cached_pyproject_toml} and L{_cached_existing_version}.
+    """
+
+    def setUp(self):
+        self.cache_dir = FilePath(self.mktemp())
+        self.patch(
+            os, "environ", dict(os.environ, **{_CACHE_DIR_ENV: self.cache_dir.path})
+        )
+        self.root = FilePath(self.mktemp())
+        self.package = self.root.child("src").child("foo")
+        self.package.makedirs()
+        self.root.child("pyproject.toml").setContent(
+            b'[project]\nname = "Foo"\n\n[tool.incremental]\n'
+        )
+        self.package.child("_version.py").setContent(
+            b"from incremental import Version\n"
+            b'__version__ = Version("Foo", 24, 7, 0, release_candidate=1)\n'
+        )
+
+    def test_pyproject(self):
+        """
+        L{_cached_pyproject_toml} round-trips the configuration.
+        """
+        path = self.root.child("pyproject.toml").path
+        expected = _IncrementalConfig(
+            opt_in=True, package="Foo", path=self.package.path
+        )
+        self.assertEqual(_cached_pyproject_toml(path), expected)
+        self.patch(
+            _cache,
+            "_load_pyproject_toml",
+            lambda path: self.fail("not cached"),
+        )
+        self.assertEqual(_cached_pyproject_toml(path), expected)
+
+    def test_pyprojectPackageMoved(self):
+        """
+        A cached configuration is discarded when the package directory no
+        longer exists.
+        """
+        path = self.root.child("pyproject.toml").path
+        _cached_pyproject_toml(path)
+        self.package.moveTo(self.root.child("foo"))
+        self.assertEqual(_cached_pyproject_toml(path).path, self.root.child("foo").path)
+
+    def test_pyprojectOtherDirectory(self):
+        """
+        A configuration cached from a relative path in its project's
+        directory gives the same package directory when it is read from
+        another directory, which may contain a project of its own.
+        """
+        other = FilePath(self.mktemp())
+        other.child("src").child("foo").makedirs()
+        cwd = os.getcwd()
+        self.addCleanup(os.chdir, cwd)
+
+        os.chdir(self.root.path)
+        self.assertEqual(
+            _cached_pyproject_toml("./pyproject.toml").path,
+            os.path.join(".", "src", "foo"),
+        )
+        os.chdir(other.path)
+        self.patch(
+            _cache,
+            "_load_pyproject_toml",
+            lambda path: self.fail("not cached"),
+        )
+        self.assertEqual(
+            _cached_pyproject_toml(self.root.child("pyproject.toml").path).path,
+            self.package.path,
+        )
+
+    def test_existingVersion(self):
+        """
+        L{_cached_existing_version} round-trips the version.
+        """
+        path = self.package.child("_version.py").path
+        expected = "Version('Foo', 24, 7, 0, release_candidate=1)"
+        self.assertEqual(repr(_cached_existing_version(path)), expected)
+        self.patch(
+            _cache,
+            "_existing_version",
+            lambda path: self.fail("not cached"),
+        )
+        version = _cached_existing_version(path)
+        self.assertIsInstance(version, Version)
+        self.assertEqual(repr(version), expected)
+
+    def test_existingVersionBumpedInPlace(self):
+        """
+        L{_cached_existing_version} notices a bump from one release
+        candidate to the next that leaves the size and modification time of
+        C{_version.py} unchanged.
+        """
+        versionFile = self.package.child("_version.py")
+        st = os.stat(versionFile.path)
+        _cached_existing_version(versionFile.path)
+        versionFile.setContent(
+            versionFile.getContent().replace(
+                b"release_candidate=1", b"release_candidate=2"
+            )
+        )
+        os.utime(versionFile.path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        self.assertEqual(os.stat(versionFile.path).st_size, st.st_size)
+        self.assertEqual(
+            repr(_cached_existing_version(versionFile.path)),
+            "Version('Foo', 24, 7, 0, release_candidate=2)",
+        )
@@ -0,0 +1,195 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Tests for L{incremental._git}.
+"""
+
+import os
+import shutil
+import subprocess
+
+from twisted.python.filepath import FilePath
+from twisted.trial.unittest import SkipTest, TestCase
+
+from incremental._git import _readIndex, _trackedFiles
+
+
+class TrackedFilesTests(TestCase):
+    """
+    Tests for L{_trackedFiles} and L{_readIndex}, using indexes written by
+    git.
+    """
+
+    def setUp(self):
+        if shutil.which("git") is None:
+            raise SkipTest("git is not installed")
+        self.root = FilePath(self.mktemp())
+        self.root.makedirs()
+        for path in [
+            "README.rst",
+            "src/pkg/__init__.py",
+            "src/pkg/_version.py",
+            "src/pkg/sub/module.py",
+            "src/pkg/sub/spaced name.py",
+            "src/pkgextra/__init__.py",
+        ]:
+            child = self.root.preauthChild(path)
+            child.parent().makedirs(ignoreExistingDirectory=True)
+            child.setContent(b"")
+        self.package = self.root.preauthChild("src/pkg")
+
+    def git(self, *args):
+        subprocess.run(
+            ["git", "-c", "init.defaultBranch=trunk", *args],
+            cwd=self.root.path,
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def tracked(self, path):
+        return [
+            "/".join(FilePath(filepath).segmentsFrom(self.root))
+            for filepath in _trackedFiles(path)
+        ]
+
+    def test_versions(self):
+        """
+        Versions 2, 3 and 4 of the index can be read.
+        """
+        self.git("init", "-q")
+        self.git("add", ".")
+        # An intent-to-add entry needs the extended flags of version 3.
+        self.root.child("new.py").setContent(b"")
+        self.git("add", "-N", "new.py")
+        expected = [
+            b"README.rst",
+            b"new.py",
+            b"src/pkg/__init__.py",
+            b"src/pkg/_version.py",
+            b"src/pkg/sub/module.py",
+            b"src/pkg/sub/spaced name.py",
+            b"src/pkgextra/__init__.py",
+        ]
+        index = self.root.descendant([".git", "index"])
+        for version in ["2", "3", "4"]:
+            self.git("update-index", "--index-version", version)
+            self.assertEqual(_readIndex(index.getContent()), expected, version)
+
+    def test_sha256(self):
+        """
+        Indexes of SHA-256 repositories can be read.
+        """
+        try:
+            self.git("init", "-q", "--object-format=sha256")
+        except subprocess.CalledProcessError:
+            raise SkipTest("git doesn't support SHA-256 repositories")
+        self.git("add", ".")
+        self.assertEqual(
+            self.tracked(self.package.path),
+            [
+                "src/pkg/__init__.py",
+                "src/pkg/_version.py",
+                "src/pkg/sub/module.py",
+                "src/pkg/sub/spaced name.py",
+            ],
+        )
+
+    def test_trackedOnly(self):
+        """
+        Only regular files under the path that git tracks and that exist
+        are listed.
+        """
+        self.git("init", "-q")
+        self.git("add", ".")
+        self.package.child("untracked.py").setContent(b"")
+        self.package.descendant(["sub", "module.py"]).remove()
+        os.symlink("__init__.py", self.package.child("link.py").path)
+        self.git("add", "src/pkg/link.py")
+        self.assertEqual(
+            self.tracked(self.package.path),
+            [
+                "src/pkg/__init__.py",
+                "src/pkg/_version.py",
+                "src/pkg/sub/spaced name.py",
+            ],
+        )
+
+    def test_relativePath(self):
+        """
+        The paths returned are under the path given.
+        """
+        self.git("init", "-q")
+        self.git("add", ".")
+        cwd = os.getcwd()
+        os.chdir(self.root.path)
+        self.addCleanup(os.chdir, cwd)
+        self.assertEqual(
+            _trackedFiles(os.path.join("src", "pkg", "sub")),
+            [
+                os.path.join("src", "pkg", "sub", "module.py"),
+                os.path.join("src", "pkg", "sub", "spaced name.py"),
+            ],
+        )
+
+    def test_worktree(self):
+        """
+        The index of a linked worktree is read.
+        """
+        self.git("init", "-q")
+        self.git("add", ".")
+        self.git(
+            "-c",
+            "user.name=Test",
+            "-c",
+            "user.email=test@example.com",
+            "commit",
+            "-q",
+            "-m",
+            "Initial",
+        )
+        worktree = FilePath(self.mktemp())
+        self.git("worktree", "add", "-q", worktree.path)
+        self.assertEqual(
+            [
+                "/".join(FilePath(filepath).segmentsFrom(worktree))
+                for filepath in _trackedFiles(worktree.preauthChild("src/pkg").path)
+            ],
+            [
+                "src/pkg/__init__.py",
+                "src/pkg/_version.py",
+                "src/pkg/sub/module.py",
+                "src/pkg/sub/spaced name.py",
+            ],
+        )
+
+    def test_noIndex(self):
+        """
+        A repository without an index tracks nothing.
+        """
+        self.git("init", "-q")
+        self.assertEqual(_trackedFiles(self.package.path), [])
+
+    def test_notARepository(self):
+        """
+        L{_trackedFiles} raises L{ValueError} outside of a git working
+        tree.
+        """
+        self.assertRaises(ValueError, _trackedFiles, "/")
+
+    def test_invalid(self):
+        """
+        L{_readIndex} raises L{ValueError} for content that isn't a git
+        index it can read.
+        """
+        self.git("init", "-q")
+        self.git("add", ".")
+        index = self.root.descendant([".git", "index"]).getContent()
+        for content in [
+            b"",
+            b"not an index",
+            index[:4] + b"\0\0\0\x05" + index[8:],
+            index[:40],
+        ]:
+            self.assertRaises(ValueError, _readIndex, content)
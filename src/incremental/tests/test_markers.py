@@ -0,0 +1,179 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Tests for L{incremental._markers}.
+"""
+
+import json
+import os
+
+from twisted.python.filepath import FilePath
+from twisted.trial.unittest import TestCase
+
+from incremental import _markers
+from incremental._markers import (
+    _findMarkers,
+    _MarkerIndex,
+    _markerPattern,
+    _scanMarkers,
+)
+
+
+class FindMarkersTests(TestCase):
+    """
+    Tests for L{_findMarkers} and L{_markerPattern}.
+    """
+
+    def test_kinds(self):
+        """
+        NEXT and release candidate versions are found, in both their repr
+        and public forms, with their line numbers.
+        """
+        content = b"""\
+import pkg
+Version("pkg", "NEXT", 0, 0)
+# Added in pkg NEXT, changed in pkg 24.7.0rc2.
+Version("pkg", 24, 7, 0, release_candidate=2)
+Version("pkg", 24, 7, 0)
+pkg 24.7.0
+"""
+        self.assertEqual(
+            _findMarkers(_markerPattern("pkg"), content),
+            [
+                ("next", 2, 'Version("pkg", "NEXT", 0, 0)'),
+                ("next", 3, "pkg NEXT"),
+                ("rc", 3, "pkg 24.7.0rc2"),
+                ("rc", 4, 'Version("pkg", 24, 7, 0, release_candidate=2)'),
+            ],
+        )
+
+    def test_otherPackage(self):
+        """
+        Markers of other packages aren't found.
+        """
+        self.assertEqual(
+            _findMarkers(_markerPattern("pkg"), b'Version("other", "NEXT", 0, 0)'),
+            [],
+        )
+
+
+class ScanMarkersTests(TestCase):
+    """
+    Tests for L{_scanMarkers}.
+    """
+
+    def test_sameAsFindMarkers(self):
+        """
+        L{_scanMarkers} finds the same markers, on the same lines, as
+        L{_findMarkers}, whatever the chunk size.
+        """
+        content = (
+            b"""import pkg
+Version("pkg", "NEXT", 0, 0)
+
+# Added in pkg NEXT, changed in pkg 24.7.0rc2.
+Version("pkg", 24, 7, 0, release_candidate=2)
+"""
+            * 3
+        )
+        path = FilePath(self.mktemp())
+        path.setContent(content)
+        pattern = _markerPattern("pkg")
+        for chunkSize in (1, 7, len(content)):
+            self.assertEqual(
+                _scanMarkers(pattern, path.path, chunkSize),
+                _findMarkers(pattern, content),
+            )
+
+    def test_empty(self):
+        """
+        An empty file, which can't be mapped, has no markers.
+        """
+        path = FilePath(self.mktemp())
+        path.setContent(b"")
+        self.assertEqual(_scanMarkers(_markerPattern("pkg"), path.path, 8), [])
+
+
+class MarkerIndexTests(TestCase):
+    """
+    Tests for L{_MarkerIndex}.
+    """
+
+    def setUp(self):
+        self.patch(_markers, "_RACY_NS", -1)
+        self.root = FilePath(self.mktemp())
+        self.root.makedirs()
+        self.file = self.root.child("module.py")
+        self.file.setContent(b"pkg NEXT\n")
+        self.indexPath = self.root.child("index.json").path
+
+    def saved(self, package="pkg"):
+        index = _MarkerIndex(package)
+        index.record(self.file.path, self.file.getContent())
+        index.save(self.indexPath)
+        return _MarkerIndex.load(self.indexPath, package)
+
+    def test_roundTrip(self):
+        """
+        Markers recorded and saved are returned by L{_MarkerIndex.lookup}
+        after loading the index.
+        """
+        index = self.saved()
+        self.assertEqual(index.lookup(self.file.path), [("next", 1, "pkg NEXT")])
+        self.assertFalse(index.isClean(self.file.path))
+        self.assertEqual(
+            list(index),
+            [(os.path.abspath(self.file.path), ("next", 1, "pkg NEXT"))],
+        )
+
+    def test_changed(self):
+        """
+        A file that has changed since it was recorded isn't looked up.
+        """
+        index = self.saved()
+        self.file.setContent(b"")
+        self.assertIsNone(index.lookup(self.file.path))
+        self.assertFalse(index.isClean(self.file.path))
+
+    def test_racy(self):
+        """
+        A file modified shortly before the index was written isn't trusted,
+        as it may have changed again without its modification time changing.
+        """
+        self.patch(_markers, "_RACY_NS", 2_000_000_000)
+        self.assertIsNone(self.saved().lookup(self.file.path))
+
+    def test_otherPackage(self):
+        """
+        An index written for another package is discarded.
+        """
+        self.saved()
+        index = _MarkerIndex.load(self.indexPath, "other")
+        self.assertIsNone(index.lookup(self.file.path))
+
+    def test_invalid(self):
+        """
+        An index that is missing, corrupt or in another format is
+        discarded.
+        """
+        self.saved()
+        with open(self.indexPath) as f:
+            data = json.load(f)
+        data["format"] += 1
+        for content in [json.dumps(data), "{", "[]"]:
+            with open(self.indexPath, "w") as f:
+                f.write(content)
+            index = _MarkerIndex.load(self.indexPath, "pkg")
+            self.assertIsNone(index.lookup(self.file.path))
+        index = _MarkerIndex.load(self.root.child("missing").path, "pkg")
+        self.assertIsNone(index.lookup(self.file.path))
+
+    def test_unseenDropped(self):
+        """
+        Files that weren't looked up or recorded aren't saved again.
+        """
+        index = self.saved()
+        index.save(self.indexPath)
+        index = _MarkerIndex.load(self.indexPath, "pkg")
+        self.assertIsNone(index.lookup(self.file.path))
@@ -0,0 +1,76 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Tests for L{incremental._plan}.
+"""
+
+import os
+from io import BytesIO
+
+from twisted.trial.unittest import TestCase
+
+from incremental._plan import _dumpPlan, _hashFile, _loadPlan, _Plan, _PlannedFile
+
+
+class PlanTests(TestCase):
+    """
+    Tests for L{_dumpPlan} and L{_loadPlan}.
+    """
+
+    def test_roundTrip(self):
+        """
+        A plan survives serialization, including bytes that aren't UTF-8,
+        with its paths made relative to the directory it was made in and
+        resolved against the directory it is loaded in.
+        """
+        old = os.path.join("/", "old")
+        new = os.path.join("/", "new")
+        plan = _Plan(
+            "pkg",
+            "1.2.3",
+            [
+                _PlannedFile(
+                    os.path.join(old, "pkg", "\xe9.py"),
+                    "abc",
+                    [(3, b"pkg NEXT", b"pkg 1.2.3"), (20, b"\xff pkg NEXT", b"\xff")],
+                )
+            ],
+            os.path.join(old, "pkg", "_version.py"),
+            None,
+            b"__version__ = 1\n",
+        )
+        loaded = _loadPlan(_dumpPlan(plan, old), new)
+        self.assertEqual(loaded.files[0].path, os.path.join(new, "pkg", "\xe9.py"))
+        self.assertEqual(loaded.files[0].matches, plan.files[0].matches)
+        self.assertEqual(loaded.versionPath, os.path.join(new, "pkg", "_version.py"))
+        self.assertEqual(
+            (loaded.package, loaded.version, loaded.versionSha256),
+            ("pkg", "1.2.3", None),
+        )
+        self.assertEqual(loaded.versionContent, plan.versionContent)
+
+    def test_invalid(self):
+        """
+        L{_loadPlan} raises L{ValueError} for content that isn't a plan in
+        this format.
+        """
+        plan = _dumpPlan(_Plan("pkg", "1.2.3", [], "/_version.py", None, b""), "/")
+        for content in [
+            b"",
+            b"[]",
+            b"{}",
+            plan.replace(b'"format": 1', b'"format": 2'),
+        ]:
+            self.assertRaises(ValueError, _loadPlan, content, "/")
+
+    def test_hashFile(self):
+        """
+        L{_hashFile} hashes the whole file, from its start, in chunks.
+        """
+        f = BytesIO(b"a" * 10)
+        f.read(5)
+        self.assertEqual(
+            _hashFile(f, chunkSize=3),
+            "bf2cb58a68f684d95a3b78ef8f661c9a4e5b09e82cc8f9cc88cce90528caeb27",
+        )
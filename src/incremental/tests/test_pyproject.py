@@ -4,12 +4,28 @@
 """Test handling of ``pyproject.toml`` configuration"""
 
 import os
+import subprocess
+import sys
 from pathlib import Path
 from typing import Optional, Union, cast
 
 from twisted.trial.unittest import TestCase
 
-from incremental import _IncrementalConfig, _load_pyproject_toml
+from incremental import _config
+from incremental._config import (
+    _IncrementalConfig,
+    _load_pyproject_toml,
+    _load_scan_scope,
+    _load_toml,
+    _package_scan_scope,
+    _ScanScope,
+)
+from incremental._hooks import (
+    _find_version_path,
+    _get_distutils_version,
+    _get_setuptools_version,
+    _mayOptIn,
+)
 
 
 class VerifyPyprojectDotTomlTests(TestCase):
@@ -166,3 +182,410 @@ class VerifyPyprojectDotTomlTests(TestCase):
                 path=str(pkg),
             ),
         )
+
+
+class LoadScanScopeTests(TestCase):
+    """
+    Tests for L{_load_scan_scope}.
+    """
+
+    def _loadScope(self, toml: str) -> _ScanScope:
+        path: str = self.mktemp()  # type: ignore
+        with open(path, "w") as f:
+            f.write(toml)
+        return _load_scan_scope(path)
+
+    def test_missing(self):
+        """
+        Without a ``pyproject.toml`` everything is scanned.
+        """
+        self.assertEqual(_load_scan_scope(self.mktemp()), _ScanScope())
+
+    def test_notConfigured(self):
+        """
+        Everything is scanned when ``[tool.incremental]`` has no C{include}
+        or C{exclude} keys, or is missing.
+        """
+        for toml in ["", '[project]\nname = "Foo"\n', "[tool.incremental]\n"]:
+            self.assertEqual(self._loadScope(toml), _ScanScope(), toml)
+
+    def test_configured(self):
+        """
+        The C{include} and C{exclude} keys give lists of patterns.
+        """
+        self.assertEqual(
+            self._loadScope(
+                '[tool.incremental]\ninclude = ["*.py", "*.rst"]\n'
+                'exclude = ["tests/data"]\n'
+            ),
+            _ScanScope(include=("*.py", "*.rst"), exclude=("tests/data",)),
+        )
+
+    def test_invalid(self):
+        """
+        Raise `ValueError` when C{include} or C{exclude} isn't a list of
+        strings.
+        """
+        for toml in [
+            '[tool.incremental]\ninclude = "*.py"\n',
+            "[tool.incremental]\nexclude = [1]\n",
+        ]:
+            self.assertRaises(ValueError, self._loadScope, toml)
+
+    def test_hooksAcceptScope(self):
+        """
+        The build hooks accept a ``[tool.incremental]`` table with
+        C{include} and C{exclude} keys.
+        """
+        root = Path(self.mktemp())
+        (root / "foo").mkdir(parents=True)
+        path = root / "pyproject.toml"
+        path.write_text('[tool.incremental]\nname = "Foo"\nexclude = ["data"]\n')
+        self.assertEqual(
+            _load_pyproject_toml(str(path)),
+            _IncrementalConfig(opt_in=True, package="Foo", path=str(root / "foo")),
+        )
+
+
+class PackageScanScopeTests(TestCase):
+    """
+    Tests for L{_package_scan_scope}.
+    """
+
+    def setUp(self):
+        self.root = Path(self.mktemp())
+        self.root.mkdir()
+
+    def test_flat(self):
+        """
+        The scope of a package is read from the ``pyproject.toml`` next to
+        it.
+        """
+        (self.root / "foo").mkdir()
+        (self.root / "pyproject.toml").write_text(
+            '[tool.incremental]\nexclude = ["data"]\n'
+        )
+        self.assertEqual(
+            _package_scan_scope(str(self.root / "foo")),
+            _ScanScope(exclude=("data",)),
+        )
+
+    def test_src(self):
+        """
+        The scope of a package under C{src/} is read from the
+        ``pyproject.toml`` next to C{src/}.
+        """
+        (self.root / "src" / "foo").mkdir(parents=True)
+        (self.root / "pyproject.toml").write_text(
+            '[tool.incremental]\ninclude = ["*.py"]\n'
+        )
+        self.assertEqual(
+            _package_scan_scope(str(self.root / "src" / "foo")),
+            _ScanScope(include=("*.py",)),
+        )
+
+    def test_unusable(self):
+        """
+        The whole package is scanned when its project has no
+        ``pyproject.toml``, or one that can't be used, and a
+        ``pyproject.toml`` further up isn't consulted.
+        """
+        (self.root / "project" / "src" / "foo").mkdir(parents=True)
+        (self.root / "pyproject.toml").write_text(
+            '[tool.incremental]\nexclude = ["data"]\n'
+        )
+        package = str(self.root / "project" / "src" / "foo")
+        self.assertEqual(_package_scan_scope(package), _ScanScope())
+        for toml in [
+            "[tool.incremental\n",
+            '[tool.incremental]\nexclude = "data"\n',
+            '[tool.incremental]\nunrelated = "key"\n',
+        ]:
+            (self.root / "project" / "pyproject.toml").write_text(toml)
+            self.assertEqual(_package_scan_scope(package), _ScanScope(), toml)
+
+
+class MayOptInTests(TestCase):
+    """
+    Tests for L{_mayOptIn}.
+    """
+
+    def test_optIn(self):
+        """
+        Every way of writing a C{[tool.incremental]} table is detected.
+        """
+        for toml in [
+            b"[tool.incremental]\n",
+            b"[ tool . incremental ]\n",
+            b'[tool."incremental"]\n',
+            b"[\"tool\".'incremental']\n",
+            b'[tool.incremental.extra]\nname = "foo"\n',
+            b'[tool]\nincremental = {name = "foo"}\n',
+            b'[tool]\n"incremental" = {}\n',
+            b'[tool]\nincremental.name = "foo"\n',
+            b'tool.incremental.name = "foo"\n',
+            b"tool = { incremental = {} }\n",
+            b"tool = {black = {}, 'incremental' = {}}\n",
+        ]:
+            with open(self.mktemp(), "wb+") as f:
+                f.write(toml)
+                f.seek(0)
+                self.assertIn("incremental", _load_toml(f)["tool"], toml)
+            self.assertTrue(_mayOptIn(toml), toml)
+
+    def test_noOptIn(self):
+        """
+        Documents that don't mention a C{[tool.incremental]} table are
+        rejected.
+        """
+        for toml in [
+            b"",
+            b'[project]\nname = "foo"\n',
+            b'[build-system]\nrequires = ["setuptools", "incremental"]\n',
+            b"[tool.notincremental]\n",
+            b'[project]\ndescription = "Uses incremental versioning"\n',
+        ]:
+            self.assertFalse(_mayOptIn(toml), toml)
+
+
+class SetuptoolsHookTests(TestCase):
+    """
+    Tests for L{_get_setuptools_version}.
+    """
+
+    def setUp(self):
+        self.root = Path(self.mktemp()).absolute()
+        (self.root / "src" / "foo").mkdir(parents=True)
+        (self.root / "src" / "foo" / "_version.py").write_text(
+            'from incremental import Version\n__version__ = Version("Foo", 24, 7, 0)\n'
+        )
+        cwd = os.getcwd()
+        os.chdir(self.root)
+        self.addCleanup(os.chdir, cwd)
+
+        class Metadata:
+            version = None
+
+        class Distribution:
+            metadata = Metadata()
+
+        self.dist = Distribution()
+
+    def test_optedIn(self):
+        """
+        The version is read from C{_version.py} when the project has opted
+        in.
+        """
+        (self.root / "pyproject.toml").write_text(
+            '[project]\nname = "Foo"\n[tool.incremental]\n'
+        )
+        _get_setuptools_version(self.dist)
+        self.assertEqual(self.dist.metadata.version, "24.7.0")
+
+    def test_notOptedIn(self):
+        """
+        Projects that haven't opted in are rejected without parsing
+        C{pyproject.toml}.
+        """
+        (self.root / "pyproject.toml").write_text(
+            '[project]\nname = "Foo"\n[tool.black]\n'
+        )
+        self.patch(_config, "_load_toml", lambda f: self.fail("parsed"))
+        _get_setuptools_version(self.dist)
+        self.assertIsNone(self.dist.metadata.version)
+
+    def test_notOptedInImports(self):
+        """
+        Rejecting a project that hasn't opted in doesn't import the modules
+        needed to read the configuration or the version.
+        """
+        (self.root / "pyproject.toml").write_text(
+            '[project]\nname = "Foo"\n[tool.black]\n'
+        )
+        script = (
+            "import sys\n"
+            "from incremental._hooks import _get_setuptools_version\n"
+            "class Metadata: version = None\n"
+            "class Distribution: metadata = Metadata()\n"
+            "_get_setuptools_version(Distribution())\n"
+            "print(' '.join(sys.modules))\n"
+        )
+        src = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+        # -S keeps site-packages .pth files from importing anything.
+        output = subprocess.check_output(
+            [sys.executable, "-S", "-c", script],
+            env=dict(os.environ, PYTHONPATH=src),
+        )
+        modules = set(output.decode().split())
+        self.assertIn("incremental._hooks", modules)
+        for name in [
+            "dataclasses",
+            "hashlib",
+            "json",
+            "packaging",
+            "re",
+            "tomli",
+            "tomllib",
+            "typing",
+            "warnings",
+            "incremental._cache",
+            "incremental._config",
+            "incremental._parse",
+        ]:
+            self.assertNotIn(name, modules)
+
+    def test_hooksImportTime(self):
+        """
+        C{python -X importtime} shows that importing L{incremental._hooks}
+        imports no other part of Incremental and none of the modules needed
+        to read the configuration or the version.
+        """
+        src = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+        # -S keeps site-packages .pth files from importing anything.
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-S",
+                "-X",
+                "importtime",
+                "-c",
+                "import incremental._hooks",
+            ],
+            env=dict(os.environ, PYTHONPATH=src),
+            stderr=subprocess.PIPE,
+            check=True,
+        )
+        # Lines are "import time: self [us] | cumulative | imported package",
+        # with each module indented under the one that imported it and
+        # printed after it.
+        imports = []
+        for line in result.stderr.decode().splitlines():
+            fields = line.split("|")
+            if len(fields) != 3 or not fields[1].strip().isdigit():
+                continue
+            name = fields[2].rstrip()
+            imports.append((len(name) - len(name.lstrip()), name.strip()))
+        names = [name for _, name in imports]
+        self.assertIn("incremental._hooks", names)
+        hooksAt = names.index("incremental._hooks")
+        self.assertEqual(imports[hooksAt][0], 1)
+        modules = []
+        for depth, name in reversed(imports[:hooksAt]):
+            if depth <= 1:
+                break
+            modules.append(name)
+        self.assertEqual(
+            sorted(name for name in modules if name.startswith("incremental")),
+            ["incremental"],
+        )
+        for name in [
+            "dataclasses",
+            "hashlib",
+            "json",
+            "packaging",
+            "re",
+            "tomli",
+            "tomllib",
+            "typing",
+            "warnings",
+        ]:
+            self.assertNotIn(name, modules)
+
+    def test_noPyproject(self):
+        """
+        The hook does nothing when there is no C{pyproject.toml}.
+        """
+        _get_setuptools_version(self.dist)
+        self.assertIsNone(self.dist.metadata.version)
+
+
+class DistutilsHookTests(TestCase):
+    """
+    Tests for L{_get_distutils_version} and L{_find_version_path}.
+    """
+
+    def setUp(self):
+        self.root = Path(self.mktemp()).absolute()
+        cwd = os.getcwd()
+        self.root.mkdir()
+        os.chdir(self.root)
+        self.addCleanup(os.chdir, cwd)
+
+    def makePackage(self, path: str, version: Optional[str] = None) -> None:
+        package = self.root / path
+        package.mkdir(parents=True)
+        (package / "__init__.py").write_text("")
+        if version is not None:
+            (package / "_version.py").write_text(
+                "from incremental import Version\n"
+                f'__version__ = Version("Foo", {version})\n'
+            )
+
+    def distribution(self, **attrs):
+        from setuptools.dist import Distribution  # type: ignore
+
+        dist = Distribution(dict(name="Foo", **attrs))
+        dist.script_name = "setup.py"
+        return dist
+
+    def test_packageDir(self):
+        """
+        L{_find_version_path} maps package names to directories the way
+        C{build_py} does.
+        """
+        self.makePackage("src/foo", "1, 2, 3")
+        self.makePackage("lib/bar/baz", "4, 5, 6")
+        self.makePackage("qux/quux", "7, 8, 9")
+        for packages, package_dir, expected in [
+            (["foo"], {"": "src"}, "src/foo/_version.py"),
+            (["bar.baz"], {"bar": "lib/bar"}, "lib/bar/baz/_version.py"),
+            (["bar.baz"], {"bar.baz": "lib/bar/baz"}, "lib/bar/baz/_version.py"),
+            (["qux.quux"], None, "qux/quux/_version.py"),
+            (["quux"], {"": "qux"}, "qux/quux/_version.py"),
+            (["nope", "foo"], {"": "src"}, "src/foo/_version.py"),
+        ]:
+            dist = self.distribution(packages=packages, package_dir=package_dir)
+            self.assertEqual(
+                _find_version_path(dist),
+                os.path.join(*expected.split("/")),
+                (packages, package_dir),
+            )
+
+    def test_fallBack(self):
+        """
+        L{_find_version_path} returns L{None} when a full search of the
+        distribution's modules is needed.
+        """
+        self.makePackage("foo", "1, 2, 3")
+        for attrs in [
+            {},
+            {"packages": ["bar"]},
+            {"packages": ["foo"], "py_modules": ["_version"]},
+        ]:
+            self.assertIsNone(_find_version_path(self.distribution(**attrs)), attrs)
+
+    def test_direct(self):
+        """
+        L{_get_distutils_version} reads the version of a declared package
+        without searching every module.
+        """
+        self.makePackage("src/foo", "24, 7, 0")
+        dist = self.distribution(packages=["foo"], package_dir={"": "src"})
+        from setuptools.command import build_py  # type: ignore
+
+        self.patch(build_py, "build_py", lambda dist: self.fail("searched"))
+        _get_distutils_version(dist, "use_incremental", True)
+        self.assertEqual(dist.metadata.version, "24.7.0")
+
+    def test_search(self):
+        """
+        When the version can't be found directly L{_get_distutils_version}
+        searches the distribution's modules.
+        """
+        self.makePackage("foo", "24, 7, 0")
+        (self.root / "_version.py").write_text(
+            'from incremental import Version\n__version__ = Version("Foo", 1, 0, 0)\n'
+        )
+        dist = self.distribution(packages=["foo"], py_modules=["_version"])
+        _get_distutils_version(dist, "use_incremental", True)
+        self.assertEqual(dist.metadata.version, "1.0.0")
@@ -5,15 +5,465 @@
 Tests for L{incremental.update}.
 """
 
+import asyncio
 import datetime
+import json
 import os
+import random
+import shutil
+import subprocess
 import sys
+import tempfile
+import threading
+import time
+import tracemalloc
 from io import StringIO
 
 from twisted.python.filepath import FilePath
-from twisted.trial.unittest import TestCase
+from twisted.trial.unittest import SkipTest, TestCase
+
+from incremental import Version, _markers, update
+from incremental._config import _ScanScope
+from incremental._markers import _scanMarkers
+from incremental._watch import _requestWatch
+from incremental.update import (
+    AsyncUpdater,
+    BumpSpec,
+    _applyPlan,
+    _Committer,
+    _main,
+    _Replacer,
+    _rewriteFile,
+    _run,
+    _runMany,
+    _streamRewrite,
+    _UpdateStats,
+    _walkPackage,
+    bump,
+    read_version,
+    run,
+)
+
+
+class ReplacerTests(TestCase):
+    """
+    Tests for L{_Replacer}.
+    """
+
+    replacements = [
+        (
+            b'Version("pkg", 1, 2, 3, release_candidate=1)',
+            b'Version("pkg", 1, 2, 3)',
+        ),
+        (b"pkg 1.2.3rc1", b"pkg 1.2.3"),
+        (b'Version("pkg", "NEXT", 0, 0)', b'Version("pkg", 1, 2, 3)'),
+        (b"pkg NEXT", b"pkg 1.2.3"),
+    ]
+
+    def sequential(self, content):
+        for pattern, replacement in self.replacements:
+            content = content.replace(pattern, replacement)
+        return content
+
+    def test_counts(self):
+        """
+        L{_Replacer.replace} adds the number of occurrences of each pattern
+        to C{counts}.
+        """
+        replacer = _Replacer(b"pkg", self.replacements)
+        counts = {b"pkg NEXT": 1}
+        replacer.replace(b'pkg NEXT pkg 1.2.3rc1 Version("pkg", "NEXT", 0, 0)', counts)
+        replacer.replace(b"pkg NEXT", counts)
+        self.assertEqual(
+            counts,
+            {
+                b"pkg NEXT": 3,
+                b"pkg 1.2.3rc1": 1,
+                b'Version("pkg", "NEXT", 0, 0)': 1,
+            },
+        )
+
+    def test_sameAsSequential(self):
+        """
+        L{_Replacer.replace} gives the same result as replacing each pattern
+        in turn.
+        """
+        replacer = _Replacer(b"pkg", self.replacements)
+        for content in [
+            b"",
+            b"pkg",
+            b"pkg NEXT",
+            b"pkgpkg NEXTpkg NEXT",
+            b"pkg pkg NEXT pkg 1.2.3rc1 pkg 1.2.3rc",
+            b'Version("pkg", "NEXT", 0, 0) Version("pkg", "NEXT", 0',
+            b'xVersion("pkg", "NEXT", 0, 0)pkg NEXTVersion("pkg", "NEXT", 0, 0)',
+            b'Version("pkg", 1, 2, 3, release_candidate=1).short() # pkg 1.2.3rc1',
+            b'Version("pkg", 1, 2, 3, release_candidate=1, dev=0)',
+            b"import pkg\n\nprint(pkg.__version__)\n" * 3,
+        ]:
+            self.assertEqual(
+                replacer.replace(content), self.sequential(content), content
+            )
+
+    def test_unchanged(self):
+        """
+        L{_Replacer.replace} returns its argument when nothing matched.
+        """
+        content = b"import pkg\n" * 2
+        self.assertIs(_Replacer(b"pkg", self.replacements).replace(content), content)
+
+    def test_firstReplacementWins(self):
+        """
+        When a pattern is repeated, its first replacement is used.
+        """
+        replacer = _Replacer(b"a", [(b"ab", b"1"), (b"ab", b"2")])
+        self.assertEqual(replacer.replace(b"abab"), b"11")
+
+    def test_longestFirst(self):
+        """
+        When two patterns match at the same place, the longer one wins.
+        """
+        replacer = _Replacer(b"a", [(b"a", b"1"), (b"ab", b"2")])
+        self.assertEqual(replacer.replace(b"aab"), b"12")
+
+    def test_missingAnchor(self):
+        """
+        Every pattern must contain the anchor.
+        """
+        self.assertRaises(ValueError, _Replacer, b"pkg", [(b"NEXT", b"1.2.3")])
+
+
+class RewriteFileTests(TestCase):
+    """
+    Tests for L{_rewriteFile}.
+    """
+
+    def setUp(self):
+        self.replacer = _Replacer(b"pkg", [(b"pkg NEXT", b"pkg 1.2.3")])
+        self.file = FilePath(self.mktemp())
+
+    def rewrite(self, content):
+        self.file.setContent(content)
+        return _rewriteFile(self.file.path, self.replacer)
+
+    def test_rewritten(self):
+        """
+        A file with markers is rewritten.
+        """
+        self.assertEqual(self.rewrite(b"# pkg NEXT\n"), "rewritten")
+        self.assertEqual(self.file.getContent(), b"# pkg 1.2.3\n")
+
+    def test_unchanged(self):
+        """
+        A file that mentions the package without markers is left alone.
+        """
+        self.assertEqual(self.rewrite(b"import pkg\n"), "unchanged")
+        self.assertEqual(self.file.getContent(), b"import pkg\n")
+
+    def test_skipped(self):
+        """
+        A file that doesn't mention the package is skipped.
+        """
+        self.assertEqual(self.rewrite(b"import os\n"), "skipped")
+
+    def test_binary(self):
+        """
+        A file with a NUL byte near the start is skipped as binary, even if
+        it contains markers.
+        """
+        self.assertEqual(self.rewrite(b"\0\1\2 pkg NEXT"), "binary")
+        self.assertEqual(self.file.getContent(), b"\0\1\2 pkg NEXT")
+
+    def test_large(self):
+        """
+        Large files are checked through mmap before being read.
+        """
+        self.patch(update, "_MMAP_THRESHOLD", 10)
+        self.assertEqual(self.rewrite(b"x" * 20), "skipped")
+        self.assertEqual(self.rewrite(b"\0" * 20 + b"pkg NEXT"), "binary")
+        self.assertEqual(self.rewrite(b"x" * 20 + b"pkg NEXT"), "rewritten")
+        self.assertEqual(self.file.getContent(), b"x" * 20 + b"pkg 1.2.3")
+        self.assertEqual(self.rewrite(b""), "skipped")
+
+
+class StreamRewriteTests(TestCase):
+    """
+    Tests for L{_streamRewrite}, and L{_rewriteFile} on files too large to
+    read in one go.
+    """
+
+    def setUp(self):
+        self.patch(_markers, "_RACY_NS", -1)
+        self.replacer = _Replacer(
+            b"pkg",
+            [
+                (b'Version("pkg", "NEXT", 0, 0)', b'Version("pkg", 1, 2, 3)'),
+                (b"pkg NEXT", b"pkg 1.2.3"),
+            ],
+        )
+        self.root = FilePath(self.mktemp())
+        self.root.makedirs()
+        self.file = self.root.child("data.txt")
+
+    def test_sameAsWhole(self):
+        """
+        Streaming gives the same result as rewriting the whole file, wherever
+        the markers fall relative to the chunks, with or without newlines.
+        """
+        rng = random.Random(0)
+        pieces = [
+            b"x",
+            b"pkg",
+            b"\n",
+            b" ",
+            b"pkg NEXT",
+            b'Version("pkg", "NEXT", 0, 0)',
+        ]
+        for separator in [b"\n", b""]:
+            for _ in range(20):
+                content = separator.join(
+                    rng.choice(pieces) for _ in range(rng.randrange(200))
+                )
+                expected = self.replacer.replace(content)
+                for chunkSize in [1, 7, 64, 10000]:
+                    self.file.setContent(content)
+                    outcome = _streamRewrite(self.file.path, self.replacer, chunkSize)
+                    self.assertEqual(
+                        outcome,
+                        "unchanged" if expected is content else "rewritten",
+                    )
+                    self.assertEqual(self.file.getContent(), expected)
+
+    def test_unchanged(self):
+        """
+        A file without markers is left alone, and no temporary file is left
+        behind.
+        """
+        self.file.setContent(b"import pkg\n" * 100)
+        self.assertEqual(_streamRewrite(self.file.path, self.replacer, 16), "unchanged")
+        self.assertEqual(self.root.listdir(), ["data.txt"])
+
+    def test_mode(self):
+        """
+        A rewritten file keeps its permissions, and no temporary file is
+        left behind.
+        """
+        self.file.setContent(b"import pkg\n" * 100 + b"pkg NEXT\n")
+        self.file.chmod(0o751)
+        self.assertEqual(_streamRewrite(self.file.path, self.replacer, 16), "rewritten")
+        self.assertEqual(self.file.getPermissions().shorthand(), "rwxr-x--x")
+        self.assertEqual(self.root.listdir(), ["data.txt"])
+
+    def test_index(self):
+        """
+        The markers found while streaming are recorded in the index, with
+        their line numbers, unless a chunk had to be split without a
+        newline.
+        """
+        content = b"import pkg\n" * 50 + b"pkg NEXT\n" + b"pkg 1.0rc1\n" * 2
+        self.file.setContent(content)
+        streamed = _markers._MarkerIndex("pkg")
+        _streamRewrite(self.file.path, self.replacer, 16, streamed)
+        whole = _markers._MarkerIndex("pkg")
+        whole.record(self.file.path, self.file.getContent())
+        self.assertEqual(list(streamed), list(whole))
+
+        self.file.setContent(content.replace(b"\n", b" "))
+        unsplittable = _markers._MarkerIndex("pkg")
+        _streamRewrite(self.file.path, self.replacer, 16, unsplittable)
+        self.assertEqual(list(unsplittable), [])
+        self.assertIsNone(unsplittable.lookup(self.file.path))
+
+    def test_memoryLimit(self):
+        """
+        L{_rewriteFile} rewrites a file many times larger than its memory
+        limit while allocating less than the limit.
+        """
+        limit = 256 * 1024
+        padding = b"x" * 80
+        for line in [b"# pkg NEXT " + padding + b"\n", b"# pkg NEXT " + padding]:
+            content = line * (16 * limit // len(line))
+            self.file.setContent(content)
+            expected = self.replacer.replace(content)
+            del content
+            tracemalloc.start()
+            self.addCleanup(tracemalloc.stop)
+            outcome = _rewriteFile(self.file.path, self.replacer, memoryLimit=limit)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self.assertEqual(outcome, "rewritten")
+            self.assertLess(peak, limit)
+            self.assertEqual(self.file.getContent(), expected)
+
+
+class CommitterTests(TestCase):
+    """
+    Tests for L{_Committer}.
+    """
+
+    def setUp(self):
+        self.root = FilePath(self.mktemp())
+        self.root.makedirs()
+        self.file = self.root.child("module.py")
+        self.file.setContent(b"old")
+        self.synced = []
+        self.patch(os, "fsync", self.synced.append)
+
+    def test_write(self):
+        """
+        L{_Committer.write} replaces the file with a new one with the same
+        permissions, leaving no temporary file behind.
+        """
+        self.file.chmod(0o751)
+        inode = os.stat(self.file.path).st_ino
+        _Committer().write(self.file.path, b"new")
+        self.file.changed()
+        self.assertEqual(self.file.getContent(), b"new")
+        self.assertNotEqual(os.stat(self.file.path).st_ino, inode)
+        self.assertEqual(self.file.getPermissions().shorthand(), "rwxr-x--x")
+        self.assertEqual(self.root.listdir(), ["module.py"])
+
+    def test_newFile(self):
+        """
+        A new file gets the permissions the umask allows.
+        """
+        umask = os.umask(0o027)
+        self.addCleanup(os.umask, umask)
+        _Committer().write(self.root.child("new.py").path, b"new")
+        self.assertEqual(
+            self.root.child("new.py").getPermissions().shorthand(), "rw-r-----"
+        )
 
-from incremental.update import _main, _run, run
+    def test_symlink(self):
+        """
+        Writing to a symbolic link replaces the file it points to.
+        """
+        link = self.root.child("link.py")
+        os.symlink("module.py", link.path)
+        _Committer().write(link.path, b"new")
+        self.assertTrue(link.islink())
+        self.assertEqual(self.file.getContent(), b"new")
+
+    def test_failure(self):
+        """
+        If the rename fails, the original is untouched and the temporary
+        file is removed.
+        """
+
+        def replace(src, dst):
+            raise OSError("no")
+
+        self.patch(os, "replace", replace)
+        self.assertRaises(OSError, _Committer().write, self.file.path, b"new")
+        self.assertEqual(self.file.getContent(), b"old")
+        self.assertEqual(self.root.listdir(), ["module.py"])
+
+    def test_syncDirectories(self):
+        """
+        Each file is flushed before it is renamed, and each directory once
+        by L{_Committer.syncDirectories}.
+        """
+        self.root.child("sub").makedirs()
+        committer = _Committer()
+        for path in ["a.py", "b.py", "sub/c.py"]:
+            committer.write(self.root.preauthChild(path).path, b"new")
+        self.assertEqual(len(self.synced), 3)
+        if not hasattr(os, "O_DIRECTORY"):
+            raise SkipTest("Directories can't be flushed on this platform")
+        committer.syncDirectories()
+        self.assertEqual(len(self.synced), 5)
+        committer.syncDirectories()
+        self.assertEqual(len(self.synced), 5)
+
+    def test_noFsync(self):
+        """
+        With C{fsync=False}, nothing is flushed to disk.
+        """
+        committer = _Committer(fsync=False)
+        committer.write(self.file.path, b"new")
+        committer.syncDirectories()
+        self.assertEqual(self.file.getContent(), b"new")
+        self.assertEqual(self.synced, [])
+
+
+class WalkPackageTests(TestCase):
+    """
+    Tests for L{_walkPackage}.
+    """
+
+    def setUp(self):
+        self.root = FilePath(self.mktemp())
+        for path in [
+            "__init__.py",
+            "_version.py",
+            "_speedups.so",
+            "__pycache__/__init__.cpython-311.pyc",
+            ".mypy_cache/3.11/foo.json",
+            "foo.egg-info/PKG-INFO",
+            "node_modules/thing/index.js",
+            "docs/index.rst",
+            "tests/__init__.py",
+            "tests/data/fixture.json",
+            "tests/data/nested/fixture.py",
+        ]:
+            child = self.root.preauthChild(path)
+            child.parent().makedirs(ignoreExistingDirectory=True)
+            child.setContent(b"")
+
+    def walk(self, **scope):
+        stats = _UpdateStats()
+        filepaths = _walkPackage(self.root.path, _ScanScope(**scope), stats)
+        relpaths = sorted(
+            "/".join(FilePath(filepath).segmentsFrom(self.root))
+            for filepath in filepaths
+        )
+        return relpaths, stats.excluded
+
+    def test_defaults(self):
+        """
+        Compiled files and well-known directories that can't contain
+        markers are skipped.
+        """
+        self.assertEqual(
+            self.walk(),
+            (
+                [
+                    "__init__.py",
+                    "_version.py",
+                    "docs/index.rst",
+                    "tests/__init__.py",
+                    "tests/data/fixture.json",
+                    "tests/data/nested/fixture.py",
+                ],
+                1,
+            ),
+        )
+
+    def test_exclude(self):
+        """
+        Excluded files are skipped and excluded directories aren't entered.
+        """
+        self.assertEqual(
+            self.walk(exclude=("tests/data", "*.rst")),
+            (["__init__.py", "_version.py", "tests/__init__.py"], 2),
+        )
+
+    def test_include(self):
+        """
+        When C{include} is given only matching files are scanned.
+        """
+        self.assertEqual(
+            self.walk(include=("*.py",), exclude=("tests/data/*.json",)),
+            (
+                [
+                    "__init__.py",
+                    "_version.py",
+                    "tests/__init__.py",
+                    "tests/data/nested/fixture.py",
+                ],
+                3,
+            ),
+        )
 
 
 class NonCreatedUpdateTests(TestCase):
@@ -1118,6 +1568,28 @@ next_released_version = "inctestpkg 1.0.0"
 """,
         )
 
+    def test_newversion_unrepresentable(self):
+        """
+        `incremental.update package --newversion=1.1a1` refuses a version
+        that L{Version} can't represent, and changes nothing.
+        """
+        before = self.packagedir.child("_version.py").getContent()
+        with self.assertRaises(ValueError):
+            _run(
+                "inctestpkg",
+                path=None,
+                newversion="1.1a1",
+                patch=False,
+                rc=False,
+                post=False,
+                dev=False,
+                create=False,
+                _date=self.date,
+                _getcwd=self.getcwd,
+                _print=[].append,
+            )
+        self.assertEqual(self.packagedir.child("_version.py").getContent(), before)
+
     def test_newversion_bare_major_minor(self):
         """
         `incremental.update package --newversion=1.1`, will set that
@@ -1162,113 +1634,805 @@ next_released_version = "inctestpkg 1.1.0"
 """,
         )
 
+    def test_jobs(self):
+        """
+        `--jobs` rewrites files in several threads, reporting them in the
+        same order as a single thread would, and writes `_version.py` last.
+        """
 
-class ScriptTests(TestCase):
-    def setUp(self):
-        self.srcdir = FilePath(self.mktemp())
-        self.srcdir.makedirs()
-
-        self.srcdir.child("src").makedirs()
+        def reset():
+            for i in range(20):
+                if i % 3:
+                    self.packagedir.child(f"module{i}.py").setContent(
+                        b'version = "inctestpkg NEXT"\n'
+                    )
+                else:
+                    self.packagedir.child(f"module{i}.py").setContent(
+                        b"unrelated = True\n"
+                    )
+            self.packagedir.child("__init__.py").setContent(
+                b'version = "inctestpkg NEXT"\n'
+            )
 
-        packagedir = self.srcdir.child("src").child("inctestpkg")
-        packagedir.makedirs()
+        def update(jobs):
+            out = []
+            _run(
+                "inctestpkg",
+                path=None,
+                newversion="1.2.4",
+                patch=False,
+                rc=False,
+                post=False,
+                dev=False,
+                create=False,
+                jobs=jobs,
+                _date=self.date,
+                _getcwd=self.getcwd,
+                _print=out.append,
+            )
+            return out
 
-        packagedir.child("__init__.py").setContent(
-            b"""
-from incremental import Version
-introduced_in = Version("inctestpkg", "NEXT", 0, 0).short()
-next_released_version = "inctestpkg NEXT"
-"""
+        reset()
+        out = update(4)
+        self.assertEqual(
+            self.packagedir.child("module1.py").getContent(),
+            b'version = "inctestpkg 1.2.4"\n',
         )
-        packagedir.child("_version.py").setContent(
-            b"""
-from incremental import Version
-__version__ = Version("inctestpkg", 1, 2, 3)
-__all__ = ["__version__"]
-"""
+        self.assertEqual(
+            self.packagedir.child("module3.py").getContent(), b"unrelated = True\n"
+        )
+        self.assertEqual(len(out), 1 + 1 + 13 + 1)
+        self.assertEqual(
+            out[-1], "Updating " + self.packagedir.child("_version.py").path
         )
-        self.getcwd = lambda: self.srcdir.path
-        self.packagedir = packagedir
-
-        class Date:
-            year = 2016
-            month = 8
-
-        class DateModule:
-            def today(self):
-                return Date()
 
-        self.date = DateModule()
+        reset()
+        self.assertEqual(update(1), out)
 
-    def test_help(self):
+    def test_jobsInvalid(self):
         """
-        Running `python -m incremental.update --help` causes it to print help.
+        `--jobs` must be at least 1.
         """
-        stringio = StringIO()
-        self.patch(sys, "stdout", stringio)
-
-        with self.assertRaises(SystemExit) as e:
-            run(["--help"])
-
-        self.assertEqual(e.exception.args[0], 0)
-        self.assertIn("show this help message and exit", stringio.getvalue())
+        with self.assertRaises(ValueError) as e:
+            _run(
+                "inctestpkg",
+                path=None,
+                newversion=None,
+                patch=False,
+                rc=False,
+                post=False,
+                dev=True,
+                create=False,
+                jobs=0,
+                _date=self.date,
+                _getcwd=self.getcwd,
+                _print=[].append,
+            )
+        self.assertEqual(e.exception.args[0], "--jobs must be at least 1")
 
-    def test_incrementalDotUpdate(self):
+    def test_stats(self):
         """
-        Running `python -m incremental.update inctestpkg --rc` creates
-        a release candidate.
+        L{_run} returns counts of what it did with each file.
         """
-        stringio = StringIO()
-        self.patch(sys, "stdout", stringio)
-        self.patch(os, "getcwd", self.getcwd)
-        self.patch(datetime, "date", self.date)
-
-        # This used to be implemented with Click, which always raises
-        # SystemExit. We continue to do so for compatability.
-        with self.assertRaises(SystemExit) as e:
-            run(["inctestpkg", "--rc"])
-
-        self.assertEqual(e.exception.args[0], 0)
-        self.assertIn("Updating codebase", stringio.getvalue())
-
+        self.packagedir.child("data.bin").setContent(b"\0inctestpkg NEXT")
+        self.packagedir.child("other.py").setContent(b"import os\n")
+        self.packagedir.child("uses.py").setContent(b"import inctestpkg\n")
+        stats = _run(
+            "inctestpkg",
+            path=None,
+            newversion=None,
+            patch=False,
+            rc=False,
+            post=False,
+            dev=True,
+            create=False,
+            _date=self.date,
+            _getcwd=self.getcwd,
+            _print=[].append,
+        )
         self.assertEqual(
-            self.packagedir.child("_version.py").getContent(),
-            b'''"""
-Provides inctestpkg version information.
-"""
-
-# This file is auto-generated! Do not edit!
-# Use `incremental` to change this file.
-
-from incremental import Version
-
-__version__ = Version("inctestpkg", 16, 8, 0, release_candidate=1)
-__all__ = ["__version__"]
-''',
+            stats,
+            _UpdateStats(files=5, binary=1, skipped=1, unchanged=2, rewritten=1),
         )
         self.assertEqual(
-            self.packagedir.child("__init__.py").getContent(),
-            b"""
-from incremental import Version
-introduced_in = Version("inctestpkg", 16, 8, 0, release_candidate=1).short()
-next_released_version = "inctestpkg 16.8.0rc1"
-""",
+            self.packagedir.child("data.bin").getContent(), b"\0inctestpkg NEXT"
         )
 
-    def test_incrementalUpdate(self):
+    def test_statsDetail(self):
         """
-        Running `incremental update inctestpkg --rc` creates a release
-        candidate.
+        The stats returned by L{_run} also count the bytes read and the
+        replacements of each pattern, and time each phase of the update.
         """
-        stringio = StringIO()
-        self.patch(sys, "stdout", stringio)
-        self.patch(os, "getcwd", self.getcwd)
-        self.patch(datetime, "date", self.date)
-
-        _main(["update", "inctestpkg", "--rc"])
-
-        self.assertIn("Updating codebase", stringio.getvalue())
-
+        self.packagedir.child("uses.py").setContent(
+            b"import inctestpkg\nx = 'inctestpkg NEXT'\ny = 'inctestpkg NEXT'\n"
+        )
+        size = sum(child.getsize() for child in self.packagedir.children())
+        stats = _run(
+            "inctestpkg",
+            path=None,
+            newversion=None,
+            patch=False,
+            rc=False,
+            post=False,
+            dev=True,
+            create=False,
+            _date=self.date,
+            _getcwd=self.getcwd,
+            _print=[].append,
+        )
+        self.assertEqual(stats.bytesRead, size)
+        self.assertEqual(
+            stats.replacements,
+            {
+                b'Version("inctestpkg", "NEXT", 0, 0)': 1,
+                b"inctestpkg NEXT": 3,
+            },
+        )
+        self.assertEqual(
+            sorted(stats.timings),
+            ["match", "read", "rewrite", "scan", "total", "version", "walk", "write"],
+        )
+        report = update._statsReport(stats)
+        self.assertEqual(report["files"]["changed"], 2)
+        self.assertEqual(report["files"]["visited"], stats.files)
+        self.assertEqual(report["bytes_read"], stats.bytesRead)
+        self.assertEqual(
+            report["replacements"],
+            {'Version("inctestpkg", "NEXT", 0, 0)': 1, "inctestpkg NEXT": 3},
+        )
+        self.assertEqual(
+            sorted(report["timings"]),
+            ["match", "read", "total", "version", "walk", "write"],
+        )
+
+    def test_quiet(self):
+        """
+        With C{quiet=True}, L{_run} only prints the new version, not each
+        file it writes.
+        """
+        out: list = []
+        stats = _run(
+            "inctestpkg",
+            path=None,
+            newversion=None,
+            patch=False,
+            rc=False,
+            post=False,
+            dev=True,
+            create=False,
+            quiet=True,
+            _date=self.date,
+            _getcwd=self.getcwd,
+            _print=out.append,
+        )
+        self.assertEqual(stats.rewritten, 1)
+        self.assertEqual(out, ["Updating codebase to 1.2.3.dev0"])
+
+    def test_scanScope(self):
+        """
+        L{_run} only scans the files selected by the C{include} and
+        C{exclude} keys of ``[tool.incremental]``.
+        """
+        self.srcdir.child("pyproject.toml").setContent(
+            b'[tool.incremental]\nexclude = ["data"]\n'
+        )
+        self.packagedir.child("data").makedirs()
+        self.packagedir.child("data").child("fixture.txt").setContent(
+            b"inctestpkg NEXT"
+        )
+        stats = _run(
+            "inctestpkg",
+            path=None,
+            newversion=None,
+            patch=False,
+            rc=False,
+            post=False,
+            dev=True,
+            create=False,
+            _date=self.date,
+            _getcwd=self.getcwd,
+            _print=[].append,
+        )
+        self.assertEqual(
+            self.packagedir.child("data").child("fixture.txt").getContent(),
+            b"inctestpkg NEXT",
+        )
+        self.assertEqual(stats.rewritten, 1)
+
+    def test_scanScopeFromPackage(self):
+        """
+        L{_run} reads the scan scope from the project of the package it
+        updates, not from a ``pyproject.toml`` in the current directory,
+        which may be invalid or belong to another project.
+        """
+        self.srcdir.child("pyproject.toml").setContent(
+            b'[tool.incremental]\nexclude = ["data"]\n'
+        )
+        self.packagedir.child("data").makedirs()
+        self.packagedir.child("data").child("fixture.txt").setContent(
+            b"inctestpkg NEXT"
+        )
+        elsewhere = FilePath(self.mktemp())
+        elsewhere.makedirs()
+        elsewhere.child("pyproject.toml").setContent(b"[tool.incremental\n")
+        stats = _run(
+            "inctestpkg",
+            path=self.packagedir.path,
+            newversion=None,
+            patch=False,
+            rc=False,
+            post=False,
+            dev=True,
+            create=False,
+            _date=self.date,
+            _getcwd=lambda: elsewhere.path,
+            _print=[].append,
+        )
+        self.assertEqual(stats.rewritten, 1)
+        self.assertEqual(
+            self.packagedir.child("data").child("fixture.txt").getContent(),
+            b"inctestpkg NEXT",
+        )
+
+    def test_git(self):
+        """
+        With C{git=True}, L{_run} only scans files that git tracks.
+        """
+        if shutil.which("git") is None:
+            raise SkipTest("git is not installed")
+        self.packagedir.child("untracked.py").setContent(b"inctestpkg NEXT")
+        subprocess.run(
+            ["git", "init", "-q"],
+            cwd=self.srcdir.path,
+            check=True,
+            stderr=subprocess.DEVNULL,
+        )
+        subprocess.run(
+            ["git", "add", "inctestpkg/__init__.py", "inctestpkg/_version.py"],
+            cwd=self.srcdir.path,
+            check=True,
+        )
+        stats = _run(
+            "inctestpkg",
+            path=None,
+            newversion=None,
+            patch=False,
+            rc=False,
+            post=False,
+            dev=True,
+            create=False,
+            git=True,
+            _date=self.date,
+            _getcwd=self.getcwd,
+            _print=[].append,
+        )
+        self.assertEqual(
+            self.packagedir.child("untracked.py").getContent(), b"inctestpkg NEXT"
+        )
+        self.assertEqual((stats.files, stats.rewritten), (2, 1))
+
+    def test_atomic(self):
+        """
+        L{_run} replaces the files it changes and C{_version.py} with new
+        files, rather than overwriting them in place, and flushes them to
+        disk unless C{fsync=False}.
+        """
+        synced = []
+        self.patch(os, "fsync", synced.append)
+        inodes = {
+            child.basename(): os.stat(child.path).st_ino
+            for child in self.packagedir.children()
+        }
+
+        def update(fsync):
+            _run(
+                "inctestpkg",
+                path=None,
+                newversion=None,
+                patch=False,
+                rc=False,
+                post=False,
+                dev=True,
+                create=False,
+                fsync=fsync,
+                _date=self.date,
+                _getcwd=self.getcwd,
+                _print=[].append,
+            )
+
+        update(fsync=False)
+        self.assertEqual(synced, [])
+        for child in self.packagedir.children():
+            self.assertNotEqual(os.stat(child.path).st_ino, inodes[child.basename()])
+        update(fsync=True)
+        self.assertNotEqual(synced, [])
+
+    def plan(self, planpath, getcwd=None):
+        return _run(
+            "inctestpkg",
+            path=None,
+            newversion=None,
+            patch=False,
+            rc=True,
+            post=False,
+            dev=False,
+            create=False,
+            max_memory=1,
+            planpath=planpath,
+            _date=self.date,
+            _getcwd=getcwd or self.getcwd,
+            _print=[].append,
+        )
+
+    def test_planApply(self):
+        """
+        With a plan, L{_run} only writes the plan. L{_applyPlan} then
+        makes the same changes L{_run} would have made, including in files
+        too large to read in one go.
+        """
+        self.packagedir.child("large.txt").setContent(
+            b"x" * 300_000 + b"inctestpkg NEXT\n" + b"y" * 300_000
+        )
+        expected = FilePath(self.mktemp())
+        self.srcdir.copyTo(expected)
+        self.plan(None, lambda: expected.path)
+
+        before = {c.basename(): c.getContent() for c in self.packagedir.children()}
+        planpath = self.srcdir.child("plan.json")
+        stats = self.plan(planpath.path)
+        self.assertEqual(stats.rewritten, 2)
+        self.assertEqual(
+            {c.basename(): c.getContent() for c in self.packagedir.children()},
+            before,
+        )
+
+        output = []
+        stats = _applyPlan(planpath.path, _getcwd=self.getcwd, _print=output.append)
+        self.assertEqual(stats.rewritten, 2)
+        self.assertEqual(output[0], "Updating codebase to 16.8.0rc1")
+        for child in expected.child("inctestpkg").children():
+            self.assertEqual(
+                self.packagedir.child(child.basename()).getContent(),
+                child.getContent(),
+            )
+
+    def test_planRelative(self):
+        """
+        A plan can be written to a bare relative file name, in the current
+        directory, and applied from there.
+        """
+        cwd = os.getcwd()
+        os.chdir(self.srcdir.path)
+        self.addCleanup(os.chdir, cwd)
+        synced = []
+        self.patch(os, "fsync", synced.append)
+
+        stats = self.plan("plan.json")
+        self.assertEqual(stats.rewritten, 1)
+        self.assertTrue(self.srcdir.child("plan.json").exists())
+        self.assertTrue(synced)
+
+        stats = _applyPlan("plan.json", _getcwd=self.getcwd, _print=[].append)
+        self.assertEqual(stats.rewritten, 1)
+        self.assertIn(b"16.8.0rc1", self.packagedir.child("__init__.py").getContent())
+
+    def test_applyChanged(self):
+        """
+        L{_applyPlan} refuses to apply a plan if a file in it, or
+        C{_version.py}, has changed since it was made, and writes nothing.
+        """
+        planpath = self.srcdir.child("plan.json")
+        for name in ["__init__.py", "_version.py"]:
+            self.plan(planpath.path)
+            child = self.packagedir.child(name)
+            original = child.getContent()
+            child.setContent(original + b"# Edited\n")
+            with self.assertRaises(ValueError) as e:
+                _applyPlan(planpath.path, _getcwd=self.getcwd, _print=[].append)
+            self.assertIn("has changed since", str(e.exception))
+            self.assertIn(b"NEXT", self.packagedir.child("__init__.py").getContent())
+            child.setContent(original)
+
+    def test_index(self):
+        """
+        With an index, L{_run} doesn't read files that the index shows have
+        no markers and haven't changed since, and rescans the others.
+        """
+        self.patch(_markers, "_RACY_NS", -1)
+        self.packagedir.child("other.py").setContent(b"import os\n")
+        index = self.srcdir.child("index.json")
+
+        def update():
+            return _run(
+                "inctestpkg",
+                path=None,
+                newversion=None,
+                patch=False,
+                rc=False,
+                post=False,
+                dev=True,
+                create=False,
+                indexpath=index.path,
+                _date=self.date,
+                _getcwd=self.getcwd,
+                _print=[].append,
+            )
+
+        self.assertEqual((update().indexed, update().indexed), (0, 3))
+        self.packagedir.child("other.py").setContent(b"# inctestpkg NEXT\n")
+        stats = update()
+        self.assertEqual((stats.indexed, stats.rewritten), (2, 1))
+        self.assertEqual(
+            self.packagedir.child("other.py").getContent(),
+            b"# inctestpkg 1.2.3.dev2\n",
+        )
+
+
+class ManyPackagesTests(TestCase):
+    """
+    Tests for L{_runMany}.
+    """
+
+    def setUp(self):
+        self.root = FilePath(self.mktemp())
+        for project, package, extra in [
+            ("a", "pkga", ""),
+            ("b", "pkgb", 'exclude = ["data"]\n'),
+        ]:
+            projectdir = self.root.descendant(["packages", project])
+            packagedir = projectdir.descendant(["src", package])
+            packagedir.makedirs()
+            projectdir.child("pyproject.toml").setContent(
+                f'[project]\nname = "{package}"\n[tool.incremental]\n{extra}'.encode()
+            )
+            packagedir.child("__init__.py").setContent(b"# pkga NEXT\n# pkgb NEXT\n")
+            packagedir.child("_version.py").setContent(
+                f'from incremental import Version\n__version__ = Version("{package}", 1, 2, 3)\n'.encode()
+            )
+        self.root.descendant(["packages", "b", "src", "pkgb", "data"]).makedirs()
+        self.root.descendant(
+            ["packages", "b", "src", "pkgb", "data", "x.txt"]
+        ).setContent(b"pkgb NEXT")
+        # Not opted in, and without a name: ignored.
+        self.root.descendant(["packages", "c"]).makedirs()
+        self.root.descendant(["packages", "c", "pyproject.toml"]).setContent(
+            b"[tool.black]\n"
+        )
+        # In a pruned directory: ignored.
+        self.root.descendant(["node_modules", "d"]).makedirs()
+        self.root.descendant(["node_modules", "d", "pyproject.toml"]).setContent(
+            b'[project]\nname = "missing"\n[tool.incremental]\n'
+        )
+
+        class Date:
+            year = 2016
+            month = 8
+
+        self.date = Date()
+
+    def runMany(self, packages=(), discover=True, getcwd=None, **kwargs):
+        return _runMany(
+            packages,
+            discover=discover,
+            newversion=None,
+            patch=False,
+            rc=True,
+            post=False,
+            dev=False,
+            create=False,
+            _date=self.date,
+            _getcwd=getcwd or (lambda: self.root.path),
+            _print=[].append,
+            **kwargs,
+        )
+
+    def test_discover(self):
+        """
+        With C{discover=True}, every package under the current directory
+        that opts in to Incremental is updated, each with its own scan
+        scope. Each file is only matched against the markers of its own
+        package.
+        """
+        stats = self.runMany(jobs=2)
+        self.assertEqual(stats.rewritten, 2)
+        for project, package in [("a", "pkga"), ("b", "pkgb")]:
+            packagedir = self.root.descendant(["packages", project, "src", package])
+            self.assertIn(
+                f'Version("{package}", 16, 8, 0, release_candidate=1)'.encode(),
+                packagedir.child("_version.py").getContent(),
+            )
+        self.assertEqual(
+            self.root.descendant(
+                ["packages", "a", "src", "pkga", "__init__.py"]
+            ).getContent(),
+            b"# pkga 16.8.0rc1\n# pkgb NEXT\n",
+        )
+        self.assertEqual(
+            self.root.descendant(
+                ["packages", "b", "src", "pkgb", "__init__.py"]
+            ).getContent(),
+            b"# pkga NEXT\n# pkgb 16.8.0rc1\n",
+        )
+        self.assertEqual(
+            self.root.descendant(
+                ["packages", "b", "src", "pkgb", "data", "x.txt"]
+            ).getContent(),
+            b"pkgb NEXT",
+        )
+
+    def test_packages(self):
+        """
+        Packages can be given by name, and are found in the current
+        directory as by L{_run}.
+        """
+        project = self.root.descendant(["packages", "a"])
+        stats = self.runMany(["pkga"], discover=False, getcwd=lambda: project.path)
+        self.assertEqual(stats.rewritten, 1)
+
+    def test_nested(self):
+        """
+        A package inside another can't be updated with it.
+        """
+        self.root.child("pyproject.toml").setContent(
+            b'[project]\nname = "packages"\n[tool.incremental]\n'
+        )
+        self.assertRaises(ValueError, self.runMany)
+
+    def test_noPackages(self):
+        """
+        L{_runMany} raises L{ValueError} if there's nothing to update.
+        """
+        self.assertRaises(
+            ValueError,
+            self.runMany,
+            discover=True,
+            getcwd=lambda: self.root.child("node_modules").path,
+        )
+
+
+class BumpTests(TestCase):
+    """
+    Tests for L{bump}.
+    """
+
+    def setUp(self):
+        self.srcdir = FilePath(self.mktemp())
+        self.packagedir = self.srcdir.descendant(["src", "inctestpkg"])
+        self.packagedir.makedirs()
+        self.packagedir.child("__init__.py").setContent(b"# inctestpkg NEXT\n")
+        self.packagedir.child("other.py").setContent(b"import os\n")
+        self.packagedir.child("_version.py").setContent(
+            b"from incremental import Version\n"
+            b'__version__ = Version("inctestpkg", 1, 2, 3)\n'
+        )
+
+        class Date:
+            year = 2016
+            month = 8
+
+        class DateModule:
+            def today(self):
+                return Date()
+
+        self.patch(datetime, "date", DateModule())
+
+    def test_result(self):
+        """
+        L{bump} updates the package in the given directory and returns the
+        old and new versions, the files it changed and how long it took,
+        without printing anything.
+        """
+        stdout = StringIO()
+        self.patch(sys, "stdout", stdout)
+        result = bump(BumpSpec("inctestpkg", cwd=self.srcdir.path, rc=True))
+        self.assertEqual(stdout.getvalue(), "")
+        self.assertEqual(result.package, "inctestpkg")
+        self.assertEqual(result.old_version, Version("inctestpkg", 1, 2, 3))
+        self.assertEqual(
+            result.new_version, Version("inctestpkg", 16, 8, 0, release_candidate=1)
+        )
+        self.assertEqual(
+            result.changed_files,
+            (
+                self.packagedir.child("__init__.py").path,
+                self.packagedir.child("_version.py").path,
+            ),
+        )
+        self.assertEqual(result.files_scanned, 3)
+        self.assertEqual(sorted(result.timings), ["scan", "total", "version", "write"])
+        self.assertEqual(
+            self.packagedir.child("__init__.py").getContent(),
+            b"# inctestpkg 16.8.0rc1\n",
+        )
+
+    def test_repeated(self):
+        """
+        L{bump} can be called again in the same process, and each call sees
+        the version written by the last.
+        """
+        spec = BumpSpec("inctestpkg", cwd=self.srcdir.path, rc=True, fsync=False)
+        bump(spec)
+        result = bump(spec)
+        self.assertEqual(
+            result.old_version, Version("inctestpkg", 16, 8, 0, release_candidate=1)
+        )
+        self.assertEqual(
+            result.new_version, Version("inctestpkg", 16, 8, 0, release_candidate=2)
+        )
+        self.assertEqual(
+            self.packagedir.child("__init__.py").getContent(),
+            b"# inctestpkg 16.8.0rc2\n",
+        )
+
+    def test_invalid(self):
+        """
+        L{bump} raises L{ValueError} for options that can't be combined.
+        """
+        self.assertRaises(
+            ValueError,
+            bump,
+            BumpSpec("inctestpkg", cwd=self.srcdir.path, create=True, rc=True),
+        )
+
+
+class AsyncUpdaterTests(TestCase):
+    """
+    Tests for L{read_version} and L{AsyncUpdater}.
+    """
+
+    def setUp(self):
+        self.root = FilePath(self.mktemp())
+        self.projects = []
+        for package in ["pkga", "pkgb", "pkgc"]:
+            packagedir = self.root.descendant([package, package])
+            packagedir.makedirs()
+            packagedir.child("__init__.py").setContent(f"# {package} NEXT\n".encode())
+            packagedir.child("_version.py").setContent(
+                b"from incremental import Version\n"
+                + f'__version__ = Version("{package}", 1, 2, 3)\n'.encode()
+            )
+            self.projects.append((package, self.root.child(package).path))
+
+    def test_readVersion(self):
+        """
+        L{read_version} reads the version of the package in a project
+        directory.
+        """
+        package, cwd = self.projects[0]
+        self.assertEqual(read_version(package, cwd), Version(package, 1, 2, 3))
+
+    def test_concurrent(self):
+        """
+        L{AsyncUpdater} reads versions and updates several packages
+        concurrently.
+        """
+
+        async def main():
+            async with AsyncUpdater(max_workers=2) as updater:
+                results = await asyncio.gather(
+                    *(
+                        updater.bump(BumpSpec(package, cwd=cwd, dev=True))
+                        for package, cwd in self.projects
+                    )
+                )
+                versions = await asyncio.gather(
+                    *(
+                        updater.read_version(package, cwd)
+                        for package, cwd in self.projects
+                    )
+                )
+            return results, versions
+
+        results, versions = asyncio.run(main())
+        self.assertEqual(
+            [result.new_version for result in results],
+            [Version(package, 1, 2, 3, dev=0) for package, _ in self.projects],
+        )
+        self.assertEqual(versions, [result.new_version for result in results])
+
+    def test_bounded(self):
+        """
+        No more than C{max_workers} calls run at once.
+        """
+        lock = threading.Lock()
+        running = [0]
+        peak = [0]
+
+        def fakeBump(spec):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+            return spec.package
+
+        self.patch(update, "bump", fakeBump)
+
+        async def main():
+            async with AsyncUpdater(max_workers=2) as updater:
+                return await asyncio.gather(
+                    *(updater.bump(BumpSpec(str(i))) for i in range(8))
+                )
+
+        self.assertEqual(asyncio.run(main()), [str(i) for i in range(8)])
+        self.assertEqual(peak[0], 2)
+
+    def test_invalid(self):
+        """
+        L{AsyncUpdater} needs at least one thread.
+        """
+        self.assertRaises(ValueError, AsyncUpdater, 0)
+
+
+class ScriptTests(TestCase):
+    def setUp(self):
+        self.srcdir = FilePath(self.mktemp())
+        self.srcdir.makedirs()
+
+        self.srcdir.child("src").makedirs()
+
+        packagedir = self.srcdir.child("src").child("inctestpkg")
+        packagedir.makedirs()
+
+        packagedir.child("__init__.py").setContent(
+            b"""
+from incremental import Version
+introduced_in = Version("inctestpkg", "NEXT", 0, 0).short()
+next_released_version = "inctestpkg NEXT"
+"""
+        )
+        packagedir.child("_version.py").setContent(
+            b"""
+from incremental import Version
+__version__ = Version("inctestpkg", 1, 2, 3)
+__all__ = ["__version__"]
+"""
+        )
+        self.getcwd = lambda: self.srcdir.path
+        self.packagedir = packagedir
+
+        class Date:
+            year = 2016
+            month = 8
+
+        class DateModule:
+            def today(self):
+                return Date()
+
+        self.date = DateModule()
+
+    def test_help(self):
+        """
+        Running `python -m incremental.update --help` causes it to print help.
+        """
+        stringio = StringIO()
+        self.patch(sys, "stdout", stringio)
+
+        with self.assertRaises(SystemExit) as e:
+            run(["--help"])
+
+        self.assertEqual(e.exception.args[0], 0)
+        self.assertIn("show this help message and exit", stringio.getvalue())
+
+    def test_incrementalDotUpdate(self):
+        """
+        Running `python -m incremental.update inctestpkg --rc` creates
+        a release candidate.
+        """
+        stringio = StringIO()
+        self.patch(sys, "stdout", stringio)
+        self.patch(os, "getcwd", self.getcwd)
+        self.patch(datetime, "date", self.date)
+
+        # This used to be implemented with Click, which always raises
+        # SystemExit. We continue to do so for compatability.
+        with self.assertRaises(SystemExit) as e:
+            run(["inctestpkg", "--rc"])
+
+        self.assertEqual(e.exception.args[0], 0)
+        self.assertIn("Updating codebase", stringio.getvalue())
+
         self.assertEqual(
             self.packagedir.child("_version.py").getContent(),
             b'''"""
@@ -1290,5 +2454,300 @@ __all__ = ["__version__"]
 from incremental import Version
 introduced_in = Version("inctestpkg", 16, 8, 0, release_candidate=1).short()
 next_released_version = "inctestpkg 16.8.0rc1"
+""",
+        )
+
+    def test_incrementalUpdate(self):
+        """
+        Running `incremental update inctestpkg --rc` creates a release
+        candidate.
+        """
+        stringio = StringIO()
+        self.patch(sys, "stdout", stringio)
+        self.patch(os, "getcwd", self.getcwd)
+        self.patch(datetime, "date", self.date)
+
+        _main(["update", "inctestpkg", "--rc"])
+
+        self.assertIn("Updating codebase", stringio.getvalue())
+
+        self.assertEqual(
+            self.packagedir.child("_version.py").getContent(),
+            b'''"""
+Provides inctestpkg version information.
+"""
+
+# This file is auto-generated! Do not edit!
+# Use `incremental` to change this file.
+
+from incremental import Version
+
+__version__ = Version("inctestpkg", 16, 8, 0, release_candidate=1)
+__all__ = ["__version__"]
+''',
+        )
+        self.assertEqual(
+            self.packagedir.child("__init__.py").getContent(),
+            b"""
+from incremental import Version
+introduced_in = Version("inctestpkg", 16, 8, 0, release_candidate=1).short()
+next_released_version = "inctestpkg 16.8.0rc1"
+""",
+        )
+
+    def test_incrementalUpdateJobs(self):
+        """
+        `incremental update` accepts `--jobs`.
+        """
+        stringio = StringIO()
+        self.patch(sys, "stdout", stringio)
+        self.patch(os, "getcwd", self.getcwd)
+        self.patch(datetime, "date", self.date)
+
+        _main(["update", "inctestpkg", "--rc", "--jobs", "2"])
+
+        self.assertEqual(
+            self.packagedir.child("__init__.py").getContent(),
+            b"""
+from incremental import Version
+introduced_in = Version("inctestpkg", 16, 8, 0, release_candidate=1).short()
+next_released_version = "inctestpkg 16.8.0rc1"
+""",
+        )
+
+    def test_incrementalMarkers(self):
+        """
+        `incremental markers inctestpkg` prints where NEXT is used, and
+        `--kind rc` where release candidate versions are.
+        """
+        stringio = StringIO()
+        self.patch(sys, "stdout", stringio)
+        self.patch(os, "getcwd", self.getcwd)
+        index = self.srcdir.child("index.json")
+
+        _main(["markers", "inctestpkg", "--index", index.path])
+
+        path = os.path.join("src", "inctestpkg", "__init__.py")
+        self.assertEqual(
+            stringio.getvalue(),
+            f'{path}:3: Version("inctestpkg", "NEXT", 0, 0)\n'
+            f"{path}:4: inctestpkg NEXT\n",
+        )
+        self.assertTrue(index.exists())
+
+        stringio.truncate(0)
+        stringio.seek(0)
+        _main(["markers", "inctestpkg", "--kind", "rc"])
+        self.assertEqual(stringio.getvalue(), "")
+
+    def test_incrementalMarkersMaxMemory(self):
+        """
+        `incremental markers --max-memory` searches files too large to read
+        in that much memory through L{_scanMarkers}, without reading them
+        whole.
+        """
+        stringio = StringIO()
+        self.patch(sys, "stdout", stringio)
+        self.patch(os, "getcwd", self.getcwd)
+        scanned = []
+
+        def scanMarkers(pattern, filepath, chunkSize):
+            scanned.append((filepath, chunkSize))
+            return _scanMarkers(pattern, filepath, chunkSize)
+
+        self.patch(update, "_scanMarkers", scanMarkers)
+        large = self.packagedir.child("large.py")
+        large.setContent(b"# padding\n" * 30000 + b"x = 'inctestpkg NEXT'\n")
+
+        _main(["markers", "inctestpkg", "--max-memory", "1"])
+
+        self.assertEqual(scanned, [(large.path, 1024 * 1024 // 8)])
+        path = os.path.join("src", "inctestpkg", "__init__.py")
+        largePath = os.path.join("src", "inctestpkg", "large.py")
+        self.assertEqual(
+            stringio.getvalue(),
+            f'{path}:3: Version("inctestpkg", "NEXT", 0, 0)\n'
+            f"{path}:4: inctestpkg NEXT\n"
+            f"{largePath}:30001: inctestpkg NEXT\n",
+        )
+
+    def test_incrementalMarkersMaxMemoryTooSmall(self):
+        """
+        `incremental markers` refuses a C{--max-memory} below 1.
+        """
+        self.patch(os, "getcwd", self.getcwd)
+        with self.assertRaises(ValueError) as e:
+            _main(["markers", "inctestpkg", "--max-memory", "0"])
+        self.assertEqual(str(e.exception), "--max-memory must be at least 1")
+
+    def test_incrementalUpdateNoFsync(self):
+        """
+        `incremental update` accepts `--no-fsync`.
+        """
+        self.patch(sys, "stdout", StringIO())
+        self.patch(os, "getcwd", self.getcwd)
+        self.patch(datetime, "date", self.date)
+        synced = []
+        self.patch(os, "fsync", synced.append)
+
+        _main(["update", "inctestpkg", "--rc", "--no-fsync"])
+
+        self.assertEqual(synced, [])
+        self.assertIn(b"16.8.0rc1", self.packagedir.child("__init__.py").getContent())
+
+    def test_incrementalUpdateStats(self):
+        """
+        `incremental update --stats` prints what the update did and how long
+        it took, `--stats-json` writes the same as JSON, and `--quiet` stops
+        it printing each file it writes.
+        """
+        stringio = StringIO()
+        self.patch(sys, "stdout", stringio)
+        self.patch(os, "getcwd", self.getcwd)
+        self.patch(datetime, "date", self.date)
+        statspath = self.srcdir.child("stats.json")
+        size = sum(child.getsize() for child in self.packagedir.children())
+
+        _main(
+            [
+                "update",
+                "inctestpkg",
+                "--rc",
+                "--quiet",
+                "--stats",
+                "--stats-json",
+                statspath.path,
+            ]
+        )
+
+        out = stringio.getvalue()
+        self.assertNotIn("Updating " + self.packagedir.path, out)
+        self.assertIn("Timings", out)
+        self.assertIn("Replacements: 2", out)
+        report = json.loads(statspath.getContent())
+        self.assertEqual(report["files"]["changed"], 1)
+        self.assertEqual(
+            report["replacements"],
+            {'Version("inctestpkg", "NEXT", 0, 0)': 1, "inctestpkg NEXT": 1},
+        )
+        self.assertEqual(report["bytes_read"], size)
+
+    def test_incrementalApply(self):
+        """
+        `incremental update --plan` writes a plan that `incremental apply`
+        applies.
+        """
+        self.patch(sys, "stdout", StringIO())
+        self.patch(os, "getcwd", self.getcwd)
+        self.patch(datetime, "date", self.date)
+        plan = self.srcdir.child("plan.json")
+
+        _main(["update", "inctestpkg", "--rc", "--plan", plan.path])
+        self.assertIn(b"NEXT", self.packagedir.child("__init__.py").getContent())
+
+        _main(["apply", plan.path, "--no-fsync"])
+        self.assertEqual(
+            self.packagedir.child("__init__.py").getContent(),
+            b"""
+from incremental import Version
+introduced_in = Version("inctestpkg", 16, 8, 0, release_candidate=1).short()
+next_released_version = "inctestpkg 16.8.0rc1"
+""",
+        )
+
+    def test_incrementalUpdateMany(self):
+        """
+        `incremental update` accepts several packages, but not with
+        `--path`.
+        """
+        self.patch(sys, "stdout", StringIO())
+        self.patch(os, "getcwd", lambda: self.srcdir.path)
+        self.patch(datetime, "date", self.date)
+
+        _main(["update", "inctestpkg", "inctestpkg", "--rc"])
+        self.assertIn(b"16.8.0rc1", self.packagedir.child("__init__.py").getContent())
+        self.assertRaises(
+            ValueError,
+            _main,
+            ["update", "inctestpkg", "other", "--path", self.packagedir.path],
+        )
+
+    def test_incrementalUpdateNoPackage(self):
+        """
+        `incremental update` without a package or `--discover` prints a
+        usage message and exits with status 2, like any other missing
+        argument.
+        """
+        for main, argv in [(_main, ["update"]), (run, [])]:
+            stderr = StringIO()
+            self.patch(sys, "stderr", stderr)
+            with self.assertRaises(SystemExit) as e:
+                main(argv)
+            self.assertEqual(e.exception.args[0], 2)
+            self.assertIn("usage:", stderr.getvalue())
+            self.assertIn("required: package", stderr.getvalue())
+
+    def test_incrementalUpdateWithoutWatch(self):
+        """
+        `incremental update` and `incremental markers` don't import the
+        `incremental watch` daemon.
+        """
+        src = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+        for argv in [["update", "inctestpkg", "--rc"], ["markers", "inctestpkg"]]:
+            script = (
+                "import sys\n"
+                "from incremental.update import _main\n"
+                f"_main({argv!r})\n"
+                "print('incremental._watch' in sys.modules)\n"
+            )
+            output = subprocess.check_output(
+                [sys.executable, "-c", script],
+                cwd=self.srcdir.path,
+                env=dict(os.environ, PYTHONPATH=src),
+            )
+            self.assertEqual(output.decode().splitlines()[-1], "False")
+
+    def test_incrementalWatch(self):
+        """
+        `incremental update --daemon` asks the `incremental watch` daemon
+        listening on a socket to make the update, and prints what it did.
+        """
+        stringio = StringIO()
+        self.patch(sys, "stdout", stringio)
+        self.patch(os, "getcwd", self.getcwd)
+        self.patch(datetime, "date", self.date)
+        socketdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, socketdir)
+        socketpath = os.path.join(socketdir, "watch.sock")
+
+        thread = threading.Thread(
+            target=_main,
+            args=(["watch", "inctestpkg", "--socket", socketpath, "--poll"],),
+        )
+        thread.start()
+        self.addCleanup(thread.join)
+        for _ in range(1000):
+            if os.path.exists(socketpath):
+                break
+            time.sleep(0.01)
+
+        try:
+            self.assertRaises(
+                ValueError,
+                _main,
+                ["update", "inctestpkg", "--rc", "--daemon", socketpath, "--git"],
+            )
+            _main(["update", "inctestpkg", "--rc", "--daemon", socketpath])
+        finally:
+            _requestWatch(socketpath, {"command": "stop"})
+        thread.join()
+
+        self.assertIn("Updating codebase to 16.8.0rc1", stringio.getvalue())
+        self.assertEqual(
+            self.packagedir.child("__init__.py").getContent(),
+            b"""
+from incremental import Version
+introduced_in = Version("inctestpkg", 16, 8, 0, release_candidate=1).short()
+next_released_version = "inctestpkg 16.8.0rc1"
 """,
         )
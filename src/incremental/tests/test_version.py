@@ -5,13 +5,27 @@
 Tests for L{incremental}.
 """
 
+import copy
 import operator
+import pickle
 import sys
 import unittest
 
 from twisted.trial.unittest import TestCase
 
-from incremental import IncomparableVersions, Version, _inf, getVersionString
+from incremental import (
+    IncomparableVersions,
+    Version,
+    _existing_version,
+    _inf,
+    getVersionString,
+    latest_release,
+    max_version,
+    min_version,
+    sort_versions,
+)
+from incremental._parse import _parseVersion, _readVersionStatically
+from incremental.update import _VERSIONPY_TEMPLATE
 
 
 class VersionsTests(TestCase):
@@ -22,6 +36,62 @@ class VersionsTests(TestCase):
         va = Version("dummy", 1, 0, 0, release_candidate=1, post=2, dev=3)
         self.assertEqual(va.local(), va.short())
 
+    def test_slots(self):
+        """
+        L{Version} instances have no instance dictionary.
+        """
+        va = Version("dummy", 1, 0, 0, release_candidate=1, post=2, dev=3)
+        self.assertFalse(hasattr(va, "__dict__"))
+        self.assertLess(sys.getsizeof(va), 128)
+
+    def test_immutable(self):
+        """
+        The attributes of a L{Version} can't be changed or deleted.
+        """
+        va = Version("dummy", 1, 0, 0)
+        with self.assertRaises(AttributeError):
+            va.major = 2
+        with self.assertRaises(AttributeError):
+            del va.minor
+        with self.assertRaises(AttributeError):
+            va.extra = 1
+        self.assertEqual(va, Version("dummy", 1, 0, 0))
+
+    def test_pickle(self):
+        """
+        L{Version} instances survive a round trip through L{pickle} and
+        L{copy}.
+        """
+        va = Version("dummy", 1, 2, 3, release_candidate=4, post=5, dev=6)
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            vb = pickle.loads(pickle.dumps(va, protocol))
+            self.assertEqual(repr(vb), repr(va))
+        self.assertEqual(repr(copy.copy(va)), repr(va))
+        self.assertEqual(repr(copy.deepcopy(va)), repr(va))
+
+    def test_unpickleDict(self):
+        """
+        L{Version} instances pickled with an instance dictionary, as they
+        were before L{Version} used C{__slots__}, can still be unpickled.
+        """
+        expected = "Version('inctestpkg', 16, 8, 0, release_candidate=1, dev=2)"
+        for pickled in [
+            b"ccopy_reg\n_reconstructor\np0\n(cincremental\nVersion\np1\n"
+            b"c__builtin__\nobject\np2\nNtp3\nRp4\n(dp5\nVpackage\np6\n"
+            b"Vinctestpkg\np7\nsVmajor\np8\nI16\nsVminor\np9\nI8\n"
+            b"sVmicro\np10\nI0\nsVrelease_candidate\np11\nI1\nsVpost\n"
+            b"p12\nNsVdev\np13\nI2\nsb.",
+            b"\x80\x02cincremental\nVersion\nq\x00)\x81q\x01}q\x02(X\x07"
+            b"\x00\x00\x00packageq\x03X\n\x00\x00\x00inctestpkgq\x04X\x05"
+            b"\x00\x00\x00majorq\x05K\x10X\x05\x00\x00\x00minorq\x06K\x08"
+            b"X\x05\x00\x00\x00microq\x07K\x00X\x11\x00\x00\x00"
+            b"release_candidateq\x08K\x01X\x04\x00\x00\x00postq\tNX\x03"
+            b"\x00\x00\x00devq\nK\x02ub.",
+        ]:
+            version = pickle.loads(pickled)
+            self.assertEqual(repr(version), expected)
+            self.assertEqual(version, Version.parse("inctestpkg", "16.8.0rc1.dev2"))
+
     def test_versionComparison(self):
         """
         Versions can be compared for equality and order.
@@ -315,6 +385,106 @@ class VersionsTests(TestCase):
             Version("dumym", 1, 0, 0),
         )
 
+    def test_disallowBuggyRichComparisons(self):
+        """
+        Every rich comparison raises L{IncomparableVersions} when the package
+        names differ.
+        """
+        va = Version("dummy", 1, 0, 0)
+        vb = Version("dumym", 1, 0, 0)
+        for op in [
+            operator.eq,
+            operator.ne,
+            operator.lt,
+            operator.le,
+            operator.gt,
+            operator.ge,
+        ]:
+            self.assertRaises(IncomparableVersions, op, va, vb)
+        self.assertRaises(IncomparableVersions, va.__cmp__, vb)
+
+    def test_sortKey(self):
+        """
+        L{Version.sort_key} orders the same way as the versions themselves.
+        """
+        versions = [
+            Version("dummy", "NEXT", 0, 0),
+            Version("dummy", 1, 0, 0, post=1),
+            Version("dummy", 1, 0, 0),
+            Version("dummy", 1, 0, 0, dev=3),
+            Version("dummy", 1, 0, 0, release_candidate=2),
+            Version("dummy", 1, 0, 0, release_candidate=1),
+            Version("dummy", 1, 0, 0, release_candidate=1, dev=0),
+            Version("dummy", 0, 9, 9),
+        ]
+        expected = list(reversed(versions))
+        self.assertEqual(sorted(versions), expected)
+        self.assertEqual(sorted(versions, key=lambda v: v.sort_key), expected)
+
+    def test_sortKeyValue(self):
+        """
+        L{Version.sort_key} starts with the lowercased package name, and
+        replaces missing components with values that order them correctly.
+        """
+        va = Version("Dummy", 1, 2, 3, release_candidate=4)
+        self.assertEqual(va.sort_key, ("dummy", 1, 2, 3, 4, -1, float("inf")))
+
+    def test_hashCached(self):
+        """
+        The hash of a L{Version} is computed once, and is the only thing
+        that comparing, hashing or sorting versions keeps on them.
+        """
+        va = Version("Dummy", 1, 2, 3, release_candidate=4)
+        vb = Version("dummy", 1, 2, 3, release_candidate=4)
+        sorted([va, vb, Version("dummy", 1, 0, 0)])
+        self.assertRaises(AttributeError, getattr, va, "_hash")
+        self.assertEqual(hash(va), hash(vb))
+        self.assertEqual(va._hash, hash(va))
+
+    def test_sortKeyMixedPackages(self):
+        """
+        L{Version.sort_key} can key a dictionary of versions of several
+        packages.
+        """
+        versions = [
+            Version("dummy", 1, 0, 0),
+            Version("Dummy", 1, 0, 0),
+            Version("other", 1, 0, 0),
+        ]
+        self.assertEqual(
+            {v.sort_key: v for v in versions},
+            {
+                versions[1].sort_key: versions[1],
+                versions[2].sort_key: versions[2],
+            },
+        )
+
+    def test_sortKeyPackage(self):
+        """
+        L{Version.sort_key} groups versions by their lowercased package name.
+        """
+        versions = [
+            Version("b", 1, 0, 0),
+            Version("A", 2, 0, 0),
+            Version("a", 1, 0, 0),
+        ]
+        self.assertEqual(
+            sorted(versions, key=lambda v: v.sort_key),
+            [versions[2], versions[1], versions[0]],
+        )
+
+    def test_hash(self):
+        """
+        Equal versions have equal hashes, so they may be used as dictionary
+        keys and set members.
+        """
+        va = Version("dummy", 1, 0, 0, release_candidate=1)
+        vb = Version("DUMMY", 1, 0, 0, prerelease=1)
+        self.assertEqual(va, vb)
+        self.assertEqual(hash(va), hash(vb))
+        self.assertEqual(len({va, vb, Version("dummy", 1, 0, 0)}), 2)
+        self.assertEqual({va: "x"}[vb], "x")
+
     def test_notImplementedComparisons(self):
         """
         Comparing a L{Version} to some other object type results in
@@ -557,3 +727,258 @@ class VersionsTests(TestCase):
         self.assertEqual(
             Version("foo", 1, 0, 0, post=2, dev=8).base(), "1.0.0.post2.dev8"
         )
+
+
+class BatchOrderingTests(TestCase):
+    """
+    Tests for L{sort_versions}, L{max_version}, L{min_version} and
+    L{latest_release}.
+    """
+
+    def setUp(self):
+        self.versions = [
+            Version("foo", 2, 0, 0, release_candidate=1),
+            Version("Bar", 1, 0, 0),
+            Version("foo", 1, 0, 0, post=1),
+            Version("foo", "NEXT", 0, 0),
+            Version("bar", 1, 1, 0, dev=2),
+            Version("foo", 1, 0, 0),
+            Version("foo", 2, 0, 0, release_candidate=1, dev=0),
+        ]
+
+    def test_sortVersions(self):
+        """
+        L{sort_versions} sorts versions grouped by lowercased package name
+        rather than raising L{IncomparableVersions}.
+        """
+        v = self.versions
+        expected = [v[1], v[4], v[5], v[2], v[6], v[0], v[3]]
+        self.assertEqual(sort_versions(v), expected)
+        self.assertEqual(sort_versions(iter(v), reverse=True), expected[::-1])
+
+    def test_sortVersionsMatchesSorted(self):
+        """
+        For versions of a single package L{sort_versions} agrees with
+        L{sorted}.
+        """
+        foos = [v for v in self.versions if v.package == "foo"]
+        self.assertEqual(sort_versions(foos), sorted(foos))
+
+    def test_maxVersion(self):
+        """
+        L{max_version} finds the greatest version of each package.
+        """
+        v = self.versions
+        self.assertEqual(max_version(v), {"bar": v[4], "foo": v[3]})
+        self.assertEqual(max_version([]), {})
+
+    def test_minVersion(self):
+        """
+        L{min_version} finds the least version of each package.
+        """
+        v = self.versions
+        self.assertEqual(min_version(iter(v)), {"bar": v[1], "foo": v[5]})
+
+    def test_latestRelease(self):
+        """
+        L{latest_release} finds the latest final release, ignoring NEXT,
+        release candidates and dev releases.
+        """
+        v = self.versions
+        self.assertEqual(latest_release(v), {"bar": v[1], "foo": v[2]})
+
+    def test_latestReleaseCandidate(self):
+        """
+        L{latest_release} with C{kind="rc"} finds the latest release
+        candidate which isn't a dev release.
+        """
+        v = self.versions
+        self.assertEqual(latest_release(v, kind="rc"), {"foo": v[0]})
+
+    def test_latestDev(self):
+        """
+        L{latest_release} with C{kind="dev"} finds the latest dev release.
+        """
+        v = self.versions
+        self.assertEqual(latest_release(v, kind="dev"), {"bar": v[4], "foo": v[6]})
+
+    def test_latestReleaseUnknownKind(self):
+        """
+        L{latest_release} rejects unknown kinds of release.
+        """
+        self.assertRaises(ValueError, latest_release, self.versions, kind="beta")
+
+
+class ParseTests(TestCase):
+    """
+    Tests for L{Version.parse}.
+    """
+
+    def test_canonical(self):
+        """
+        L{Version.parse} parses the strings produced by L{Version.public}.
+        """
+        for v in [
+            Version("foo", 24, 7, 0),
+            Version("foo", 1, 2, 3, release_candidate=4),
+            Version("foo", 1, 2, 3, post=0),
+            Version("foo", 1, 2, 3, dev=5),
+            Version("foo", 1, 2, 3, release_candidate=1, post=2, dev=3),
+            Version("foo", "NEXT", 0, 0),
+        ]:
+            self.assertEqual(repr(Version.parse("foo", v.public())), repr(v))
+
+    def test_shortRelease(self):
+        """
+        Missing minor and micro versions default to zero.
+        """
+        self.assertEqual(repr(Version.parse("foo", "2")), "Version('foo', 2, 0, 0)")
+        self.assertEqual(
+            repr(Version.parse("foo", " 2.1rc0 ")),
+            "Version('foo', 2, 1, 0, release_candidate=0)",
+        )
+
+    def test_withoutPackaging(self):
+        """
+        Canonical version strings are parsed without importing
+        C{packaging}.
+        """
+        self.patch(sys, "modules", dict(sys.modules, **{"packaging.version": None}))
+        _parseVersion.cache_clear()
+        self.assertEqual(
+            repr(Version.parse("foo", "1.2.3.dev1")), "Version('foo', 1, 2, 3, dev=1)"
+        )
+
+    def test_nonCanonical(self):
+        """
+        Other PEP 440 spellings are normalized by C{packaging}.
+        """
+        self.assertEqual(
+            repr(Version.parse("foo", "v1.2.3-1")), "Version('foo', 1, 2, 3, post=1)"
+        )
+        self.assertEqual(
+            repr(Version.parse("foo", "17.1.0dev1")), "Version('foo', 17, 1, 0, dev=1)"
+        )
+        self.assertEqual(
+            repr(Version.parse("foo", "1.0c2")),
+            "Version('foo', 1, 0, 0, release_candidate=2)",
+        )
+
+    def test_invalid(self):
+        """
+        L{Version.parse} raises L{ValueError} for strings which aren't
+        versions, or which have too many release components.
+        """
+        self.assertRaises(ValueError, Version.parse, "foo", "not a version")
+        self.assertRaises(ValueError, Version.parse, "foo", "1.2.3.4")
+
+    def test_unrepresentable(self):
+        """
+        L{Version.parse} raises L{ValueError} rather than dropping an epoch
+        or a local version label, or turning an alpha or beta prerelease into
+        a release candidate.
+        """
+        for text in ["1!2.0", "1.0+local", "1.0a1", "1.0b1", "1.0.0rc1+ubuntu1"]:
+            with self.assertRaises(ValueError) as e:
+                Version.parse("foo", text)
+            self.assertIn(repr(text), str(e.exception))
+
+    def test_cached(self):
+        """
+        Parsing the same string twice returns the same L{Version}.
+        """
+        self.assertIs(Version.parse("foo", "1.2.3"), Version.parse("foo", "1.2.3"))
+        self.assertIsNot(Version.parse("foo", "1.2.3"), Version.parse("bar", "1.2.3"))
+
+    def test_subclass(self):
+        """
+        L{Version.parse} on a subclass returns an instance of the subclass.
+        """
+
+        class MyVersion(Version):
+            __slots__ = ()
+
+        v = MyVersion.parse("foo", "1.2.3rc1")
+        self.assertIsInstance(v, MyVersion)
+        self.assertEqual(repr(v), "MyVersion('foo', 1, 2, 3, release_candidate=1)")
+
+
+class ExistingVersionTests(TestCase):
+    """
+    Tests for L{_existing_version} and L{_readVersionStatically}.
+    """
+
+    def _write(self, source):
+        path = self.mktemp()
+        with open(path, "w") as f:
+            f.write(source)
+        return path
+
+    def test_generated(self):
+        """
+        Files generated by C{incremental update} are read without being
+        executed.
+        """
+        for v in [
+            Version("inctestpkg", 16, 8, 0),
+            Version("inctestpkg", 16, 8, 0, release_candidate=0),
+            Version("inctestpkg", 1, 2, 3, release_candidate=1, post=2, dev=3),
+            Version("inctestpkg", 1, 2, 3, dev=0),
+            Version("inctestpkg", "NEXT", 0, 0),
+        ]:
+            source = _VERSIONPY_TEMPLATE.format(
+                package=v.package, version_repr=repr(v).replace("'", '"')
+            )
+            self.assertEqual(repr(_readVersionStatically(source)), repr(v))
+            self.assertEqual(repr(_existing_version(self._write(source))), repr(v))
+
+    def test_minimal(self):
+        """
+        The docstring, comments and C{__all__} are optional, and either kind
+        of quote may be used.
+        """
+        self.assertEqual(
+            repr(
+                _readVersionStatically(
+                    "from incremental import Version\n"
+                    "__version__ = Version('foo', 1, 2, 3)"
+                )
+            ),
+            "Version('foo', 1, 2, 3)",
+        )
+
+    def test_nonStandard(self):
+        """
+        Files with any other content are executed.
+        """
+        sources = [
+            "from incremental import Version\n"
+            '__version__ = Version("foo", 1, 2, 3)\n'
+            '__version__ = Version("foo", 4, 5, 6)\n',
+            "from incremental import Version\n"
+            "v = 4\n"
+            '__version__ = Version("foo", v, 5, 6)\n',
+            'import incremental\n__version__ = incremental.Version("foo", 4, 5, 6)\n',
+        ]
+        for source in sources:
+            self.assertIsNone(_readVersionStatically(source))
+            self.assertEqual(
+                repr(_existing_version(self._write(source))),
+                "Version('foo', 4, 5, 6)",
+            )
+
+    def test_prereleaseExecuted(self):
+        """
+        Files that pass the deprecated C{prerelease} argument are executed,
+        so the deprecation warning is still emitted.
+        """
+        source = (
+            "from incremental import Version\n"
+            '__version__ = Version("foo", 1, 2, 3, prerelease=1)\n'
+        )
+        self.assertIsNone(_readVersionStatically(source))
+        self.assertEqual(
+            repr(_existing_version(self._write(source))),
+            "Version('foo', 1, 2, 3, release_candidate=1)",
+        )
+        self.assertEqual(len(self.flushWarnings()), 1)
@@ -0,0 +1,319 @@
+# Copyright (c) Twisted Matrix Laboratories.
+# See LICENSE for details.
+
+"""
+Tests for L{incremental._watch}.
+"""
+
+import datetime
+import os
+import shutil
+import socket
+import tempfile
+import threading
+
+from twisted.python.filepath import FilePath
+from twisted.trial.unittest import SkipTest, TestCase
+
+from incremental import _watch
+from incremental._config import _ScanScope
+from incremental._markers import _scanMarkers
+from incremental._watch import (
+    _IN_CLOSE_WRITE,
+    _IN_CREATE,
+    _IN_DELETE,
+    _IN_IGNORED,
+    _IN_ISDIR,
+    _IN_MOVED_FROM,
+    _IN_MOVED_TO,
+    _Inotify,
+    _listen,
+    _requestWatch,
+    _serveWatch,
+    _Watcher,
+)
+
+
+class InotifyTests(TestCase):
+    """
+    Tests for L{_Inotify}.
+    """
+
+    def setUp(self):
+        inotify = _Inotify.open()
+        if inotify is None:
+            raise SkipTest("inotify isn't available")
+        self.addCleanup(inotify.close)
+        self.inotify = inotify
+        self.dir = FilePath(self.mktemp())
+        self.dir.makedirs()
+
+    def test_events(self):
+        """
+        Files created, written, moved and deleted in a watched directory
+        are reported by name.
+        """
+        wd = self.inotify.add(self.dir.path)
+        self.assertEqual(self.inotify.read(), [])
+        with open(self.dir.child("a.py").path, "wb"):
+            pass
+        os.replace(self.dir.child("a.py").path, self.dir.child("b.py").path)
+        self.dir.child("b.py").remove()
+        self.dir.child("sub").makedirs()
+        self.assertEqual(
+            self.inotify.read(),
+            [
+                (wd, _IN_CREATE, "a.py"),
+                (wd, _IN_CLOSE_WRITE, "a.py"),
+                (wd, _IN_MOVED_FROM, "a.py"),
+                (wd, _IN_MOVED_TO, "b.py"),
+                (wd, _IN_DELETE, "b.py"),
+                (wd, _IN_CREATE | _IN_ISDIR, "sub"),
+            ],
+        )
+        self.assertEqual(self.inotify.read(), [])
+
+    def test_sameDirectory(self):
+        """
+        Watching the same directory twice gives the same watch descriptor,
+        and removing it reports that the watch is gone.
+        """
+        wd = self.inotify.add(self.dir.path)
+        self.assertEqual(self.inotify.add(self.dir.path + "/."), wd)
+        self.dir.remove()
+        self.assertIn((wd, _IN_IGNORED, ""), self.inotify.read())
+
+    def test_notADirectory(self):
+        """
+        L{_Inotify.add} raises L{OSError} for paths that aren't
+        directories.
+        """
+        self.dir.child("file").setContent(b"")
+        self.assertRaises(OSError, self.inotify.add, self.dir.child("file").path)
+        self.assertRaises(OSError, self.inotify.add, self.dir.child("missing").path)
+
+
+class WatcherTests(TestCase):
+    """
+    Tests for L{_Watcher} and the C{incremental watch} daemon.
+    """
+
+    def setUp(self):
+        self.packagedir = FilePath(self.mktemp()).child("inctestpkg")
+        self.packagedir.makedirs()
+        self.packagedir.child("__init__.py").setContent(b"# inctestpkg NEXT\n")
+        self.packagedir.child("other.py").setContent(b"import os\n")
+        self.packagedir.child("_version.py").setContent(
+            b"from incremental import Version\n"
+            b'__version__ = Version("inctestpkg", 1, 2, 3)\n'
+        )
+        self.date = datetime.date(2016, 8, 1)
+
+    def watcher(self, poll):
+        if not poll and _Inotify.open() is None:
+            raise SkipTest("inotify isn't available")
+        watcher = _Watcher(
+            "inctestpkg", self.packagedir.path, _ScanScope((), ("*.txt",)), poll
+        )
+        self.addCleanup(watcher.close)
+        self.assertEqual(watcher.inotify is None, poll)
+        return watcher
+
+    def markers(self, watcher):
+        return [
+            ("/".join(FilePath(filepath).segmentsFrom(self.packagedir)), line, text)
+            for filepath, (_, line, text) in watcher.markers()
+        ]
+
+    def assertFollowsChanges(self, watcher):
+        self.assertEqual(self.markers(watcher), [("__init__.py", 1, "inctestpkg NEXT")])
+
+        self.packagedir.child("other.py").setContent(b"\n# inctestpkg NEXT\n")
+        self.packagedir.child("skipped.txt").setContent(b"inctestpkg NEXT\n")
+        self.packagedir.descendant(["sub", "deeper"]).makedirs()
+        self.packagedir.descendant(["sub", "deeper", "new.py"]).setContent(
+            b'Version("inctestpkg", "NEXT", 0, 0)\n'
+        )
+        self.packagedir.child("__init__.py").remove()
+        watcher.process()
+        self.assertEqual(
+            self.markers(watcher),
+            [
+                ("other.py", 2, "inctestpkg NEXT"),
+                ("sub/deeper/new.py", 1, 'Version("inctestpkg", "NEXT", 0, 0)'),
+            ],
+        )
+
+        self.packagedir.child("sub").moveTo(self.packagedir.child("moved"))
+        self.packagedir.child("other.py").setContent(b"import os\n")
+        watcher.process()
+        self.assertEqual(
+            self.markers(watcher),
+            [("moved/deeper/new.py", 1, 'Version("inctestpkg", "NEXT", 0, 0)')],
+        )
+
+    def test_inotify(self):
+        """
+        With inotify, L{_Watcher.process} finds the markers in files
+        written, added, moved and removed, including in new directories,
+        but not in files the scan scope excludes.
+        """
+        self.assertFollowsChanges(self.watcher(poll=False))
+
+    def test_poll(self):
+        """
+        When polling, L{_Watcher.process} finds the same changes.
+        """
+        self.assertFollowsChanges(self.watcher(poll=True))
+
+    def test_maxMemory(self):
+        """
+        Files too large to read in the L{_Watcher}'s C{maxMemory} are
+        searched through L{_scanMarkers}, without reading them whole.
+        """
+        scanned = []
+
+        def scanMarkers(pattern, filepath, chunkSize):
+            scanned.append((filepath, chunkSize))
+            return _scanMarkers(pattern, filepath, chunkSize)
+
+        self.patch(_watch, "_scanMarkers", scanMarkers)
+        large = self.packagedir.child("large.py")
+        large.setContent(b"# padding\n" * 30000 + b"x = 'inctestpkg NEXT'\n")
+        watcher = _Watcher(
+            "inctestpkg", self.packagedir.path, _ScanScope(), poll=True, maxMemory=1
+        )
+        self.addCleanup(watcher.close)
+
+        self.assertEqual(scanned, [(large.path, 1024 * 1024 // 8)])
+        self.assertEqual(
+            self.markers(watcher),
+            [
+                ("__init__.py", 1, "inctestpkg NEXT"),
+                ("large.py", 30001, "inctestpkg NEXT"),
+            ],
+        )
+
+    def test_bump(self):
+        """
+        L{_Watcher.bump} rewrites the files known to contain markers without
+        walking the package, and then knows the new markers.
+        """
+        watcher = self.watcher(poll=False)
+
+        def walk(*args):
+            raise AssertionError("The package was walked")
+
+        self.patch(_watch, "_walkPackage", walk)
+        self.packagedir.child("other.py").setContent(
+            b"inctestpkg NEXT\ninctestpkg NEXT\n"
+        )
+        output = []
+        stats = watcher.bump(
+            rc=True, fsync=False, _date=self.date, _print=output.append
+        )
+
+        self.assertEqual(
+            self.packagedir.child("other.py").getContent(),
+            b"inctestpkg 16.8.0rc1\ninctestpkg 16.8.0rc1\n",
+        )
+        self.assertEqual(
+            self.packagedir.child("__init__.py").getContent(),
+            b"# inctestpkg 16.8.0rc1\n",
+        )
+        self.assertEqual(stats.files, 2)
+        self.assertIn("Updating codebase to 16.8.0rc1", output)
+        self.assertEqual(
+            self.markers(watcher),
+            [
+                ("__init__.py", 1, "inctestpkg 16.8.0rc1"),
+                (
+                    "_version.py",
+                    10,
+                    'Version("inctestpkg", 16, 8, 0, release_candidate=1)',
+                ),
+                ("other.py", 1, "inctestpkg 16.8.0rc1"),
+                ("other.py", 2, "inctestpkg 16.8.0rc1"),
+            ],
+        )
+
+        watcher.bump(rc=True, fsync=False, _date=self.date, _print=output.append)
+        self.assertEqual(
+            self.packagedir.child("__init__.py").getContent(),
+            b"# inctestpkg 16.8.0rc2\n",
+        )
+
+    def test_serve(self):
+        """
+        The daemon makes the updates requested on its socket, reports
+        errors to the client, and stops when asked to.
+        """
+        watcher = self.watcher(poll=True)
+        # Unix socket paths are limited to about 100 bytes.
+        socketdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, socketdir)
+        socketpath = os.path.join(socketdir, "watch.sock")
+        printed = []
+        ready = threading.Event()
+
+        def _print(line):
+            # The daemon prints once it is listening.
+            printed.append(line)
+            ready.set()
+
+        def serve():
+            _serveWatch(watcher, socketpath, 0.01, _print)
+
+        thread = threading.Thread(target=serve)
+        thread.start()
+        self.addCleanup(thread.join)
+        ready.wait(10)
+
+        try:
+            error = self.assertRaises(
+                ValueError,
+                _requestWatch,
+                socketpath,
+                {"command": "bump", "package": "otherpkg", "dev": True},
+            )
+            self.assertEqual(str(error), "This daemon watches inctestpkg, not otherpkg")
+            response = _requestWatch(
+                socketpath,
+                {
+                    "command": "bump",
+                    "package": "inctestpkg",
+                    "dev": True,
+                    "fsync": False,
+                },
+            )
+        finally:
+            _requestWatch(socketpath, {"command": "stop"})
+        thread.join()
+
+        self.assertIn("Updating codebase to 1.2.3.dev0", response["output"])
+        self.assertIn(self.packagedir.child("__init__.py").path, response["changed"])
+        self.assertEqual(response["stats"]["files"]["changed"], 1)
+        self.assertEqual(
+            self.packagedir.child("__init__.py").getContent(),
+            b"# inctestpkg 1.2.3.dev0\n",
+        )
+        self.assertIn("Updating codebase to 1.2.3.dev0", printed)
+        self.assertFalse(os.path.exists(socketpath))
+
+    def test_staleSocket(self):
+        """
+        The daemon replaces a socket nothing is listening on, but refuses
+        to replace other files.
+        """
+        socketdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, socketdir)
+        socketpath = os.path.join(socketdir, "watch.sock")
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(socketpath)
+        stale.close()
+        _listen(socketpath).close()
+
+        os.unlink(socketpath)
+        with open(socketpath, "w"):
+            pass
+        self.assertRaises(OSError, _listen, socketpath)
@@ -3,11 +3,59 @@
 
 
 import datetime
+import hashlib
+import json
+import mmap
 import os
+import re
+import secrets
+import shutil
+import sys
+import tempfile
+import threading
+import time
 from argparse import ArgumentParser
-from typing import Any, Callable, Optional, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from fnmatch import fnmatchcase
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+    cast,
+)
 
 from incremental import Version, _existing_version, _findPath
+from incremental._config import (
+    _extract_tool_incremental,
+    _load_pyproject_toml,
+    _load_scan_scope,
+    _load_toml,
+    _package_scan_scope,
+    _ScanScope,
+)
+from incremental._git import _trackedFiles
+from incremental._markers import _findMarkers, _Marker, _MarkerIndex, _scanMarkers
+from incremental._plan import _dumpPlan, _hashFile, _loadPlan, _Plan, _PlannedFile
+
+__all__ = [
+    "AsyncUpdater",
+    "BumpResult",
+    "BumpSpec",
+    "bump",
+    "read_version",
+    "run",
+]
 
 _VERSIONPY_TEMPLATE = '''"""
 Provides {package} version information.
@@ -25,28 +73,819 @@ __all__ = ["__version__"]
 _YEAR_START = 2000
 
 
-def _run(
-    package: str,
-    path: Optional[str],
+class _Replacer:
+    """
+    Replace several byte strings in one scan.
+
+    Every pattern contains the same anchor, the package name, so the
+    patterns are compiled into one regular expression that starts with the
+    anchor. The regular expression engine searches for that literal prefix
+    quickly and only tries the patterns where it occurs; the text before
+    the anchor in a pattern is checked with a lookbehind. The patterns used
+    by L{_run} can't overlap or produce one another, so this gives the same
+    result as calling L{bytes.replace} for each pattern in turn.
+
+    @ivar anchor: The byte string contained in every pattern.
+    @ivar maxLength: The length of the longest pattern.
+    """
+
+    def __init__(self, anchor: bytes, replacements: Sequence[Tuple[bytes, bytes]]):
+        """
+        @param anchor: A byte string contained in every pattern.
+        @param replacements: C{(pattern, replacement)} pairs. When a pattern
+            is repeated the first replacement wins.
+        """
+        table: Dict[bytes, bytes] = {}
+        for pattern, replacement in replacements:
+            if anchor not in pattern:
+                raise ValueError(f"{pattern!r} doesn't contain {anchor!r}")
+            table.setdefault(pattern, replacement)
+
+        # Longest first, so that a pattern is never shadowed by its prefix.
+        self._candidates: List[Tuple[int, int, bytes]] = []
+        alternatives = []
+        for pattern in sorted(table, key=len, reverse=True):
+            offset = pattern.index(anchor)
+            self._candidates.append((offset, len(pattern), table[pattern]))
+            # Check the text before the anchor, if any, with a lookbehind
+            # once the rest has matched.
+            alternatives.append(
+                b"("
+                + re.escape(pattern[offset + len(anchor) :])
+                + (b"(?<=" + re.escape(pattern) + b")" if offset else b"")
+                + b")"
+            )
+        self.anchor = anchor
+        self.maxLength = max(map(len, table), default=0)
+        self._pattern = re.compile(
+            re.escape(anchor) + b"(?:" + b"|".join(alternatives) + b")"
+        )
+
+    def occurrences(
+        self, content: Union[bytes, mmap.mmap]
+    ) -> Iterator[Tuple[int, int, bytes]]:
+        """
+        Find every occurrence of the patterns in C{content}, which may be
+        any bytes-like object that supports C{find}, such as an mmap.
+
+        @return: The start and end of each occurrence and its replacement,
+            in order.
+        """
+        # bytes.find is much faster than the regular expression engine, so
+        # first rule out the common case of a file that can't match at all.
+        first = content.find(self.anchor)
+        if first == -1:
+            return
+        end = 0
+        for match in self._pattern.finditer(content, first):
+            offset, length, replacement = self._candidates[
+                cast(int, match.lastindex) - 1
+            ]
+            start = match.start() - offset
+            if start < end:
+                continue
+            end = start + length
+            yield start, end, replacement
+
+    def replace(
+        self, content: bytes, counts: Optional[Dict[bytes, int]] = None
+    ) -> bytes:
+        """
+        Replace every occurrence of the patterns in C{content}.
+
+        @param counts: If given, the number of occurrences of each pattern
+            is added to it.
+
+        @return: C{content} itself when nothing matched.
+        """
+        view = memoryview(content)
+        rewritten = bytearray()
+        end = 0
+        for start, newEnd, replacement in self.occurrences(content):
+            if counts is not None:
+                pattern = content[start:newEnd]
+                counts[pattern] = counts.get(pattern, 0) + 1
+            rewritten += view[end:start]
+            rewritten += replacement
+            end = newEnd
+        if not end:
+            return content
+        rewritten += view[end:]
+        return bytes(rewritten)
+
+    def boundary(self, content: bytes, end: int) -> int:
+        """
+        Find where to split C{content} so that no occurrence of a pattern
+        spans the split.
+
+        @return: C{end}, or the start of the occurrence that spans it.
+        """
+        for match in self._pattern.finditer(content, max(0, end - self.maxLength)):
+            offset, length, _ = self._candidates[cast(int, match.lastindex) - 1]
+            start = match.start() - offset
+            if start >= end:
+                break
+            if end < start + length:
+                return start
+        return end
+
+
+# Files with a NUL byte in this many leading bytes are treated as binary.
+_BINARY_SNIFF_SIZE = 8192
+
+# Files at least this large are searched through mmap before being read.
+_MMAP_THRESHOLD = 1024 * 1024
+
+# The default limit, in MiB, on the memory used to rewrite each file.
+_DEFAULT_MAX_MEMORY = 64
+
+# Rewriting a file in one go holds it, the rewritten file as it is built
+# and the finished copy in memory at once, so files larger than this
+# fraction of the limit are streamed instead. A streamed file is read in
+# chunks of this fraction of the limit, which leaves room for a chunk, a
+# carried-over partial line as large again, and those copies of both.
+_READ_WHOLE_FRACTION = 4
+_CHUNK_FRACTION = 8
+
+
+@dataclass
+class _UpdateStats:
+    """
+    Counts of what L{_run} did with each file in the package.
+
+    @ivar files: Files scanned.
+    @ivar excluded: Files skipped by name, by default or because of the
+        C{include} and C{exclude} settings. Files in directories that were
+        pruned from the walk aren't counted.
+    @ivar indexed: Files skipped because the marker index shows that they
+        have no markers and haven't changed.
+    @ivar binary: Files skipped by the pre-filter as binary.
+    @ivar skipped: Files skipped by the pre-filter because they don't
+        mention the package.
+    @ivar unchanged: Files that mention the package but had no markers.
+    @ivar rewritten: Files that had markers replaced.
+    @ivar bytesRead: Bytes read, or searched through mmap, from the files
+        scanned.
+    @ivar changed: The paths of the files that were rewritten, in walk
+        order, followed by the C{_version.py} files.
+    @ivar replacements: The number of replacements of each pattern.
+    @ivar timings: Seconds spent working out the new version
+        (C{"version"}), scanning and rewriting the package (C{"scan"}),
+        writing the C{_version.py} files (C{"write"}) and in total
+        (C{"total"}), and within the scan, listing the files (C{"walk"}),
+        and reading (C{"read"}), searching (C{"match"}) and rewriting
+        (C{"rewrite"}) them. The last three are summed over all threads.
+    """
+
+    files: int = 0
+    excluded: int = 0
+    indexed: int = 0
+    binary: int = 0
+    skipped: int = 0
+    unchanged: int = 0
+    rewritten: int = 0
+    bytesRead: int = field(default=0, compare=False, repr=False)
+    changed: List[str] = field(default_factory=list, compare=False, repr=False)
+    replacements: Dict[bytes, int] = field(
+        default_factory=dict, compare=False, repr=False
+    )
+    timings: Dict[str, float] = field(default_factory=dict, compare=False, repr=False)
+
+    def record(self, outcome: str, fileStats: Optional["_FileStats"] = None) -> None:
+        """
+        Count a file, given the name of the counter for its outcome and
+        what scanning it cost.
+        """
+        self.files += 1
+        setattr(self, outcome, getattr(self, outcome) + 1)
+        if fileStats is not None:
+            self.bytesRead += fileStats.bytesRead
+            for phase in ["read", "match", "rewrite"]:
+                self.time(phase, getattr(fileStats, phase))
+            for pattern, count in fileStats.replacements.items():
+                self.replacements[pattern] = self.replacements.get(pattern, 0) + count
+
+    def time(self, phase: str, seconds: float) -> None:
+        """
+        Add C{seconds} to the time spent in C{phase}.
+        """
+        self.timings[phase] = self.timings.get(phase, 0.0) + seconds
+
+
+@dataclass
+class _FileStats:
+    """
+    What scanning one file cost, for L{_UpdateStats.record}.
+
+    Each file gets its own, so that threads scanning files in parallel
+    don't share any.
+
+    @ivar bytesRead: Bytes read or searched through mmap.
+    @ivar read: Seconds spent reading the file and checking whether it may
+        contain markers.
+    @ivar match: Seconds spent searching for markers and replacing them.
+    @ivar rewrite: Seconds spent writing the rewritten file.
+    @ivar replacements: The number of replacements of each pattern.
+    """
+
+    bytesRead: int = 0
+    read: float = 0.0
+    match: float = 0.0
+    rewrite: float = 0.0
+    replacements: Dict[bytes, int] = field(default_factory=dict)
+
+
+# Directories that can't contain version markers, which the walk doesn't
+# enter. Directories whose names start with a dot, such as VCS metadata,
+# tool caches and virtualenvs, are also pruned.
+_PRUNED_DIRS = frozenset({"__pycache__", "node_modules"})
+_PRUNED_DIR_SUFFIXES = (".egg-info", ".dist-info")
+
+# Compiled files, which are never scanned.
+_SKIPPED_FILE_SUFFIXES = (".pyc", ".pyo", ".so", ".pyd", ".dll", ".dylib")
+
+
+def _matches(relpath: str, patterns: Iterable[str]) -> bool:
+    return any(fnmatchcase(relpath, pattern) for pattern in patterns)
+
+
+def _isPrunedDir(relpath: str, dirname: str, scope: _ScanScope) -> bool:
+    return (
+        dirname.startswith(".")
+        or dirname in _PRUNED_DIRS
+        or dirname.endswith(_PRUNED_DIR_SUFFIXES)
+        or _matches(relpath, scope.exclude)
+    )
+
+
+def _isSkippedFile(relpath: str, filename: str, scope: _ScanScope) -> bool:
+    return (
+        filename.endswith(_SKIPPED_FILE_SUFFIXES)
+        or _matches(relpath, scope.exclude)
+        or bool(scope.include and not _matches(relpath, scope.include))
+    )
+
+
+def _walkPackage(
+    path: str,
+    scope: _ScanScope,
+    stats: _UpdateStats,
+    dirpaths: Optional[List[str]] = None,
+) -> List[str]:
+    """
+    List the files under C{path} that C{incremental update} should scan.
+
+    Unwanted directories are removed from C{dirnames} so that the walk
+    never enters them.
+
+    @param stats: Counts the files skipped by name.
+    @param dirpaths: If given, the directories entered are appended to it.
+    """
+    filepaths = []
+    for dirpath, dirnames, filenames in os.walk(path):
+        if dirpaths is not None:
+            dirpaths.append(dirpath)
+        reldir = os.path.relpath(dirpath, path).replace(os.sep, "/")
+        prefix = "" if reldir == "." else reldir + "/"
+        dirnames[:] = [
+            dirname
+            for dirname in dirnames
+            if not _isPrunedDir(prefix + dirname, dirname, scope)
+        ]
+        for filename in filenames:
+            if _isSkippedFile(prefix + filename, filename, scope):
+                stats.excluded += 1
+            else:
+                filepaths.append(os.path.join(dirpath, filename))
+    return filepaths
+
+
+def _trackedPackageFiles(
+    path: str, scope: _ScanScope, stats: _UpdateStats
+) -> List[str]:
+    """
+    List the files under C{path} that git tracks and C{incremental update}
+    should scan, applying the same rules as L{_walkPackage}.
+
+    @param stats: Counts the files skipped by name.
+    """
+    filepaths = []
+    base = os.path.join(path, "")
+    for filepath in _trackedFiles(path):
+        segments = filepath[len(base) :].split(os.sep)
+        if any(
+            _isPrunedDir("/".join(segments[: i + 1]), segments[i], scope)
+            for i in range(len(segments) - 1)
+        ) or _isSkippedFile("/".join(segments), segments[-1], scope):
+            stats.excluded += 1
+        else:
+            filepaths.append(filepath)
+    return filepaths
+
+
+class _Committer:
+    """
+    Write files atomically: each file is written to a temporary file next
+    to it, which is then renamed over it, so readers see either the old
+    file or the new one in full, never a partial write.
+
+    The temporary file is flushed to disk before the rename. The
+    directories containing the renamed files are flushed later, once each,
+    by L{syncDirectories}. May be used from several threads at once.
+
+    @ivar fsync: Whether to flush files and directories to disk. Without
+        it, writes are still atomic but may not survive a crash.
+    """
+
+    def __init__(self, fsync: bool = True):
+        self.fsync = fsync
+        self._directories: Set[str] = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _target(filepath: str) -> str:
+        """
+        The file to replace: C{filepath}, or the file it links to.
+        """
+        if os.path.islink(filepath):
+            return os.path.realpath(filepath)
+        return filepath
+
+    def open(self, filepath: str) -> Tuple[BinaryIO, str]:
+        """
+        Open a temporary file to write the new content of C{filepath} to.
+
+        @return: The open temporary file and its path, to be passed to
+            L{commit}.
+        """
+        dirname, basename = os.path.split(self._target(filepath))
+        # Unlike mkstemp, which makes private files, let the umask set the
+        # permissions of new files: there is no thread-safe way to read it.
+        flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+        for _ in range(tempfile.TMP_MAX):
+            tempPath = os.path.join(dirname, f".{basename}.{secrets.token_hex(4)}")
+            try:
+                fd = os.open(tempPath, flags, 0o666)
+            except FileExistsError:
+                continue
+            return os.fdopen(fd, "wb"), tempPath
+        raise FileExistsError(f"No usable temporary file name for {filepath}")
+
+    def commit(self, temp: BinaryIO, tempPath: str, filepath: str) -> None:
+        """
+        Close the temporary file from L{open} and rename it over
+        C{filepath}, giving it the permissions of the file it replaces. The
+        temporary file is removed if that fails.
+
+        If C{filepath} is a symbolic link, the file it points to is
+        replaced.
+        """
+        target = self._target(filepath)
+        try:
+            if self.fsync:
+                temp.flush()
+                os.fsync(temp.fileno())
+            temp.close()
+            try:
+                shutil.copymode(target, tempPath)
+            except FileNotFoundError:
+                # A new file, which keeps the permissions the umask gave it.
+                pass
+            os.replace(tempPath, target)
+        except BaseException:
+            temp.close()
+            os.remove(tempPath)
+            raise
+        with self._lock:
+            # A bare relative path has no directory to open.
+            self._directories.add(os.path.dirname(os.path.abspath(target)))
+
+    def write(self, filepath: str, content: bytes) -> None:
+        """
+        Replace the content of C{filepath} with C{content}.
+        """
+        temp, tempPath = self.open(filepath)
+        try:
+            temp.write(content)
+        except BaseException:
+            temp.close()
+            os.remove(tempPath)
+            raise
+        self.commit(temp, tempPath, filepath)
+
+    def syncDirectories(self) -> None:
+        """
+        Flush the directories of the files committed since the last call to
+        disk, so that the renames survive a crash.
+        """
+        with self._lock:
+            directories = sorted(self._directories)
+            self._directories.clear()
+        if not self.fsync or not hasattr(os, "O_DIRECTORY"):
+            # Directories can't be opened on Windows, where renames are
+            # flushed with the files.
+            return
+        for directory in directories:
+            fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+
+def _isBinary(head: bytes) -> bool:
+    return b"\0" in head[:_BINARY_SNIFF_SIZE]
+
+
+def _readCandidate(
+    filepath: str,
+    anchor: bytes,
+    maxSize: Optional[int] = None,
+    fileStats: Optional[_FileStats] = None,
+) -> Tuple[str, Optional[bytes]]:
+    """
+    Read a file that may contain version markers.
+
+    Files that are binary or don't contain C{anchor} are skipped. Large
+    files are checked through mmap, so they are only read if they may
+    contain markers.
+
+    @param maxSize: If given, files larger than this aren't read.
+    @param fileStats: If given, the bytes read are counted in it.
+
+    @return: The content of the file, or L{None} with the name of the
+        L{_UpdateStats} counter for why it was skipped, or C{"stream"} if
+        it is larger than C{maxSize}.
+    """
+    with open(filepath, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        tooLarge = maxSize is not None and size > maxSize
+        if size >= _MMAP_THRESHOLD or tooLarge:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                if _isBinary(m[:_BINARY_SNIFF_SIZE]):
+                    if fileStats is not None:
+                        fileStats.bytesRead += min(size, _BINARY_SNIFF_SIZE)
+                    return "binary", None
+                found = m.find(anchor)
+                if fileStats is not None:
+                    fileStats.bytesRead += size if found == -1 else found
+                if found == -1:
+                    return "skipped", None
+            if tooLarge:
+                return "stream", None
+        content = f.read()
+    if fileStats is not None:
+        fileStats.bytesRead += len(content)
+    if _isBinary(content):
+        return "binary", None
+    if anchor not in content:
+        return "skipped", None
+    return "", content
+
+
+def _copyRange(
+    source: BinaryIO,
+    dest: BinaryIO,
+    start: int,
+    end: Optional[int],
+    chunkSize: int,
+) -> None:
+    """
+    Copy the bytes of C{source} from C{start} to C{end}, or to its end if
+    C{end} is L{None}, to C{dest}, C{chunkSize} bytes at a time.
+    """
+    source.seek(start)
+    length = -1 if end is None else end - start
+    while length:
+        chunk = source.read(chunkSize if length < 0 else min(length, chunkSize))
+        if not chunk:
+            if length < 0:
+                return
+            raise OSError(f"{source.name} was truncated while being rewritten")
+        dest.write(chunk)
+        if length > 0:
+            length -= len(chunk)
+
+
+def _streamRewrite(
+    filepath: str,
+    replacer: _Replacer,
+    chunkSize: int,
+    index: Optional[_MarkerIndex] = None,
+    committer: Optional[_Committer] = None,
+    fileStats: Optional[_FileStats] = None,
+) -> str:
+    """
+    Apply C{replacer} to a file too large to hold in memory, C{chunkSize}
+    bytes at a time.
+
+    Each chunk is split after its last newline, since no pattern spans a
+    line, and the partial line after it is carried over to the next chunk.
+    A chunk without a newline is split where no pattern spans the split
+    instead, using L{_Replacer.boundary}.
+
+    Nothing is written until a pattern is found. From then on the rewritten
+    file is written to a temporary file from C{committer}, which then
+    replaces the original.
+
+    @param index: If given, the markers in the file are recorded in it.
+        Markers that can span a split without a newline aren't reliably
+        found, so the file isn't recorded if there was such a split.
+    @param committer: Commits the rewritten file; by default, one that
+        doesn't flush it to disk.
+    @param fileStats: If given, what rewriting the file cost is added to
+        it.
+
+    @return: The name of the L{_UpdateStats} counter for the outcome.
+    """
+    if committer is None:
+        committer = _Committer(fsync=False)
+    if fileStats is None:
+        fileStats = _FileStats()
+    markers: Optional[List[_Marker]] = [] if index is not None else None
+    line = 1
+    # How much of the original has been consumed.
+    consumed = 0
+    carry = b""
+    temp: Optional[BinaryIO] = None
+    tempPath: Optional[str] = None
+    try:
+        with open(filepath, "rb") as source:
+            while True:
+                started = time.perf_counter()
+                chunk = source.read(chunkSize)
+                fileStats.read += time.perf_counter() - started
+                fileStats.bytesRead += len(chunk)
+                if not chunk and not carry:
+                    break
+                buffer = carry + chunk
+                if not chunk:
+                    cut = len(buffer)
+                else:
+                    cut = buffer.rfind(b"\n") + 1
+                    if cut == 0:
+                        markers = None
+                        cut = replacer.boundary(
+                            buffer, max(0, len(buffer) - replacer.maxLength + 1)
+                        )
+                del chunk
+                segment = buffer[:cut]
+                carry = buffer[cut:]
+                del buffer
+
+                started = time.perf_counter()
+                replaced = replacer.replace(segment, fileStats.replacements)
+                fileStats.match += time.perf_counter() - started
+                started = time.perf_counter()
+                if replaced is not segment and temp is None:
+                    temp, tempPath = committer.open(filepath)
+                    _copyRange(source, temp, 0, consumed, chunkSize)
+                    fileStats.bytesRead += consumed
+                    source.seek(consumed + len(segment) + len(carry))
+                if temp is not None:
+                    temp.write(replaced)
+                fileStats.rewrite += time.perf_counter() - started
+                if markers is not None and index is not None:
+                    markers.extend(_findMarkers(index.pattern, replaced, line))
+                    line += replaced.count(b"\n")
+                consumed += len(segment)
+                del segment, replaced
+    except BaseException:
+        if temp is not None:
+            temp.close()
+            os.remove(cast(str, tempPath))
+        raise
+    if temp is None:
+        outcome = "unchanged"
+    else:
+        started = time.perf_counter()
+        committer.commit(temp, cast(str, tempPath), filepath)
+        fileStats.rewrite += time.perf_counter() - started
+        outcome = "rewritten"
+    if markers is not None and index is not None:
+        index.recordMarkers(filepath, markers)
+    return outcome
+
+
+def _rewriteFile(
+    filepath: str,
+    replacer: _Replacer,
+    index: Optional[_MarkerIndex] = None,
+    memoryLimit: int = _DEFAULT_MAX_MEMORY * 1024 * 1024,
+    committer: Optional[_Committer] = None,
+    fileStats: Optional[_FileStats] = None,
+) -> str:
+    """
+    Apply C{replacer} to the file at C{filepath}.
+
+    @param index: If given, files it knows to have no markers are skipped
+        without being read, and the markers in the others are recorded in
+        it.
+    @param memoryLimit: Roughly the most memory, in bytes, to use for the
+        content of the file. Larger files are rewritten by
+        L{_streamRewrite}.
+    @param committer: Commits the rewritten file; by default, one that
+        doesn't flush it to disk.
+    @param fileStats: If given, what rewriting the file cost is added to
+        it.
+
+    @return: The name of the L{_UpdateStats} counter for the outcome.
+    """
+    if index is not None and index.isClean(filepath):
+        return "indexed"
+    if fileStats is None:
+        fileStats = _FileStats()
+    started = time.perf_counter()
+    outcome, content = _readCandidate(
+        filepath, replacer.anchor, memoryLimit // _READ_WHOLE_FRACTION, fileStats
+    )
+    fileStats.read += time.perf_counter() - started
+    if outcome == "stream":
+        return _streamRewrite(
+            filepath,
+            replacer,
+            memoryLimit // _CHUNK_FRACTION,
+            index,
+            committer,
+            fileStats,
+        )
+    if content is not None:
+        original_content = content
+        started = time.perf_counter()
+        content = replacer.replace(original_content, fileStats.replacements)
+        fileStats.match += time.perf_counter() - started
+        if content is original_content:
+            outcome = "unchanged"
+        else:
+            if committer is None:
+                committer = _Committer(fsync=False)
+            started = time.perf_counter()
+            committer.write(filepath, content)
+            fileStats.rewrite += time.perf_counter() - started
+            outcome = "rewritten"
+    if index is not None:
+        index.record(filepath, content)
+    return outcome
+
+
+def _planFile(
+    filepath: str,
+    replacer: _Replacer,
+    index: Optional[_MarkerIndex] = None,
+    memoryLimit: int = _DEFAULT_MAX_MEMORY * 1024 * 1024,
+    fileStats: Optional[_FileStats] = None,
+) -> Tuple[str, Optional[_PlannedFile]]:
+    """
+    Find what L{_rewriteFile} would replace in the file at C{filepath},
+    without writing anything. Files too large to read in one go are
+    searched through mmap.
+
+    @param index: If given, files it knows to have no markers are skipped
+        without being read. Nothing is recorded in it.
+    @param fileStats: If given, what scanning the file cost is added to
+        it.
+
+    @return: The name of the L{_UpdateStats} counter for the outcome, and
+        the replacements if there are any.
+    """
+    if index is not None and index.isClean(filepath):
+        return "indexed", None
+    if fileStats is None:
+        fileStats = _FileStats()
+    started = time.perf_counter()
+    outcome, content = _readCandidate(
+        filepath, replacer.anchor, memoryLimit // _READ_WHOLE_FRACTION, fileStats
+    )
+    fileStats.read += time.perf_counter() - started
+    started = time.perf_counter()
+    if outcome == "stream":
+        with open(filepath, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                fileStats.bytesRead += len(m)
+                planned = _PlannedFile(
+                    filepath,
+                    hashlib.sha256(m).hexdigest(),
+                    [
+                        (start, m[start:end], replacement)
+                        for start, end, replacement in replacer.occurrences(m)
+                    ],
+                )
+    elif content is not None:
+        planned = _PlannedFile(
+            filepath,
+            hashlib.sha256(content).hexdigest(),
+            [
+                (start, content[start:end], replacement)
+                for start, end, replacement in replacer.occurrences(content)
+            ],
+        )
+    else:
+        return outcome, None
+    fileStats.match += time.perf_counter() - started
+    for _, old, _ in planned.matches:
+        fileStats.replacements[old] = fileStats.replacements.get(old, 0) + 1
+    if not planned.matches:
+        return "unchanged", None
+    return "rewritten", planned
+
+
+def _applyFile(
+    planned: _PlannedFile, committer: _Committer, chunkSize: int = 1024 * 1024
+) -> None:
+    """
+    Make the replacements in C{planned}, copying the rest of the file
+    C{chunkSize} bytes at a time.
+
+    @raise ValueError: If the file doesn't have the planned bytes at a
+        planned offset.
+    """
+    temp, tempPath = committer.open(planned.path)
+    try:
+        with open(planned.path, "rb") as source:
+            position = 0
+            for start, old, new in planned.matches:
+                _copyRange(source, temp, position, start, chunkSize)
+                if source.read(len(old)) != old:
+                    raise ValueError(
+                        f"{planned.path} doesn't contain {old!r} at {start}"
+                    )
+                temp.write(new)
+                position = start + len(old)
+            _copyRange(source, temp, position, None, chunkSize)
+    except BaseException:
+        temp.close()
+        os.remove(tempPath)
+        raise
+    committer.commit(temp, tempPath, planned.path)
+
+
+def _applyPlan(
+    planpath: str,
+    fsync: bool = True,
+    _getcwd: Optional[Callable[[], str]] = None,
+    _print: Callable[[object], object] = print,
+) -> _UpdateStats:
+    """
+    Apply a plan written by C{incremental update --plan}, without scanning
+    the package again.
+
+    Every file in the plan, and C{_version.py}, is checked against the hash
+    recorded in the plan before anything is written. Files are written as
+    by L{_run}, with C{_version.py} last.
+
+    @raise ValueError: If the plan can't be read, or a file has changed
+        since it was made.
+    """
+    if not _getcwd:
+        _getcwd = os.getcwd
+
+    with open(planpath, "rb") as f:
+        plan = _loadPlan(f.read(), _getcwd())
+
+    for planned in plan.files:
+        with open(planned.path, "rb") as f:
+            if _hashFile(f) != planned.sha256:
+                raise ValueError(
+                    f"{planned.path} has changed since {planpath} was made"
+                )
+    try:
+        with open(plan.versionPath, "rb") as f:
+            versionSha256: Optional[str] = _hashFile(f)
+    except FileNotFoundError:
+        versionSha256 = None
+    if versionSha256 != plan.versionSha256:
+        raise ValueError(f"{plan.versionPath} has changed since {planpath} was made")
+
+    _print(f"Updating codebase to {plan.version}")
+    committer = _Committer(fsync)
+    stats = _UpdateStats()
+    for planned in plan.files:
+        _applyFile(planned, committer)
+        stats.record("rewritten")
+        _print(f"Updating {planned.path}")
+
+    committer.syncDirectories()
+    _print(f"Updating {plan.versionPath}")
+    committer.write(plan.versionPath, plan.versionContent)
+    committer.syncDirectories()
+    return stats
+
+
+def _checkOptions(
     newversion: Optional[str],
     patch: bool,
     rc: bool,
     post: bool,
     dev: bool,
     create: bool,
-    _date: Optional[datetime.date] = None,
-    _getcwd: Optional[Callable[[], str]] = None,
-    _print: Callable[[object], object] = print,
+    jobs: int,
+    max_memory: int,
 ) -> None:
-    if not _getcwd:
-        _getcwd = os.getcwd
-
-    if not _date:
-        _date = datetime.date.today()
-
-    if not path:
-        path = _findPath(_getcwd(), package)
+    """
+    Check that the options given to C{incremental update} can be combined.
 
+    @raise ValueError: If they can't.
+    """
     if (
         newversion
         and patch
@@ -76,33 +915,60 @@ def _run(
     ):
         raise ValueError("Only give --create")
 
-    versionpath = os.path.join(path, "_version.py")
-    if newversion:
-        from packaging.version import Version as parse_version
+    if jobs < 1:
+        raise ValueError("--jobs must be at least 1")
 
-        existing = _existing_version(versionpath)
-        st_version = parse_version(newversion)
+    if max_memory < 1:
+        raise ValueError("--max-memory must be at least 1")
 
-        release = list(st_version.release)
 
-        minor = 0
-        micro = 0
-        if len(release) == 1:
-            (major,) = release
-        elif len(release) == 2:
-            major, minor = release
-        else:
-            major, minor, micro = release
+@dataclass
+class _Target:
+    """
+    A package to update, and what to update it to.
+
+    @ivar package: The name of the package.
+    @ivar path: The package directory.
+    @ivar previous: The current version.
+    @ivar version: The new version.
+    @ivar versionpy: The new content of the C{_version.py} file.
+    @ivar replacer: Replaces the markers of the package.
+    @ivar scope: The files in the package to scan.
+    """
+
+    package: str
+    path: str
+    previous: Version
+    version: Version
+    versionpy: bytes
+    replacer: _Replacer
+    scope: _ScanScope
+
+    @property
+    def versionpath(self) -> str:
+        return os.path.join(self.path, "_version.py")
 
-        v = Version(
-            package,
-            major,
-            minor,
-            micro,
-            release_candidate=st_version.pre[1] if st_version.pre else None,
-            post=st_version.post,
-            dev=st_version.dev,
-        )
+
+def _bumpPackage(
+    package: str,
+    path: str,
+    newversion: Optional[str],
+    patch: bool,
+    rc: bool,
+    post: bool,
+    dev: bool,
+    create: bool,
+    scope: _ScanScope,
+    _date: datetime.date,
+) -> _Target:
+    """
+    Work out the new version of a package, and the replacements to make in
+    it, from the options given to C{incremental update}.
+    """
+    versionpath = os.path.join(path, "_version.py")
+    if newversion:
+        existing = _existing_version(versionpath)
+        v = Version.parse(package, newversion)
 
     elif create:
         v = Version(package, _date.year - _YEAR_START, _date.month, 0)
@@ -176,53 +1042,734 @@ def _run(
     existing_version_repr = repr(existing).split("#")[0].replace("'", '"')
     existing_version_repr_bytes = existing_version_repr.encode("utf8")
 
-    _print(f"Updating codebase to {v.public()}")
+    package_bytes = package.encode("utf8")
+    public_bytes = package_bytes + b" " + v.public().encode("utf8")
+    replacements = []
 
-    for dirpath, dirnames, filenames in os.walk(path):
-        for filename in filenames:
-            filepath = os.path.join(dirpath, filename)
-            with open(filepath, "rb") as f:
-                original_content = f.read()
-            content = original_content
-
-            # Replace previous release_candidate calls to the new one
-            if existing.release_candidate:
-                content = content.replace(
-                    existing_version_repr_bytes, version_repr_bytes
+    # Replace previous release_candidate calls to the new one
+    if existing.release_candidate:
+        replacements.append((existing_version_repr_bytes, version_repr_bytes))
+        replacements.append(
+            (package_bytes + b" " + existing.public().encode("utf8"), public_bytes)
+        )
+
+    # Replace NEXT Version calls with the new one
+    replacements.append((NEXT_repr_bytes, version_repr_bytes))
+
+    # Replace <package> NEXT with <package> <public>
+    replacements.append((package_bytes + b" NEXT", public_bytes))
+
+    replacer = _Replacer(package_bytes, replacements)
+
+    versionpy = _VERSIONPY_TEMPLATE.format(
+        package=package, version_repr=version_repr
+    ).encode("utf-8")
+    return _Target(package, path, existing, v, versionpy, replacer, scope)
+
+
+def _update(
+    targets: Sequence[_Target],
+    jobs: int = 1,
+    git: bool = False,
+    indexpath: Optional[str] = None,
+    max_memory: int = _DEFAULT_MAX_MEMORY,
+    fsync: bool = True,
+    planpath: Optional[str] = None,
+    filepaths: Optional[Sequence[str]] = None,
+    quiet: bool = False,
+    _getcwd: Callable[[], str] = os.getcwd,
+    _print: Callable[[object], object] = print,
+) -> _UpdateStats:
+    """
+    Update the packages in C{targets}, scanning their files in one pool of
+    C{jobs} threads. Each file is matched against the markers of the
+    package it is in. The C{_version.py} files are written last.
+
+    An index or a plan can only be used with a single package.
+
+    @param filepaths: The files of the single package in C{targets} that
+        may contain markers, if they are already known; only these are
+        scanned.
+    @param quiet: Don't print each file that is written.
+    """
+    if len(targets) > 1 and (indexpath is not None or planpath is not None):
+        raise ValueError("--index and --plan can only be used with one package")
+    if len(targets) > 1 and filepaths is not None:
+        raise ValueError("Known files can only be given for one package")
+
+    # With a plan, nothing is written but the plan.
+    verb = "Updating" if planpath is None else "Would update"
+    for target in targets:
+        if len(targets) == 1:
+            _print(f"{verb} codebase to {target.version.public()}")
+        else:
+            _print(f"{verb} {target.package} to {target.version.public()}")
+
+    index = None
+    if indexpath is not None:
+        index = _MarkerIndex.load(indexpath, targets[0].package)
+    committer = _Committer(fsync)
+    memoryLimit = max_memory * 1024 * 1024
+
+    def rewrite(
+        work: Tuple[str, _Replacer],
+    ) -> Tuple[str, Optional[_PlannedFile], _FileStats]:
+        filepath, replacer = work
+        fileStats = _FileStats()
+        if planpath is not None:
+            outcome, plannedFile = _planFile(
+                filepath, replacer, index, memoryLimit, fileStats
+            )
+            return outcome, plannedFile, fileStats
+        outcome = _rewriteFile(
+            filepath, replacer, index, memoryLimit, committer, fileStats
+        )
+        return outcome, None, fileStats
+
+    stats = _UpdateStats()
+    started = time.perf_counter()
+    work: List[Tuple[str, _Replacer]] = []
+    for target in targets:
+        if filepaths is not None:
+            scanned: Sequence[str] = filepaths
+        elif git:
+            scanned = _trackedPackageFiles(target.path, target.scope, stats)
+        else:
+            scanned = _walkPackage(target.path, target.scope, stats)
+        work.extend((filepath, target.replacer) for filepath in scanned)
+    stats.time("walk", time.perf_counter() - started)
+    with ThreadPoolExecutor(jobs) if jobs > 1 else nullcontext() as executor:
+        if executor is None:
+            results: Iterable[Tuple[str, Optional[_PlannedFile], _FileStats]] = map(
+                rewrite, work
+            )
+        else:
+            results = executor.map(rewrite, work)
+        # Results come back in walk order, whatever order the work finishes.
+        planned = []
+        for (filepath, _), (outcome, plannedFile, fileStats) in zip(work, results):
+            stats.record(outcome, fileStats)
+            if outcome == "rewritten":
+                if not quiet:
+                    _print(f"{verb} {filepath}")
+                if planpath is None:
+                    stats.changed.append(filepath)
+            if plannedFile is not None:
+                planned.append(plannedFile)
+    stats.timings["scan"] = time.perf_counter() - started
+    started = time.perf_counter()
+
+    if planpath is not None:
+        [target] = targets
+        if not quiet:
+            _print(f"{verb} {target.versionpath}")
+        try:
+            with open(target.versionpath, "rb") as f:
+                versionSha256: Optional[str] = _hashFile(f)
+        except FileNotFoundError:
+            versionSha256 = None
+        plan = _Plan(
+            target.package,
+            target.version.public(),
+            planned,
+            target.versionpath,
+            versionSha256,
+            target.versionpy,
+        )
+        _print(f"Writing plan to {planpath}")
+        committer.write(planpath, _dumpPlan(plan, _getcwd()))
+        committer.syncDirectories()
+        stats.timings["write"] = time.perf_counter() - started
+        return stats
+
+    # Make the rewritten files durable before _version.py, so that the new
+    # version is never on disk without them.
+    committer.syncDirectories()
+
+    for target in targets:
+        if not quiet:
+            _print(f"Updating {target.versionpath}")
+        committer.write(target.versionpath, target.versionpy)
+        stats.changed.append(target.versionpath)
+    committer.syncDirectories()
+    stats.timings["write"] = time.perf_counter() - started
+
+    if index is not None and indexpath is not None:
+        index.record(targets[0].versionpath, targets[0].versionpy)
+        index.save(indexpath)
+
+    return stats
+
+
+def _run(
+    package: str,
+    path: Optional[str],
+    newversion: Optional[str],
+    patch: bool,
+    rc: bool,
+    post: bool,
+    dev: bool,
+    create: bool,
+    jobs: int = 1,
+    git: bool = False,
+    indexpath: Optional[str] = None,
+    max_memory: int = _DEFAULT_MAX_MEMORY,
+    fsync: bool = True,
+    planpath: Optional[str] = None,
+    quiet: bool = False,
+    _date: Optional[datetime.date] = None,
+    _getcwd: Optional[Callable[[], str]] = None,
+    _print: Callable[[object], object] = print,
+) -> _UpdateStats:
+    started = time.perf_counter()
+    if not _getcwd:
+        _getcwd = os.getcwd
+
+    if not _date:
+        _date = datetime.date.today()
+
+    if not path:
+        path = _findPath(_getcwd(), package)
+
+    _checkOptions(newversion, patch, rc, post, dev, create, jobs, max_memory)
+    scope = _package_scan_scope(path)
+    target = _bumpPackage(
+        package, path, newversion, patch, rc, post, dev, create, scope, _date
+    )
+    versionTime = time.perf_counter() - started
+    stats = _update(
+        [target],
+        jobs=jobs,
+        git=git,
+        indexpath=indexpath,
+        max_memory=max_memory,
+        fsync=fsync,
+        planpath=planpath,
+        quiet=quiet,
+        _getcwd=_getcwd,
+        _print=_print,
+    )
+    stats.timings["version"] = versionTime
+    stats.timings["total"] = time.perf_counter() - started
+    return stats
+
+
+def _peakMemory() -> Optional[int]:
+    """
+    The peak resident set size of this process, in bytes, or L{None} where
+    it isn't available.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def _statsReport(stats: _UpdateStats) -> Dict[str, Any]:
+    """
+    Summarize an update for C{--stats} and C{--stats-json}.
+
+    Times are in seconds. Reading, matching and writing the files in the
+    package are summed over all threads, so with C{--jobs} they may add up
+    to more than the total. Writing C{_version.py} includes making the
+    rewritten files durable first.
+    """
+    timings = stats.timings
+    return {
+        "timings": {
+            "walk": timings.get("walk", 0.0),
+            "read": timings.get("read", 0.0),
+            "match": timings.get("match", 0.0),
+            "write": timings.get("rewrite", 0.0),
+            "version": timings.get("version", 0.0) + timings.get("write", 0.0),
+            "total": timings.get("total", 0.0),
+        },
+        "files": {
+            "visited": stats.files + stats.excluded,
+            "excluded": stats.excluded,
+            "scanned": stats.files,
+            "indexed": stats.indexed,
+            "binary": stats.binary,
+            "skipped": stats.skipped,
+            "unchanged": stats.unchanged,
+            "changed": stats.rewritten,
+        },
+        "bytes_read": stats.bytesRead,
+        "replacements": {
+            pattern.decode("utf-8", "replace"): count
+            for pattern, count in sorted(stats.replacements.items())
+        },
+        "peak_memory": _peakMemory(),
+    }
+
+
+def _reportStats(
+    report: Dict[str, Any],
+    show: bool,
+    jsonpath: Optional[str],
+    _print: Callable[[object], object] = print,
+) -> None:
+    """
+    Print a report from L{_statsReport} if C{show} is true, and write it as
+    JSON to C{jsonpath} if it is given.
+    """
+    if jsonpath is not None:
+        with open(jsonpath, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+            f.write("\n")
+    if not show:
+        return
+    _print("Timings (read, match and write are summed over threads):")
+    for phase, seconds in report["timings"].items():
+        _print(f"  {phase:<8} {seconds:9.3f} s")
+    files = report["files"]
+    _print(
+        f"Files: {files['visited']} visited, {files['excluded']} excluded, "
+        f"{files['scanned']} scanned"
+    )
+    _print(
+        f"  {files['indexed']} indexed, {files['binary']} binary, "
+        f"{files['skipped']} without the package name, "
+        f"{files['unchanged']} unchanged, {files['changed']} changed"
+    )
+    _print(f"Read: {report['bytes_read']:,} bytes")
+    _print(f"Replacements: {sum(report['replacements'].values())}")
+    for pattern, count in report["replacements"].items():
+        _print(f"  {count:6d}  {pattern}")
+    if report["peak_memory"] is not None:
+        _print(f"Peak memory: {report['peak_memory'] / 1024 / 1024:.1f} MiB")
+
+
+def _listMarkers(
+    package: str,
+    path: Optional[str],
+    indexpath: Optional[str],
+    kind: str = "next",
+    git: bool = False,
+    max_memory: int = _DEFAULT_MAX_MEMORY,
+    _getcwd: Optional[Callable[[], str]] = None,
+    _print: Callable[[object], object] = print,
+) -> int:
+    """
+    Print where the markers of C{kind} that C{incremental update} replaces
+    are used in a package, as C{path:line: text}.
+
+    Files that the index at C{indexpath} shows to be unchanged aren't read.
+    The index is brought up to date with the files that were.
+
+    @param kind: C{"next"}, C{"rc"} or C{"all"}.
+    @param max_memory: Roughly the most memory, in MiB, to use for the
+        content of a file. Larger files are searched by L{_scanMarkers}.
+
+    @return: The number of markers printed.
+    """
+    if not _getcwd:
+        _getcwd = os.getcwd
+
+    if max_memory < 1:
+        raise ValueError("--max-memory must be at least 1")
+
+    if not path:
+        path = _findPath(_getcwd(), package)
+
+    if indexpath is None:
+        index = _MarkerIndex(package)
+    else:
+        index = _MarkerIndex.load(indexpath, package)
+
+    stats = _UpdateStats()
+    scope = _package_scan_scope(path)
+    if git:
+        filepaths = _trackedPackageFiles(path, scope, stats)
+    else:
+        filepaths = _walkPackage(path, scope, stats)
+    anchor = package.encode("utf-8")
+    memoryLimit = max_memory * 1024 * 1024
+    for filepath in filepaths:
+        if index.lookup(filepath) is None:
+            outcome, content = _readCandidate(
+                filepath, anchor, memoryLimit // _READ_WHOLE_FRACTION
+            )
+            if outcome == "stream":
+                index.recordMarkers(
+                    filepath,
+                    _scanMarkers(
+                        index.pattern, filepath, memoryLimit // _CHUNK_FRACTION
+                    ),
                 )
-                content = content.replace(
-                    (package.encode("utf8") + b" " + existing.public().encode("utf8")),
-                    (package.encode("utf8") + b" " + v.public().encode("utf8")),
+            else:
+                index.record(filepath, content)
+
+    if indexpath is not None:
+        index.save(indexpath)
+
+    found = 0
+    for filepath, (markerKind, line, text) in index:
+        if kind in ("all", markerKind):
+            _print(f"{os.path.relpath(filepath, _getcwd())}:{line}: {text}")
+            found += 1
+    return found
+
+
+def _discoverPackages(root: str) -> List[Tuple[str, str, _ScanScope]]:
+    """
+    Find the packages under C{root} whose C{pyproject.toml} has a
+    C{[tool.incremental]} section. Directories that L{_walkPackage} prunes
+    by default aren't searched.
+
+    @return: The name, directory and scan scope of each package, in walk
+        order.
+    """
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        reldir = os.path.relpath(dirpath, root).replace(os.sep, "/")
+        prefix = "" if reldir == "." else reldir + "/"
+        dirnames[:] = sorted(
+            dirname
+            for dirname in dirnames
+            if not _isPrunedDir(prefix + dirname, dirname, _ScanScope())
+        )
+        if "pyproject.toml" not in filenames:
+            continue
+        toml_path = os.path.join(dirpath, "pyproject.toml")
+        with open(toml_path, "rb") as f:
+            if _extract_tool_incremental(_load_toml(f)) is None:
+                continue
+        config = _load_pyproject_toml(toml_path)
+        found.append((config.package, config.path, _load_scan_scope(toml_path)))
+    return found
+
+
+def _runMany(
+    packages: Sequence[str],
+    discover: bool,
+    newversion: Optional[str],
+    patch: bool,
+    rc: bool,
+    post: bool,
+    dev: bool,
+    create: bool,
+    jobs: int = 1,
+    git: bool = False,
+    max_memory: int = _DEFAULT_MAX_MEMORY,
+    fsync: bool = True,
+    quiet: bool = False,
+    _date: Optional[datetime.date] = None,
+    _getcwd: Optional[Callable[[], str]] = None,
+    _print: Callable[[object], object] = print,
+) -> _UpdateStats:
+    """
+    Update several packages in one run, each as L{_run} would.
+
+    @param packages: The names of packages to update, found in the current
+        directory like L{_run} does.
+    @param discover: Also update every package found by
+        L{_discoverPackages} under the current directory.
+
+    @raise ValueError: If one package is inside another, since files in the
+        inner package would be scanned for the markers of both.
+    """
+    started = time.perf_counter()
+    if not _getcwd:
+        _getcwd = os.getcwd
+
+    if not _date:
+        _date = datetime.date.today()
+
+    _checkOptions(newversion, patch, rc, post, dev, create, jobs, max_memory)
+
+    found: List[Tuple[str, str, _ScanScope]] = []
+    for package in packages:
+        path = _findPath(_getcwd(), package)
+        found.append((package, path, _package_scan_scope(path)))
+    if discover:
+        found.extend(_discoverPackages(_getcwd()))
+    if not found:
+        raise ValueError("No packages to update")
+
+    paths: Dict[str, Tuple[str, _ScanScope]] = {}
+    for package, path, scope in found:
+        path = os.path.abspath(path)
+        if path in paths:
+            continue
+        for other, (otherPackage, _) in paths.items():
+            if os.path.commonpath([path, other]) in (path, other):
+                raise ValueError(
+                    f"{package} and {otherPackage} are inside one another; "
+                    "update them separately"
                 )
+        paths[path] = (package, scope)
 
-            # Replace NEXT Version calls with the new one
-            content = content.replace(NEXT_repr_bytes, version_repr_bytes)
-            content = content.replace(
-                NEXT_repr_bytes.replace(b"'", b'"'), version_repr_bytes
-            )
+    targets = [
+        _bumpPackage(
+            package, path, newversion, patch, rc, post, dev, create, scope, _date
+        )
+        for path, (package, scope) in paths.items()
+    ]
+    versionTime = time.perf_counter() - started
+
+    stats = _update(
+        targets,
+        jobs=jobs,
+        git=git,
+        max_memory=max_memory,
+        fsync=fsync,
+        quiet=quiet,
+        _getcwd=_getcwd,
+        _print=_print,
+    )
+    stats.timings["version"] = versionTime
+    stats.timings["total"] = time.perf_counter() - started
+    return stats
+
+
+@dataclass(frozen=True)
+class BumpSpec:
+    """
+    How to update a package, for L{bump}.
+
+    The options are those of C{incremental update}: give at most one of
+    C{newversion}, C{create}, or a combination of C{patch}, C{rc}, C{post}
+    and C{dev}. With none of them, the release candidate number is
+    dropped, making a full release.
+    """
+
+    package: str
+    """The name of the package."""
+
+    cwd: Optional[str] = None
+    """
+    The project directory, which contains the package directory, unless
+    C{path} is given, and may contain a C{pyproject.toml}. By default, the
+    current directory.
+    """
+
+    path: Optional[str] = None
+    """The package directory, if it isn't C{src/<package>} or C{<package>}."""
+
+    newversion: Optional[str] = None
+    """A version to set, like C{"1.2.3"}."""
+
+    patch: bool = False
+    """Increment the patch number."""
 
-            # Replace <package> NEXT with <package> <public>
-            content = content.replace(
-                package.encode("utf8") + b" NEXT",
-                (package.encode("utf8") + b" " + v.public().encode("utf8")),
+    rc: bool = False
+    """Make or increment a release candidate."""
+
+    post: bool = False
+    """Make or increment a postrelease."""
+
+    dev: bool = False
+    """Make or increment a development release."""
+
+    create: bool = False
+    """Create the first version of the package."""
+
+    jobs: int = 1
+    """The number of threads to read and rewrite files in."""
+
+    git: bool = False
+    """Only scan the files that git tracks."""
+
+    index: Optional[str] = None
+    """The path of a marker index to use and update."""
+
+    max_memory: int = _DEFAULT_MAX_MEMORY
+    """Roughly the most memory, in MiB, to rewrite each file in."""
+
+    fsync: bool = True
+    """Flush the files written to disk."""
+
+
+@dataclass(frozen=True)
+class BumpResult:
+    """
+    What L{bump} did.
+    """
+
+    package: str
+    """The name of the package."""
+
+    old_version: Version
+    """The version before the update."""
+
+    new_version: Version
+    """The version after the update."""
+
+    changed_files: Tuple[str, ...]
+    """The files rewritten, ending with the C{_version.py} file."""
+
+    files_scanned: int
+    """The number of files scanned for markers."""
+
+    timings: Dict[str, float]
+    """
+    Seconds spent working out the new version (C{"version"}), scanning and
+    rewriting the package (C{"scan"}), writing the C{_version.py} file
+    (C{"write"}), and in total (C{"total"}).
+    """
+
+
+def bump(spec: BumpSpec) -> BumpResult:
+    """
+    Update a package to a new version, as C{incremental update} does, but
+    without printing anything or exiting.
+
+    This may be called repeatedly in one process, and from several threads
+    at once for different packages. See L{AsyncUpdater} to call it from
+    asyncio.
+
+    @raise ValueError: If the options in C{spec} can't be combined, or the
+        package or its version can't be found.
+    """
+    started = time.perf_counter()
+    cwd = spec.cwd or os.getcwd()
+    _checkOptions(
+        spec.newversion,
+        spec.patch,
+        spec.rc,
+        spec.post,
+        spec.dev,
+        spec.create,
+        spec.jobs,
+        spec.max_memory,
+    )
+    path = spec.path or _findPath(cwd, spec.package)
+    target = _bumpPackage(
+        spec.package,
+        path,
+        spec.newversion,
+        spec.patch,
+        spec.rc,
+        spec.post,
+        spec.dev,
+        spec.create,
+        _package_scan_scope(path),
+        datetime.date.today(),
+    )
+    versionTime = time.perf_counter() - started
+    stats = _update(
+        [target],
+        jobs=spec.jobs,
+        git=spec.git,
+        indexpath=spec.index,
+        max_memory=spec.max_memory,
+        fsync=spec.fsync,
+        _getcwd=lambda: cwd,
+        _print=lambda message: None,
+    )
+    return BumpResult(
+        package=spec.package,
+        old_version=target.previous,
+        new_version=target.version,
+        changed_files=tuple(stats.changed),
+        files_scanned=stats.files,
+        timings={
+            "version": versionTime,
+            "scan": stats.timings["scan"],
+            "write": stats.timings["write"],
+            "total": time.perf_counter() - started,
+        },
+    )
+
+
+def read_version(
+    package: str, cwd: Optional[str] = None, path: Optional[str] = None
+) -> Version:
+    """
+    Read the current version of a package from its C{_version.py} file.
+
+    @param cwd: The project directory, which contains the package directory
+        unless C{path} is given. By default, the current directory.
+    @param path: The package directory, if it isn't C{src/<package>} or
+        C{<package>}.
+
+    @raise ValueError: If the package directory can't be found.
+    """
+    if not path:
+        path = _findPath(cwd or os.getcwd(), package)
+    return _existing_version(os.path.join(path, "_version.py"))
+
+
+class AsyncUpdater:
+    """
+    Read versions and update packages from asyncio without blocking the
+    event loop.
+
+    The work, including all file I/O, runs in a pool of at most
+    C{max_workers} threads, which bounds how many calls run at once;
+    further calls wait for a free thread. Once started, a call runs to
+    completion even if the task awaiting it is cancelled.
+
+    Use it as an asynchronous context manager, which shuts the pool down
+    on exit::
+
+        async with AsyncUpdater(max_workers=8) as updater:
+            results = await asyncio.gather(
+                *(updater.bump(BumpSpec(name, cwd=cwd)) for name, cwd in projects)
             )
 
-            if content != original_content:
-                _print(f"Updating {filepath}")
-                with open(filepath, "wb") as f:
-                    f.write(content)
-
-    _print(f"Updating {versionpath}")
-    with open(versionpath, "wb") as f:
-        f.write(
-            _VERSIONPY_TEMPLATE.format(
-                package=package, version_repr=version_repr
-            ).encode("utf-8")
+    Updates of packages that share a marker index must not run at once.
+    """
+
+    def __init__(self, max_workers: int = 8) -> None:
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self._executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix="incremental"
         )
 
+    async def _call(self, f: Callable[..., Any], *args: Any) -> Any:
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, f, *args)
+
+    async def read_version(
+        self, package: str, cwd: Optional[str] = None, path: Optional[str] = None
+    ) -> Version:
+        """
+        Read the current version of a package, like L{read_version}.
+        """
+        return cast(Version, await self._call(read_version, package, cwd, path))
+
+    async def bump(self, spec: BumpSpec) -> BumpResult:
+        """
+        Update a package, like L{bump}.
+        """
+        return cast(BumpResult, await self._call(bump, spec))
+
+    async def aclose(self) -> None:
+        """
+        Wait for the calls in progress to finish, and shut the pool down.
+        """
+        import asyncio
+
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+
+    async def __aenter__(self) -> "AsyncUpdater":
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.aclose()
+
+
+# Where `incremental watch` listens, relative to the current directory.
+_DEFAULT_WATCH_SOCKET = ".incremental-watch.sock"
+
 
 def _add_update_args(p: ArgumentParser) -> None:
-    p.add_argument("package")
+    p.add_argument("package", nargs="*")
+    p.add_argument(
+        "--discover",
+        default=False,
+        action="store_true",
+        help="also update every package under the current directory whose "
+        "pyproject.toml has a [tool.incremental] section",
+    )
     p.add_argument("--path", default=None)
     p.add_argument("--newversion", default=None, metavar="VERSION")
     p.add_argument("--patch", default=False, action="store_true")
@@ -230,6 +1777,148 @@ def _add_update_args(p: ArgumentParser) -> None:
     p.add_argument("--post", default=False, action="store_true")
     p.add_argument("--dev", default=False, action="store_true")
     p.add_argument("--create", default=False, action="store_true")
+    p.add_argument(
+        "--jobs",
+        default=1,
+        type=int,
+        metavar="N",
+        help="read and rewrite files in N threads",
+    )
+    p.add_argument(
+        "--git",
+        default=False,
+        action="store_true",
+        help="only scan files tracked by git, read from the git index",
+    )
+    p.add_argument(
+        "--index",
+        default=None,
+        metavar="FILE",
+        help="skip files that the marker index in FILE shows have no markers",
+    )
+    p.add_argument(
+        "--max-memory",
+        default=_DEFAULT_MAX_MEMORY,
+        type=int,
+        metavar="MIB",
+        help="stream files that can't be rewritten in about MIB MiB "
+        f"(default: {_DEFAULT_MAX_MEMORY}), per thread",
+    )
+    p.add_argument(
+        "--no-fsync",
+        dest="fsync",
+        default=True,
+        action="store_false",
+        help="don't flush rewritten files to disk, for example on tmpfs or in CI",
+    )
+    p.add_argument(
+        "--plan",
+        default=None,
+        metavar="FILE",
+        help="write the changes to FILE, to be made by `incremental apply`, "
+        "instead of making them",
+    )
+    p.add_argument(
+        "--quiet",
+        default=False,
+        action="store_true",
+        help="don't print each file that is written",
+    )
+    p.add_argument(
+        "--stats",
+        default=False,
+        action="store_true",
+        help="print how long each phase took, what was done with the files "
+        "and the replacements made",
+    )
+    p.add_argument(
+        "--stats-json",
+        default=None,
+        metavar="FILE",
+        help="write what --stats prints to FILE, as JSON",
+    )
+    p.add_argument(
+        "--daemon",
+        default=None,
+        metavar="SOCKET",
+        help="ask the `incremental watch` daemon listening on SOCKET to make "
+        "the update",
+    )
+
+
+def _runArgs(parser: ArgumentParser, args: Any) -> None:
+    """
+    Run C{incremental update} with the arguments parsed by C{parser}, set up
+    by L{_add_update_args}, for one package or several.
+    """
+    if not args.package and not args.discover:
+        parser.error("the following arguments are required: package (or --discover)")
+    if args.daemon is not None:
+        from incremental._watch import _requestWatch
+
+        if len(args.package) != 1 or args.discover:
+            raise ValueError("--daemon can only be used with one package")
+        if args.path or args.index or args.plan or args.git or args.jobs != 1:
+            raise ValueError(
+                "--daemon can't be used with --path, --index, --plan, --git or --jobs"
+            )
+        response = _requestWatch(
+            args.daemon,
+            {
+                "command": "bump",
+                "package": args.package[0],
+                "newversion": args.newversion,
+                "patch": args.patch,
+                "rc": args.rc,
+                "post": args.post,
+                "dev": args.dev,
+                "create": args.create,
+                "fsync": args.fsync,
+                "quiet": args.quiet,
+            },
+        )
+        for line in response["output"]:
+            print(line)
+        _reportStats(response["stats"], args.stats, args.stats_json)
+        return
+    if len(args.package) == 1 and not args.discover:
+        stats = _run(
+            package=args.package[0],
+            path=args.path,
+            newversion=args.newversion,
+            patch=args.patch,
+            rc=args.rc,
+            post=args.post,
+            dev=args.dev,
+            create=args.create,
+            jobs=args.jobs,
+            git=args.git,
+            indexpath=args.index,
+            max_memory=args.max_memory,
+            fsync=args.fsync,
+            planpath=args.plan,
+            quiet=args.quiet,
+        )
+        _reportStats(_statsReport(stats), args.stats, args.stats_json)
+        return
+    if args.path or args.index or args.plan:
+        raise ValueError("--path, --index and --plan can only be used with one package")
+    stats = _runMany(
+        packages=args.package,
+        discover=args.discover,
+        newversion=args.newversion,
+        patch=args.patch,
+        rc=args.rc,
+        post=args.post,
+        dev=args.dev,
+        create=args.create,
+        jobs=args.jobs,
+        git=args.git,
+        max_memory=args.max_memory,
+        fsync=args.fsync,
+        quiet=args.quiet,
+    )
+    _reportStats(_statsReport(stats), args.stats, args.stats_json)
 
 
 def _main(argv: Optional[Sequence[str]] = None) -> None:
@@ -241,18 +1930,99 @@ def _main(argv: Optional[Sequence[str]] = None) -> None:
 
     update_p = subparsers.add_parser("update")
     _add_update_args(update_p)
+    update_p.set_defaults(command="update")
 
-    args: Any = p.parse_args(argv)
-    _run(
-        package=args.package,
-        path=args.path,
-        newversion=args.newversion,
-        patch=args.patch,
-        rc=args.rc,
-        post=args.post,
-        dev=args.dev,
-        create=args.create,
+    markers_p = subparsers.add_parser("markers")
+    markers_p.add_argument("package")
+    markers_p.add_argument("--path", default=None)
+    markers_p.add_argument("--index", default=None, metavar="FILE")
+    markers_p.add_argument(
+        "--kind",
+        default="next",
+        choices=["next", "rc", "all"],
+        help="the markers to list (default: next)",
     )
+    markers_p.add_argument("--git", default=False, action="store_true")
+    markers_p.add_argument(
+        "--max-memory",
+        default=_DEFAULT_MAX_MEMORY,
+        type=int,
+        metavar="MIB",
+        help="search files that can't be read in about MIB MiB "
+        f"(default: {_DEFAULT_MAX_MEMORY}) without reading them whole",
+    )
+    markers_p.set_defaults(command="markers")
+
+    apply_p = subparsers.add_parser("apply")
+    apply_p.add_argument("plan", metavar="PLAN")
+    apply_p.add_argument(
+        "--no-fsync",
+        dest="fsync",
+        default=True,
+        action="store_false",
+        help="don't flush rewritten files to disk, for example on tmpfs or in CI",
+    )
+    apply_p.set_defaults(command="apply")
+
+    watch_p = subparsers.add_parser("watch")
+    watch_p.add_argument("package")
+    watch_p.add_argument("--path", default=None)
+    watch_p.add_argument(
+        "--socket",
+        default=_DEFAULT_WATCH_SOCKET,
+        metavar="SOCKET",
+        help=f"listen for updates on SOCKET (default: {_DEFAULT_WATCH_SOCKET})",
+    )
+    watch_p.add_argument(
+        "--poll",
+        default=False,
+        action="store_true",
+        help="poll for changes even where inotify is available",
+    )
+    watch_p.add_argument(
+        "--poll-interval",
+        default=1.0,
+        type=float,
+        metavar="SECONDS",
+        help="how often to poll for changes (default: 1)",
+    )
+    watch_p.add_argument(
+        "--max-memory",
+        default=_DEFAULT_MAX_MEMORY,
+        type=int,
+        metavar="MIB",
+        help="search files that can't be read in about MIB MiB "
+        f"(default: {_DEFAULT_MAX_MEMORY}) without reading them whole",
+    )
+    watch_p.set_defaults(command="watch")
+
+    args: Any = p.parse_args(argv)
+    if args.command == "watch":
+        from incremental._watch import _watch
+
+        _watch(
+            package=args.package,
+            path=args.path,
+            socketpath=args.socket,
+            poll=args.poll,
+            pollInterval=args.poll_interval,
+            maxMemory=args.max_memory,
+        )
+        return
+    if args.command == "apply":
+        _applyPlan(args.plan, fsync=args.fsync)
+        return
+    if args.command == "markers":
+        _listMarkers(
+            package=args.package,
+            path=args.path,
+            indexpath=args.index,
+            kind=args.kind,
+            git=args.git,
+            max_memory=args.max_memory,
+        )
+        return
+    _runArgs(update_p, args)
 
 
 def run(argv: Optional[Sequence[str]] = None) -> None:
@@ -262,16 +2032,7 @@ def run(argv: Optional[Sequence[str]] = None) -> None:
     p = ArgumentParser()
     _add_update_args(p)
     args: Any = p.parse_args(argv)
-    _run(
-        package=args.package,
-        path=args.path,
-        newversion=args.newversion,
-        patch=args.patch,
-        rc=args.rc,
-        post=args.post,
-        dev=args.dev,
-        create=args.create,
-    )
+    _runArgs(p, args)
     raise SystemExit(0)  # Behave like Click.
 
 